@@ -4,13 +4,143 @@ import os
 import random
 import subprocess
 import threading
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
 import math
-import time
+import queue
+
+from mixer import (
+    AUDIO_KEEP,
+    AUDIO_NONE,
+    AUDIO_VOICE,
+    DEFAULT_BLUR_QUALITY,
+    DEFAULT_CACHE_MAX_BYTES,
+    DEFAULT_PROFILE,
+    DEFAULT_SCRATCH_BUDGET,
+    FILL_BLACK,
+    FILL_BLUR,
+    TERMINATE_GRACE,
+    TRACE_FORMAT_JSONL,
+    JobCancelled,
+    JobControl,
+    JobSpec,
+    MediaIndex,
+    MixEngine,
+    MixError,
+    load_profiles,
+    suggest_clip_params,
+)
+from mixer.batch import DONE, FAILED, run_manifest
+from mixer.benchmark import benchmark_profiles, format_profile_report
+from mixer.watcher import ADDED, REMOVED, RESCAN, FolderEvent, FolderWatcher
+
+# 填充方式和模糊质量的显示名称
+FILL_MODE_NAMES = {FILL_BLACK: "黑边", FILL_BLUR: "模糊背景"}
+BLUR_QUALITY_NAMES = {"fast": "快速", "balanced": "均衡", "high": "高质量"}
+
+# 时长尚未获取时显示的占位符
+DURATION_PLACEHOLDER = "…"
+
+# 支持的视频和音乐文件扩展名
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+MUSIC_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.aac')
+
+# 文件夹监视和配置保存的检查间隔（毫秒）
+WATCH_INTERVAL_MS = 1000
+
+# 后台任务状态刷新到界面的间隔（毫秒）
+STATUS_INTERVAL_MS = 200
+
+
+def format_duration(duration: Optional[float]) -> str:
+    """把秒数格式化为 分:秒"""
+    return f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else "未知"
+
+
+def fill_durations_async(root: tk.Misc, tree: ttk.Treeview, media_index: MediaIndex, items: List[Tuple[str, str]]):
+    """填充音乐列表的时长列
+
+    items为(列表项ID, 文件路径)。索引中已有的时长立即显示，其余先显示占位符，
+    由后台线程并行获取后通过root.after回到主线程更新。
+    """
+    pending: Dict[str, List[str]] = {}
+    for item, path in items:
+        info = media_index.get(path)
+        if info is not None:
+            tree.set(item, "duration", format_duration(info.get("duration")))
+        else:
+            tree.set(item, "duration", DURATION_PLACEHOLDER)
+            pending.setdefault(path, []).append(item)
+    if not pending:
+        return
+    
+    def update_items(item_ids: List[str], text: str):
+        try:
+            for item in item_ids:
+                if tree.exists(item):
+                    tree.set(item, "duration", text)
+        except tk.TclError:
+            pass  # 列表已关闭
+    
+    def on_probed(done: int, total: int, path: str):
+        info = media_index.get(path)
+        text = format_duration(info.get("duration") if info else None)
+        root.after(0, update_items, pending[path], text)
+    
+    def worker():
+        try:
+            media_index.refresh(list(pending), on_progress=on_probed)
+        except Exception as e:
+            print(f"获取音乐时长失败: {e}")
+    
+    threading.Thread(target=worker, daemon=True).start()
+
+
+class UiChannel:
+    """后台线程与界面之间的消息通道
+
+    后台线程只写入，不直接操作Tk控件：状态文字只保留最新一条，界面线程每隔
+    STATUS_INTERVAL_MS取出一次（节流）；对话框等其他界面操作排队后在界面线程执行。
+    """
+
+    def __init__(self, root: tk.Misc, status_var: tk.StringVar, interval_ms: int = STATUS_INTERVAL_MS):
+        self.root = root
+        self.status_var = status_var
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._status: Optional[str] = None
+        self._calls: queue.Queue = queue.Queue()
+        self.root.after(self.interval_ms, self._poll)
+
+    def post_status(self, message: str):
+        """更新状态文字（可在任意线程调用）"""
+        with self._lock:
+            self._status = message
+
+    def call(self, func, *args):
+        """在界面线程中执行func(*args)（可在任意线程调用）"""
+        self._calls.put((func, args))
+
+    def _poll(self):
+        with self._lock:
+            status, self._status = self._status, None
+        if status is not None:
+            self.status_var.set(status)
+        while True:
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"界面更新失败: {e}")
+        self.root.after(self.interval_ms, self._poll)
+
 
 class MusicListWindow:
-    def __init__(self, parent, pool_name: str, pool_path: str, music_files: list):
+    def __init__(self, parent, pool_name: str, pool_path: str, music_files: list, music_index: MediaIndex):
+        self.music_index = music_index
         self.window = tk.Toplevel(parent)
         self.window.title(f"音乐列表 - {pool_name}")
         self.window.geometry("600x400")
@@ -70,25 +200,12 @@ class MusicListWindow:
         self.tree.bind("<Button-1>", self._toggle_checkbox)
     
     def _load_music_files(self, pool_path: str, music_files: list):
+        items = []
         for file in music_files:
-            file_path = os.path.join(pool_path, file)
-            duration = self._get_music_duration(file_path)
-            duration_str = f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else "未知"
-            self.tree.insert("", "end", values=("✓", file, duration_str))
-    
-    def _get_music_duration(self, file_path: str) -> float:
-        try:
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                file_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            return float(result.stdout.strip())
-        except:
-            return 0
+            item = self.tree.insert("", "end", values=("✓", file, DURATION_PLACEHOLDER))
+            items.append((item, os.path.join(pool_path, file)))
+        # 时长在后台获取，不阻塞界面
+        fill_durations_async(self.window, self.tree, self.music_index, items)
     
     def _toggle_checkbox(self, event):
         region = self.tree.identify_region(event.x, event.y)
@@ -133,13 +250,44 @@ class VideoMixerApp:
         self.sound_effect_path: Optional[str] = None  # 新增：音效文件路径
         self.video_files: List[str] = []
         self.processing = False
-        self.last_save_time = 0  # 上次保存配置的时间
+        self.job_control: Optional[JobControl] = None  # 正在处理时用于暂停和取消
+        self.process_thread: Optional[threading.Thread] = None
+        self.config_dirty = False  # 配置有未保存的修改
+        self._last_saved_config: Optional[str] = None  # 上次写入的配置内容
+        self.watcher = FolderWatcher()  # 监视输入文件夹和音乐池
         
         # 音乐池相关变量
         self.music_pools: dict = {}  # 存储音乐池路径和名称的映射
         self.music_files: dict = {}  # 存储每个音乐池的音乐文件列表
         self.selected_pool: Optional[str] = None  # 当前选中的音乐池
         
+        # 片段缓存相关变量
+        self.clip_cache_dir = ''  # 为空时使用程序目录下的cache/clips
+        self.clip_cache_max_mb = DEFAULT_CACHE_MAX_BYTES // (1024 * 1024)
+        self.engine: Optional[MixEngine] = None  # 混剪引擎，首次使用时创建
+        
+        # 临时文件相关变量
+        self.scratch_dir = ''  # 为空时优先使用/dev/shm，空间不足时使用系统临时目录
+        self.scratch_budget_mb = DEFAULT_SCRATCH_BUDGET // (1024 * 1024)
+        
+        # 运行记录相关变量
+        self.trace_dir = ''  # 不为空时每次运行的步骤耗时和资源占用保存到该目录
+        self.trace_format = TRACE_FORMAT_JSONL
+        
+        # 编码配置相关变量
+        self.encoder_profile = DEFAULT_PROFILE  # 当前选择的编码配置名称
+        self.encoder_profiles: dict = {}  # config.json中自定义或覆盖的编码配置
+        self.streaming = False  # 流式处理：片段不写入磁盘，直接通过管道合成
+        self.fill_mode = FILL_BLACK  # 画面填充方式：黑边/模糊背景
+        self.blur_quality = DEFAULT_BLUR_QUALITY  # 模糊背景的质量/速度档位
+        self.use_proxies = False  # 有代理文件的视频使用代理文件
+        self.proxy_dir = ''  # 为空时使用程序目录下的cache/proxies
+        self.music_beats = False  # 建立音乐库索引时同时分析速度和节拍
+        self.beat_sync = True  # 跟随音乐模式下片段切换点对齐到节拍
+        self.music_indexing = False  # 后台正在建立音乐库索引
+        self.music_index_again = False  # 建立索引期间音乐池有变化，完成后再运行一次
+        self.proxy_stop: Optional[threading.Event] = None  # 正在后台生成代理时用于停止
+        
         # 音效相关变量
         self.sound_effect_type_var = tk.StringVar(value="none")  # 音效类型：none/clips/video
         
@@ -149,8 +297,17 @@ class VideoMixerApp:
         self._create_widgets()
         self._setup_layout()
         
+        # 后台线程通过消息通道更新界面
+        self.ui = UiChannel(self.root, self.status_var)
+        
         # 启动定时更新
         self._start_auto_update()
+        
+        # 在后台为音乐池建立音乐库索引（时长、响度）
+        self._index_music_library()
+        
+        # 关闭窗口时先结束正在运行的ffmpeg进程
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
     
     def _load_config(self):
         """加载配置文件"""
@@ -173,6 +330,25 @@ class VideoMixerApp:
                     self.music_pool_states = config.get('music_pool_states', {})
                     # 加载使用背景音乐的状态
                     self.use_bgm = config.get('use_bgm', False)
+                    # 加载片段缓存设置
+                    self.clip_cache_dir = config.get('clip_cache_dir', self.clip_cache_dir)
+                    self.clip_cache_max_mb = config.get('clip_cache_max_mb', self.clip_cache_max_mb)
+                    # 加载临时文件设置
+                    self.scratch_dir = config.get('scratch_dir', self.scratch_dir)
+                    self.scratch_budget_mb = config.get('scratch_budget_mb', self.scratch_budget_mb)
+                    # 加载运行记录设置
+                    self.trace_dir = config.get('trace_dir', self.trace_dir)
+                    self.trace_format = config.get('trace_format', self.trace_format)
+                    # 加载编码配置
+                    self.encoder_profile = config.get('encoder_profile', self.encoder_profile)
+                    self.encoder_profiles = config.get('encoder_profiles', {})
+                    self.streaming = config.get('streaming', False)
+                    self.fill_mode = config.get('fill_mode', self.fill_mode)
+                    self.blur_quality = config.get('blur_quality', self.blur_quality)
+                    self.use_proxies = config.get('use_proxies', self.use_proxies)
+                    self.proxy_dir = config.get('proxy_dir', self.proxy_dir)
+                    self.music_beats = config.get('music_beats', self.music_beats)
+                    self.beat_sync = config.get('beat_sync', self.beat_sync)
                     
                     # 如果有保存的输入文件夹路径，加载视频文件
                     if self.selected_folder and os.path.exists(self.selected_folder):
@@ -195,9 +371,30 @@ class VideoMixerApp:
                 'music_pools': self.music_pools,  # 只保存当前存在的音乐池
                 'selected_pool': self.selected_pool,
                 'music_pool_states': selected_states,
-                'use_bgm': self.use_bgm_var.get()
+                'use_bgm': self.use_bgm_var.get(),
+                'clip_cache_dir': self.clip_cache_dir,
+                'clip_cache_max_mb': self.clip_cache_max_mb,
+                'scratch_dir': self.scratch_dir,
+                'scratch_budget_mb': self.scratch_budget_mb,
+                'trace_dir': self.trace_dir,
+                'trace_format': self.trace_format,
+                'encoder_profile': self.encoder_profile_var.get(),
+                'encoder_profiles': self.encoder_profiles,
+                'streaming': self.streaming_var.get(),
+                'fill_mode': self.fill_mode_var.get(),
+                'blur_quality': self.blur_quality_var.get(),
+                'use_proxies': self.use_proxies_var.get(),
+                'proxy_dir': self.proxy_dir,
+                'music_beats': self.music_beats,
+                'beat_sync': self.beat_sync_var.get()
             }
             
+            # 内容没有变化时不重写配置文件
+            content = json.dumps(config, ensure_ascii=False, indent=2)
+            self.config_dirty = False
+            if content == self._last_saved_config:
+                return
+            
             # 确保配置文件目录存在
             config_dir = os.path.dirname(self.config_file)
             if not os.path.exists(config_dir):
@@ -205,7 +402,8 @@ class VideoMixerApp:
             
             # 保存配置
             with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+                f.write(content)
+            self._last_saved_config = content
                 
         except Exception as e:
             print(f"保存配置文件失败: {e}")
@@ -216,12 +414,11 @@ class VideoMixerApp:
         if not os.path.exists(pool_path):
             return
         
-        music_extensions = ('.mp3', '.wav', '.m4a', '.aac')
         try:
             # 获取所有音乐文件
             music_files = [
                 f for f in os.listdir(pool_path)
-                if f.lower().endswith(music_extensions)
+                if f.lower().endswith(MUSIC_EXTENSIONS)
             ]
             
             # 存储音乐文件列表
@@ -360,6 +557,83 @@ class VideoMixerApp:
         self.output_name_entry = ttk.Entry(self.other_params_frame, textvariable=self.output_name_var, width=30)
         self.output_name_entry.grid(row=0, column=3, padx=5, sticky="ew")
         
+        # 编码配置选择
+        profile_names = list(load_profiles(self.encoder_profiles).keys())
+        self.encoder_profile_var = tk.StringVar(
+            value=self.encoder_profile if self.encoder_profile in profile_names else DEFAULT_PROFILE
+        )
+        ttk.Label(self.other_params_frame, text="编码配置:", width=12).grid(row=1, column=0, padx=(0,5), pady=(5,0))
+        self.encoder_profile_combo = ttk.Combobox(
+            self.other_params_frame,
+            textvariable=self.encoder_profile_var,
+            values=profile_names,
+            state="readonly",
+            width=8
+        )
+        self.encoder_profile_combo.grid(row=1, column=1, padx=5, pady=(5,0))
+        self.encoder_profile_combo.bind("<<ComboboxSelected>>", lambda e: self._auto_save_config())
+        
+        self.benchmark_btn = ttk.Button(
+            self.other_params_frame,
+            text="测试编码速度",
+            command=self._benchmark_profiles
+        )
+        self.benchmark_btn.grid(row=1, column=2, padx=(20,5), pady=(5,0))
+        
+        # 流式处理：片段通过管道直接送入合成进程，不生成片段文件，也不写入片段缓存
+        self.streaming_var = tk.BooleanVar(value=self.streaming)
+        self.streaming_check = ttk.Checkbutton(
+            self.other_params_frame,
+            text="流式处理（不生成片段文件）",
+            variable=self.streaming_var,
+            command=self._auto_save_config
+        )
+        self.streaming_check.grid(row=1, column=3, padx=5, pady=(5,0), sticky="w")
+        
+        # 画面填充方式：黑边或模糊背景，模糊背景可选质量/速度档位
+        self.fill_mode_var = tk.StringVar(value=self.fill_mode)
+        self.blur_quality_var = tk.StringVar(value=self.blur_quality)
+        ttk.Label(self.other_params_frame, text="画面填充:", width=12).grid(row=2, column=0, padx=(0,5), pady=(5,0))
+        self.fill_frame = ttk.Frame(self.other_params_frame)
+        self.fill_frame.grid(row=2, column=1, columnspan=3, padx=5, pady=(5,0), sticky="w")
+        for value, text in FILL_MODE_NAMES.items():
+            ttk.Radiobutton(
+                self.fill_frame,
+                text=text,
+                variable=self.fill_mode_var,
+                value=value,
+                command=self._update_fill_mode
+            ).pack(side="left", padx=5)
+        ttk.Label(self.fill_frame, text="模糊质量:").pack(side="left", padx=(20,5))
+        self.blur_quality_radios = []
+        for value, text in BLUR_QUALITY_NAMES.items():
+            radio = ttk.Radiobutton(
+                self.fill_frame,
+                text=text,
+                variable=self.blur_quality_var,
+                value=value,
+                command=self._auto_save_config
+            )
+            radio.pack(side="left", padx=5)
+            self.blur_quality_radios.append(radio)
+        self._update_fill_mode(save=False)
+        
+        # 代理素材：输入文件夹一次性转换为目标格式后，混剪时直接从代理文件截取片段
+        self.use_proxies_var = tk.BooleanVar(value=self.use_proxies)
+        self.use_proxies_check = ttk.Checkbutton(
+            self.other_params_frame,
+            text="使用代理素材",
+            variable=self.use_proxies_var,
+            command=self._auto_save_config
+        )
+        self.use_proxies_check.grid(row=3, column=0, columnspan=2, padx=(0,5), pady=(5,0), sticky="w")
+        self.proxy_btn = ttk.Button(
+            self.other_params_frame,
+            text="生成代理素材",
+            command=self._toggle_proxy_build
+        )
+        self.proxy_btn.grid(row=3, column=2, padx=(20,5), pady=(5,0))
+        
         # 音频选项
         self.audio_frame = ttk.Frame(self.params_frame)
         self.audio_frame.pack(fill="x")
@@ -553,6 +827,17 @@ class VideoMixerApp:
         )
         self.follow_music_radio.pack(side="left", padx=5)
         
+        # 跟随音乐模式下按音乐节拍切换片段
+        self.beat_sync_var = tk.BooleanVar(value=self.beat_sync)
+        self.beat_sync_check = ttk.Checkbutton(
+            self.bgm_mode_frame,
+            text="节拍卡点",
+            variable=self.beat_sync_var,
+            state="disabled",
+            command=self._auto_save_config
+        )
+        self.beat_sync_check.pack(side="left", padx=5)
+        
         # 音乐池控制按钮和列表（初始隐藏）
         self.music_pool_controls = [
             self.music_pool_btn_frame,
@@ -590,6 +875,14 @@ class VideoMixerApp:
             style="Accent.TButton",  # 使用强调样式
             width=20  # 设置按钮宽度
         )
+        self.batch_btn = ttk.Button(
+            self.process_frame,
+            text="批量任务",
+            command=self._start_batch
+        )
+        self.pause_btn = ttk.Button(self.process_frame, text="暂停", command=self._toggle_pause, state="disabled")
+        self.cancel_btn = ttk.Button(self.process_frame, text="取消", command=self._cancel_processing,
+                                     state="disabled")
         self.status_var = tk.StringVar(value="就绪")
         self.status_label = ttk.Label(self.process_frame, textvariable=self.status_var)
         
@@ -604,12 +897,14 @@ class VideoMixerApp:
             # 启用模式选择
             self.follow_video_radio.configure(state="normal")
             self.follow_music_radio.configure(state="normal")
+            self.beat_sync_check.configure(state="normal")
         else:
             for control in self.music_pool_controls:
                 control.pack_forget()
             # 禁用模式选择
             self.follow_video_radio.configure(state="disabled")
             self.follow_music_radio.configure(state="disabled")
+            self.beat_sync_check.configure(state="disabled")
         
         # 刷新音乐池列表显示
         self._refresh_music_pools()
@@ -642,6 +937,9 @@ class VideoMixerApp:
         # 开始混剪按钮和状态布局
         self.process_frame.pack(fill="x", pady=10)
         self.start_btn.pack(side="left", padx=5, pady=5, expand=True)
+        self.batch_btn.pack(side="left", padx=5, pady=5)
+        self.pause_btn.pack(side="left", padx=5, pady=5)
+        self.cancel_btn.pack(side="left", padx=5, pady=5)
         self.status_label.pack(side="right", padx=5)
     
     def _browse_input_folder(self):
@@ -702,16 +1000,18 @@ class VideoMixerApp:
             self.tree.delete(item)
         
         # 加载视频文件
-        video_extensions = ('.mp4', '.mov', '.avi')
         try:
             self.video_files = [
                 f for f in os.listdir(self.selected_folder)
-                if f.lower().endswith(video_extensions)
+                if f.lower().endswith(VIDEO_EXTENSIONS)
             ]
             
             # 添加到树形视图
             for file in self.video_files:
                 self.tree.insert("", "end", values=("✓", file))
+            
+            # 监视新的输入文件夹
+            self._update_watched_folders()
         except Exception as e:
             messagebox.showerror("错误", f"加载视频文件失败: {str(e)}")
             self.video_files = []
@@ -751,6 +1051,11 @@ class VideoMixerApp:
             os.startfile(video_path)
     
     def _start_processing(self):
+        # 同一时间只运行一个任务，否则前一个任务的进程无法再暂停或取消
+        if self.processing:
+            messagebox.showinfo("提示", "正在处理中，请稍候...")
+            return
+        
         # 如果没有选择文件夹但有保存的路径，使用保存的路径
         if not self.selected_folder and self.folder_path.get():
             self.selected_folder = self.folder_path.get()
@@ -807,7 +1112,7 @@ class VideoMixerApp:
         for item in self.tree.get_children():
             values = self.tree.item(item)["values"]
             if values[0] == "✓":
-                selected_videos.append(values[1])
+                selected_videos.append(str(values[1]))
         
         if not selected_videos:
             messagebox.showerror("错误", "请至少选择一个视频")
@@ -817,18 +1122,48 @@ class VideoMixerApp:
             messagebox.showerror("错误", "选中的视频数量少于需要的片段数量")
             return
         
-        # 创建临时文件夹
-        temp_dir = os.path.join(self.output_folder, "temp")
-        os.makedirs(temp_dir, exist_ok=True)
+        # 如果使用背景音乐，确认有可选的音乐
+        music_files = []
+        if self.use_bgm_var.get():
+            music_files = self._get_selected_background_music()
+            if not music_files:
+                messagebox.showerror("错误", "没有可用的背景音乐，请检查音乐池设置")
+                return
+        
+        # 根据界面设置生成任务描述
+        if self.no_audio_var.get():
+            audio_mode = AUDIO_NONE
+        elif self.voice_only_var.get():
+            audio_mode = AUDIO_VOICE
+        else:
+            audio_mode = AUDIO_KEEP
+        spec = JobSpec(
+            input_folder=self.selected_folder,
+            output_folder=self.output_folder,
+            clip_duration=duration,
+            clips=clips,
+            generate_count=generate_count,
+            output_name=self.output_name_var.get(),
+            videos=selected_videos,
+            audio_mode=audio_mode,
+            music_files=music_files,
+            bgm_mode=self.bgm_mode_var.get(),
+            beat_sync=self.beat_sync_var.get(),
+            sound_effect_type=self.sound_effect_type_var.get(),
+            sound_effect_path=self.sound_effect_path or None,
+            encoder_profile=self.encoder_profile_var.get(),
+            streaming=self.streaming_var.get(),
+            fill_mode=self.fill_mode_var.get(),
+            blur_quality=self.blur_quality_var.get(),
+            use_proxies=self.use_proxies_var.get()
+        )
         
         # 开始处理线程
-        self.processing = True
-        thread = threading.Thread(target=self._process_videos, args=(selected_videos, duration, clips, temp_dir, generate_count))
-        thread.daemon = True
-        thread.start()
+        self._start_job_thread(self._process_videos, spec)
     
     def _update_audio_options(self):
         """更新音频选项的互斥状态"""
+        self._auto_save_config()
         if self.use_bgm_var.get():
             # 如果使用背景音乐，禁用其他音频选项
             self.voice_only_var.set(False)
@@ -841,6 +1176,7 @@ class VideoMixerApp:
             # 启用模式选择
             self.follow_video_radio.configure(state="normal")
             self.follow_music_radio.configure(state="normal")
+            self.beat_sync_check.configure(state="normal")
         else:
             # 恢复其他音频选项
             self.voice_only_check.state(['!disabled'])
@@ -851,6 +1187,7 @@ class VideoMixerApp:
             # 禁用模式选择
             self.follow_video_radio.configure(state="disabled")
             self.follow_music_radio.configure(state="disabled")
+            self.beat_sync_check.configure(state="disabled")
 
     def _update_sound_effect_state(self):
         """更新音效相关控件的状态"""
@@ -877,233 +1214,250 @@ class VideoMixerApp:
             self.sound_effect_path_var.set(file_path)
             self._save_config()
 
-    def _get_unique_filename(self, base_name: str, index: int) -> str:
-        """生成不冲突的文件名"""
-        # 基础文件名格式
-        filename = f"{base_name}-{index}.mp4"
-        # 如果文件已存在，增加序号直到找到不存在的文件名
-        counter = 1
-        while os.path.exists(os.path.join(self.output_folder, filename)):
-            filename = f"{base_name}-{index}-{counter}.mp4"
-            counter += 1
-        return filename
+    def _benchmark_profiles(self):
+        """在第一个选中的视频上比较各编码配置的速度和文件大小"""
+        sample = None
+        for item in self.tree.get_children():
+            values = self.tree.item(item)["values"]
+            if values[0] == "✓":
+                sample = os.path.join(self.selected_folder, values[1])
+                break
+        if not sample:
+            messagebox.showerror("错误", "请至少选择一个视频作为测试样本")
+            return
+        
+        def run():
+            try:
+                results = benchmark_profiles(sample, load_profiles(self.encoder_profiles))
+                report = format_profile_report(results)
+                self.ui.call(messagebox.showinfo, "编码速度测试", report)
+            except Exception as e:
+                self.ui.call(messagebox.showerror, "错误", f"编码速度测试失败: {str(e)}")
+            finally:
+                self.ui.call(self.benchmark_btn.configure, {"state": "normal"})
+        
+        self.benchmark_btn.configure(state="disabled")
+        threading.Thread(target=run, daemon=True).start()
+
+    def _get_engine(self) -> MixEngine:
+        """获取混剪引擎（首次使用时按配置创建）"""
+        if self.engine is None:
+            self.engine = MixEngine(
+                cache_root=os.path.join(os.path.dirname(self.config_file), "cache"),
+                clip_cache_dir=self.clip_cache_dir or None,
+                clip_cache_max_bytes=int(self.clip_cache_max_mb) * 1024 * 1024,
+                encoder_profiles=self.encoder_profiles,
+                scratch_dir=self.scratch_dir or None,
+                scratch_budget_bytes=int(self.scratch_budget_mb) * 1024 * 1024,
+                trace_dir=self.trace_dir or None,
+                trace_format=self.trace_format,
+                proxy_dir=self.proxy_dir or None,
+                music_beats=self.music_beats
+            )
+        return self.engine
+
+    def _index_music_library(self):
+        """在后台为所有音乐池中的音乐建立索引，每首音乐只分析一次（文件变化后重新分析）
+
+        正在建立索引时再次调用，完成后会再运行一次以包含新增的音乐。
+        """
+        if self.music_indexing:
+            self.music_index_again = True
+            return
+        paths = [os.path.join(pool_path, f) for pool_path, files in self.music_files.items() for f in files]
+        if not paths:
+            return
+        self.music_indexing = True
+        self.music_index_again = False
+        library = self._get_engine().music_library
+        beats = self.music_beats
+
+        def run():
+            try:
+                library.analyze(paths, beats=beats)
+            except Exception as e:
+                print(f"建立音乐库索引失败: {e}")
+            finally:
+                self.ui.call(self._music_index_done)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _music_index_done(self):
+        self.music_indexing = False
+        if self.music_index_again:
+            self._index_music_library()
+
+    def _get_music_index(self) -> MediaIndex:
+        """获取音乐信息索引"""
+        return self._get_engine().music_index
+
+    def _update_fill_mode(self, save: bool = True):
+        """只有选择模糊背景时才能选择模糊质量"""
+        state = "normal" if self.fill_mode_var.get() == FILL_BLUR else "disabled"
+        for radio in self.blur_quality_radios:
+            radio.configure(state=state)
+        if save:
+            self._auto_save_config()
 
-    def _process_videos(self, videos: List[str], duration: float, clips: int, temp_dir: str, generate_count: int):
+    def _toggle_proxy_build(self):
+        """在后台为输入文件夹生成代理素材，再次点击时停止（已完成的文件下次不再生成）"""
+        if self.proxy_stop is not None:
+            self.proxy_stop.set()
+            self.proxy_btn.configure(text="正在停止...", state="disabled")
+            return
+        if not self.selected_folder:
+            messagebox.showerror("错误", "请先选择输入文件夹")
+            return
+        stop = threading.Event()
+        folder, fill_mode, blur_quality = self.selected_folder, self.fill_mode_var.get(), self.blur_quality_var.get()
+
+        def run():
+            try:
+                self._get_engine().build_proxies(folder, fill_mode, blur_quality,
+                                                 on_status=self.ui.post_status, stop=stop)
+            except MixError as e:
+                self.ui.call(messagebox.showerror, "错误", str(e))
+            except Exception as e:
+                self.ui.call(messagebox.showerror, "错误", f"生成代理素材失败: {str(e)}")
+            finally:
+                self.proxy_stop = None
+                self.ui.call(self.proxy_btn.configure, {"text": "生成代理素材", "state": "normal"})
+
+        self.proxy_stop = stop
+        self.proxy_btn.configure(text="停止生成代理")
+        threading.Thread(target=run, daemon=True).start()
+
+    def _start_batch(self):
+        """选择任务清单，在后台按队列执行其中所有任务"""
+        if self.processing:
+            messagebox.showinfo("提示", "正在处理中，请稍候...")
+            return
+        manifest = filedialog.askopenfilename(
+            title="选择任务清单",
+            filetypes=[("任务清单", "*.json *.yaml *.yml"), ("所有文件", "*.*")]
+        )
+        if not manifest:
+            return
+        self._start_job_thread(self._process_batch, manifest)
+
+    def _start_job_thread(self, target, *args):
+        """在后台线程中开始处理，处理期间可以暂停和取消"""
+        self.processing = True
+        self.job_control = JobControl()
+        self.start_btn.configure(state="disabled")
+        self.pause_btn.configure(text="暂停", state="normal")
+        self.cancel_btn.configure(text="取消", state="normal")
+        thread = threading.Thread(target=target, args=args + (self.job_control,))
+        thread.daemon = True
+        thread.start()
+        self.process_thread = thread
+
+    def _finish_job(self):
+        """处理线程结束时调用（在界面线程中执行）"""
+        self.processing = False
+        self.job_control = None
+        self.process_thread = None
+        self.start_btn.configure(state="normal")
+        self.pause_btn.configure(text="暂停", state="disabled")
+        self.cancel_btn.configure(text="取消", state="disabled")
+
+    def _toggle_pause(self):
+        """暂停或继续当前任务：暂停时正在运行的ffmpeg进程被挂起，不再开始新的片段"""
+        control = self.job_control
+        if control is None:
+            return
+        if control.paused:
+            control.resume()
+            self.pause_btn.configure(text="暂停")
+            self.status_var.set("继续处理...")
+        else:
+            control.pause()
+            self.pause_btn.configure(text="继续")
+            self.status_var.set("已暂停")
+
+    def _cancel_processing(self):
+        """取消当前任务，由用户选择是否保留已完成的视频"""
+        control = self.job_control
+        if control is None:
+            return
+        answer = messagebox.askyesnocancel(
+            "取消任务",
+            "确定取消当前任务吗？\n\n是：保留已完成的视频\n否：删除本次已完成的视频"
+        )
+        if answer is None or self.job_control is not control:
+            return
+        control.cancel(keep_outputs=answer)
+        self.pause_btn.configure(text="暂停", state="disabled")
+        self.cancel_btn.configure(text="正在取消...", state="disabled")
+        self.status_var.set("正在取消...")
+
+    def _on_close(self):
+        """关闭窗口：正在处理时确认后取消任务，等待ffmpeg进程结束再退出"""
+        control, thread = self.job_control, self.process_thread
+        if control is not None:
+            if not messagebox.askokcancel("退出", "正在处理中，退出将取消当前任务（保留已完成的视频），确定退出吗？"):
+                return
+            control.cancel()
+            if thread is not None:
+                thread.join(timeout=TERMINATE_GRACE * 4)
+        self.watcher.close()
+        self.root.destroy()
+
+    def _process_batch(self, manifest: str, control: JobControl):
+        """在后台线程中执行任务清单"""
         try:
-            base_name = self.output_name_var.get()
-            voice_only = self.voice_only_var.get()
-            no_audio = self.no_audio_var.get()
-            use_bgm = self.use_bgm_var.get()
-            sound_effect_type = self.sound_effect_type_var.get()
-            sound_effect_path = self.sound_effect_path if sound_effect_type != "none" else None
-            
-            # 计算总步骤数（用于进度计算）
-            total_steps = generate_count * (clips + 1)  # clips个片段处理 + 1个合并步骤
-            current_step = 0
-            
-            for video_index in range(generate_count):
-                # 随机选择视频
-                selected_clips = random.sample(videos, clips)
-                temp_files = []
-                
-                # 如果使用背景音乐，随机选择一个
-                background_music = None
-                if use_bgm:
-                    background_music = self._get_random_background_music()
-                    if not background_music:
-                        messagebox.showerror("错误", "没有可用的背景音乐，请检查音乐池设置")
-                        return
-                
-                # 处理每个视频片段
-                for i, video in enumerate(selected_clips, 1):
-                    current_step += 1
-                    progress = (current_step / total_steps) * 100
-                    self.status_var.set(f"处理第 {video_index + 1}/{generate_count} 个视频的片段 {i}/{clips} - 进度: {progress:.1f}%")
-                    input_path = os.path.join(self.selected_folder, video)
-                    temp_path = os.path.join(temp_dir, f"temp_{video_index}_{i}.mp4")
-                    processed_path = os.path.join(temp_dir, f"processed_{video_index}_{i}.mp4")
-                    output_path = os.path.join(temp_dir, f"clip_{video_index}_{i}.mp4")
-                    temp_files.append(output_path)
-                    
-                    # 首先裁剪视频片段
-                    if no_audio or use_bgm:  # 如果使用背景音乐，也需要去除原音频
-                        # 完全去除音频
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", input_path,
-                            "-t", str(duration),
-                            "-vf", "scale=w=1080:h=1920:force_original_aspect_ratio=decrease,"
-                                  "pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
-                            "-an",  # 去除音频
-                            "-c:v", "libx264",
-                            "-preset", "medium",
-                            "-crf", "18",
-                            processed_path
-                        ]
-                    else:
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", input_path,
-                            "-t", str(duration),
-                            "-vf", "scale=w=1080:h=1920:force_original_aspect_ratio=decrease,"
-                                  "pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
-                            "-c:v", "libx264",
-                            "-preset", "medium",
-                            "-crf", "18",
-                            "-c:a", "aac",
-                            "-b:a", "192k",
-                            processed_path
-                        ]
-                    subprocess.run(cmd, check=True)
-                    
-                    if not no_audio and not use_bgm and voice_only:
-                        # 使用FFmpeg的语音分离功能处理音频
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", processed_path,
-                            "-af", "pan=stereo|c0=c0,lowpass=3000,highpass=200",
-                            "-c:v", "copy",
-                            temp_path
-                        ]
-                        subprocess.run(cmd, check=True)
-                        os.remove(processed_path)
-                        processed_path = temp_path
-                    
-                    if sound_effect_type == "clips" and sound_effect_path:
-                        # 在每个片段开头添加音效
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", processed_path,
-                            "-i", sound_effect_path,
-                            "-filter_complex", "[1:a]adelay=0|0[delayed];[0:a][delayed]amix=inputs=2:duration=first",
-                            "-c:v", "copy",
-                            output_path
-                        ]
-                        subprocess.run(cmd, check=True)
-                        if os.path.exists(processed_path):
-                            os.remove(processed_path)
-                    else:
-                        # 如果不需要添加音效，直接使用处理后的视频
-                        os.rename(processed_path, output_path)
-                
-                # 合并视频片段
-                current_step += 1
-                progress = (current_step / total_steps) * 100
-                self.status_var.set(f"合并第 {video_index + 1}/{generate_count} 个视频... - 进度: {progress:.1f}%")
-                
-                # 创建文件列表
-                list_file = os.path.join(temp_dir, f"list_{video_index}.txt")
-                with open(list_file, "w", encoding="utf-8") as f:
-                    for temp_file in temp_files:
-                        f.write(f"file '{temp_file}'\n")
-                
-                # 合并视频
-                merged_path = os.path.join(temp_dir, f"merged_{video_index}.mp4")
-                cmd = [
-                    "ffmpeg", "-y",
-                    "-f", "concat",
-                    "-safe", "0",
-                    "-i", list_file,
-                    "-c", "copy",
-                    merged_path
-                ]
-                subprocess.run(cmd, check=True)
-                
-                # 如果需要添加背景音乐
-                output_file = os.path.join(self.output_folder, self._get_unique_filename(base_name, video_index + 1))
-                if use_bgm and background_music:
-                    if self.bgm_mode_var.get() == "follow_video":
-                        # 跟随视频模式：音乐循环或裁剪到视频长度
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", merged_path,
-                            "-i", background_music,
-                            "-filter_complex",
-                            "[1:a]aloop=loop=-1:size=2e+09[loop];[loop]aresample=44100[a];[a]volume=0.5[bgm];[bgm]atrim=duration=" + str(duration * clips) + "[final]",
-                            "-map", "0:v",
-                            "-map", "[final]",
-                            "-c:v", "copy",
-                            "-c:a", "aac",
-                            "-b:a", "192k",
-                            output_file
-                        ]
-                    else:
-                        # 跟随音乐模式：视频长度适应音乐长度
-                        cmd = [
-                            "ffmpeg", "-y",
-                            "-i", merged_path,
-                            "-i", background_music,
-                            "-filter_complex",
-                            "[0:v]setpts=PTS*{video_speed}[v];[1:a]volume=0.5[a]".format(
-                                video_speed=duration * clips / float(subprocess.check_output([
-                                    "ffprobe",
-                                    "-v", "error",
-                                    "-show_entries", "format=duration",
-                                    "-of", "default=noprint_wrappers=1:nokey=1",
-                                    background_music
-                                ]).decode().strip())
-                            ),
-                            "-map", "[v]",
-                            "-map", "[a]",
-                            "-c:v", "libx264",
-                            "-preset", "medium",
-                            "-crf", "18",
-                            "-c:a", "aac",
-                            "-b:a", "192k",
-                            output_file
-                        ]
-                    subprocess.run(cmd, check=True)
-                    os.remove(merged_path)
-                elif sound_effect_type == "video" and sound_effect_path:
-                # 如果需要在完整视频开头添加音效
-                    cmd = [
-                        "ffmpeg", "-y",
-                        "-i", merged_path,
-                        "-i", sound_effect_path,
-                        "-filter_complex", "[1:a]adelay=0|0[delayed];[0:a][delayed]amix=inputs=2:duration=first",
-                        "-c:v", "copy",
-                        output_file
-                    ]
-                    subprocess.run(cmd, check=True)
-                    os.remove(merged_path)
-                else:
-                    os.rename(merged_path, output_file)
-                
-                # 删除临时文件
-                for temp_file in temp_files:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                os.remove(list_file)
+            job_queue, counts = run_manifest(manifest, self._get_engine(), on_status=self.ui.post_status,
+                                             control=control)
+            if control.cancelled:
+                self.ui.post_status("批量任务已取消")
+                self.ui.call(messagebox.showinfo, "已取消",
+                             f"已完成 {counts[DONE]} 个任务，未完成的任务下次运行同一清单时继续")
+                return
+            self.ui.post_status("批量任务完成!")
+            message = f"完成 {counts[DONE]} 个任务，失败 {counts[FAILED]} 个\n结果已保存到 {job_queue.results_path}"
+            if counts[FAILED]:
+                self.ui.call(messagebox.showwarning, "完成", message)
+            else:
+                self.ui.call(messagebox.showinfo, "完成", message)
+        except MixError as e:
+            self.ui.post_status("处理出错!")
+            self.ui.call(messagebox.showerror, "错误", str(e))
+        except Exception as e:
+            self.ui.post_status("处理出错!")
+            self.ui.call(messagebox.showerror, "错误", f"发生错误: {str(e)}")
+        finally:
+            self.processing = False
+            self.ui.call(self._finish_job)
+
+    def _process_videos(self, spec: JobSpec, control: JobControl):
+        """在后台线程中执行混剪任务"""
+        try:
+            outputs = self._get_engine().run(spec, on_status=self.ui.post_status, control=control)
+            self.processing = False
+            self.ui.call(messagebox.showinfo, "完成", f"已成功生成 {len(outputs)} 个混剪视频!")
             
-            # 删除临时文件夹
-            os.rmdir(temp_dir)
+        except JobCancelled:
+            # 引擎已在状态栏显示保留或删除了多少个已完成的视频
+            self.processing = False
             
-            self.status_var.set("处理完成!")
+        except MixError as e:
+            self.ui.post_status("处理出错!")
             self.processing = False
-            messagebox.showinfo("完成", f"已成功生成 {generate_count} 个混剪视频!")
+            self.ui.call(messagebox.showerror, "错误", str(e))
             
         except subprocess.CalledProcessError as e:
-            self.status_var.set("处理出错!")
+            self.ui.post_status("处理出错!")
             self.processing = False
-            messagebox.showerror("错误", f"视频处理失败: {str(e)}")
+            self.ui.call(messagebox.showerror, "错误", f"视频处理失败: {str(e)}")
             
         except Exception as e:
-            self.status_var.set("处理出错!")
+            self.ui.post_status("处理出错!")
             self.processing = False
-            messagebox.showerror("错误", f"发生错误: {str(e)}")
+            self.ui.call(messagebox.showerror, "错误", f"发生错误: {str(e)}")
         
         finally:
-            # 确保清理临时文件
-            if os.path.exists(temp_dir):
-                for file in os.listdir(temp_dir):
-                    try:
-                        os.remove(os.path.join(temp_dir, file))
-                    except:
-                        pass
-                try:
-                    os.rmdir(temp_dir)
-                except:
-                    pass
+            self.processing = False
+            self.ui.call(self._finish_job)
 
     def _update_mode_state(self):
         """更新模式相关控件的状态"""
@@ -1131,14 +1485,8 @@ class VideoMixerApp:
             if target_duration <= 0:
                 raise ValueError("目标时长必须大于0")
             
-            # 使用5秒作为默认片段时长
-            default_clip_duration = 5
-            
-            # 计算建议的片段数量（向上取整）
-            suggested_clips = math.ceil(target_duration / default_clip_duration)
-            
-            # 计算实际的片段时长
-            suggested_duration = target_duration / suggested_clips
+            # 使用5秒作为默认片段时长，计算建议的片段时长和数量
+            suggested_duration, suggested_clips = suggest_clip_params(target_duration)
             
             # 更新显示
             self.auto_duration_var.set(f"{suggested_duration:.1f}")
@@ -1190,9 +1538,11 @@ class VideoMixerApp:
         # 添加到音乐池列表
         self.music_pools[name] = folder
         self._load_music_files(folder)
+        self._index_music_library()
         
         # 更新显示
         self._refresh_music_pools()
+        self._update_watched_folders()
         self._save_config()
     
     def _remove_music_pool(self):
@@ -1240,6 +1590,7 @@ class VideoMixerApp:
         
         # 更新显示
         self._refresh_music_pools()
+        self._update_watched_folders()
         # 立即保存配置
         self._save_config()
         
@@ -1294,7 +1645,10 @@ class VideoMixerApp:
         
         # 只显示最后选中的音乐池的内容
         last_selected = selection[-1]
-        pool_name = self.pool_listbox.get(last_selected)
+        self._show_pool(self.pool_listbox.get(last_selected))
+
+    def _show_pool(self, pool_name: str):
+        """在音乐列表中显示音乐池的内容"""
         pool_path = self.music_pools.get(pool_name)
         
         if not pool_path:
@@ -1308,19 +1662,17 @@ class VideoMixerApp:
         for item in self.music_tree.get_children():
             self.music_tree.delete(item)
         
-        # 加载音乐文件到列表
+        # 加载音乐文件到列表，时长在后台获取，不阻塞界面
         if pool_path in self.music_files:
+            items = []
             for file in self.music_files[pool_path]:
-                file_path = os.path.join(pool_path, file)
-                try:
-                    duration = self._get_music_duration(file_path)
-                    duration_str = f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else "未知"
-                except:
-                    duration_str = "未知"
-                self.music_tree.insert("", "end", values=("✓", file, duration_str))
+                item = self.music_tree.insert("", "end", values=("✓", file, DURATION_PLACEHOLDER))
+                items.append((item, os.path.join(pool_path, file)))
+            fill_durations_async(self.root, self.music_tree, self._get_music_index(), items)
         
         # 保存当前选中的音乐池
         self.selected_pool = pool_name
+        self._auto_save_config()
 
     def _update_bgm_mode(self):
         """更新背景音乐模式"""
@@ -1350,34 +1702,44 @@ class VideoMixerApp:
             music_file = random.choice(music_files)
             music_path = os.path.join(pool_path, music_file)
             
-            try:
-                # 使用ffprobe获取音乐时长
-                cmd = [
-                    "ffprobe",
-                    "-v", "error",
-                    "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1",
-                    music_path
-                ]
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                duration = float(result.stdout.strip())
-                
-                # 设置建议的片段参数
-                suggested_duration = 5  # 默认5秒
-                suggested_clips = math.ceil(duration / suggested_duration)
-                
-                # 更新界面显示
-                if self.mode_var.get() == "auto":
-                    self.target_duration_var.set(str(duration))
-                    self._auto_calculate()
-                else:
-                    self.duration_var.set(str(suggested_duration))
-                    self.clips_var.set(str(suggested_clips))
-                    self._calculate_total()
-                
-            except Exception as e:
-                messagebox.showerror("错误", f"获取音乐时长失败: {str(e)}")
-                self.bgm_mode_var.set("follow_video")
+            # 时长从音乐库索引读取；尚未分析的音乐在后台获取，不阻塞界面
+            music_index = self._get_music_index()
+            info = music_index.get(music_path)
+            if info is not None:
+                self._apply_music_duration(info.get("duration"))
+                return
+            
+            def probe():
+                try:
+                    duration = music_index.refresh([music_path]).get(music_path, {}).get("duration")
+                except Exception as e:
+                    duration = None
+                    print(f"获取音乐时长失败: {e}")
+                self.ui.call(self._apply_music_duration, duration)
+            
+            threading.Thread(target=probe, daemon=True).start()
+
+    def _apply_music_duration(self, duration: Optional[float]):
+        """按音乐时长设置建议的片段参数"""
+        if self.bgm_mode_var.get() != "follow_music":
+            return
+        if not duration:
+            messagebox.showerror("错误", "获取音乐时长失败")
+            self.bgm_mode_var.set("follow_video")
+            return
+        
+        # 设置建议的片段参数
+        suggested_duration = 5  # 默认5秒
+        suggested_clips = math.ceil(duration / suggested_duration)
+        
+        # 更新界面显示
+        if self.mode_var.get() == "auto":
+            self.target_duration_var.set(str(duration))
+            self._auto_calculate()
+        else:
+            self.duration_var.set(str(suggested_duration))
+            self.clips_var.set(str(suggested_clips))
+            self._calculate_total()
 
     def _show_music_list(self, event):
         """显示音乐池中的音乐列表"""
@@ -1401,20 +1763,90 @@ class VideoMixerApp:
             self.root,
             pool_name,
             pool_path,
-            self.music_files[pool_path]
+            self.music_files[pool_path],
+            self._get_music_index()
         )
 
     def _start_auto_update(self):
-        """启动定时更新"""
+        """启动文件夹监视和配置保存
+
+        输入文件夹和音乐池的文件增删由FolderWatcher推送为增量事件，
+        配置只在有修改（config_dirty）时写入。
+        """
+        if self.selected_folder and os.path.exists(self.selected_folder):
+            self._load_videos()
+        self._update_watched_folders()
+        
         def update():
-            if not self.processing:  # 如果不在处理视频
-                self._check_folders()  # 检查文件夹状态
-                self._auto_save_config()  # 自动保存配置
-                self._refresh_music_pools()  # 刷新音乐池
-            self.root.after(3000, update)  # 每3秒更新一次
+            self._check_folders()  # 检查文件夹状态
+            try:
+                for event in self.watcher.poll():
+                    self._on_folder_event(event)
+            except Exception as e:
+                print(f"处理文件夹变化失败: {e}")
+            if self.config_dirty:
+                self._save_config()
+            self.root.after(WATCH_INTERVAL_MS, update)
         
         update()  # 开始第一次更新
 
+    def _update_watched_folders(self):
+        """监视当前的输入文件夹和所有音乐池"""
+        folders = {}
+        for pool_path in self.music_pools.values():
+            folders[pool_path] = MUSIC_EXTENSIONS
+        if self.selected_folder:
+            folders[self.selected_folder] = VIDEO_EXTENSIONS
+        self.watcher.set_folders(folders)
+
+    def _on_folder_event(self, event: FolderEvent):
+        """根据文件夹事件增量更新视频列表和音乐列表"""
+        if event.kind == RESCAN:
+            # 事件丢失或文件夹本身被移动/删除，重新读取
+            if event.folder == self.selected_folder:
+                self._load_videos()
+            if event.folder in self.music_pools.values():
+                self._load_music_files(event.folder)
+                self._index_music_library()
+                if self._displayed_pool_path() == event.folder:
+                    self._show_pool(self.selected_pool)
+            self.watcher.unwatch(event.folder)
+            self._update_watched_folders()
+            return
+        
+        if event.folder == self.selected_folder:
+            if event.kind == ADDED and event.name not in self.video_files:
+                self.video_files.append(event.name)
+                self.tree.insert("", "end", values=("✓", event.name))
+            elif event.kind == REMOVED and event.name in self.video_files:
+                self.video_files.remove(event.name)
+                for item in self.tree.get_children():
+                    if str(self.tree.item(item)["values"][1]) == event.name:
+                        self.tree.delete(item)
+        
+        if event.folder in self.music_pools.values():
+            music_files = self.music_files.setdefault(event.folder, [])
+            displayed = self._displayed_pool_path() == event.folder
+            if event.kind == ADDED and event.name not in music_files:
+                music_files.append(event.name)
+                self._index_music_library()
+                if displayed:
+                    item = self.music_tree.insert("", "end", values=("✓", event.name, DURATION_PLACEHOLDER))
+                    fill_durations_async(
+                        self.root, self.music_tree, self._get_music_index(),
+                        [(item, os.path.join(event.folder, event.name))]
+                    )
+            elif event.kind == REMOVED and event.name in music_files:
+                music_files.remove(event.name)
+                if displayed:
+                    for item in self.music_tree.get_children():
+                        if str(self.music_tree.item(item)["values"][1]) == event.name:
+                            self.music_tree.delete(item)
+
+    def _displayed_pool_path(self) -> Optional[str]:
+        """当前音乐列表显示的音乐池路径"""
+        return self.music_pools.get(self.selected_pool) if self.selected_pool else None
+
     def _check_folders(self):
         """检查文件夹状态并更新显示"""
         # 检查输入文件夹
@@ -1422,8 +1854,11 @@ class VideoMixerApp:
             if not os.path.exists(self.selected_folder):
                 self.folder_path.set("文件夹不存在: " + self.selected_folder)
             elif self.folder_path.get() != self.selected_folder:
+                reappeared = self.folder_path.get() == "文件夹不存在: " + self.selected_folder
                 self.folder_path.set(self.selected_folder)
-                self._load_videos()
+                if reappeared:
+                    # 文件夹重新出现，重新读取并监视
+                    self._load_videos()
         
         # 检查输出文件夹
         if self.output_folder:
@@ -1433,11 +1868,8 @@ class VideoMixerApp:
                 self.output_path.set(self.output_folder)
 
     def _auto_save_config(self):
-        """自动保存配置（限制保存频率）"""
-        current_time = time.time()
-        if current_time - self.last_save_time >= 3:  # 至少间隔3秒
-            self._save_config()
-            self.last_save_time = current_time
+        """标记配置已修改，由定时检查统一保存"""
+        self.config_dirty = True
 
     def _update_input_folder(self):
         """实时更新输入文件夹路径"""
@@ -1454,31 +1886,25 @@ class VideoMixerApp:
             self.output_folder = new_path
             self._auto_save_config()
 
-    def _get_random_background_music(self):
-        """获取随机背景音乐"""
+    def _get_selected_background_music(self) -> List[str]:
+        """获取选中的背景音乐路径"""
         # 获取选中的音乐池
         selection = self.pool_listbox.curselection()
         if not selection:
-            return None
+            return []
         
         pool_name = self.pool_listbox.get(selection[0])
         pool_path = self.music_pools.get(pool_name)
         if not pool_path or pool_path not in self.music_files:
-            return None
+            return []
         
         # 获取选中的音乐
         selected_music = []
         for item in self.music_tree.get_children():
             values = self.music_tree.item(item)["values"]
             if values[0] == "✓":
-                selected_music.append(values[1])
-        
-        if not selected_music:
-            return None
-        
-        # 随机选择一个音乐文件
-        music_file = random.choice(selected_music)
-        return os.path.join(pool_path, music_file)
+                selected_music.append(os.path.join(pool_path, str(values[1])))
+        return selected_music
 
 class MusicPoolNameDialog:
     def __init__(self, parent, default_name):
@@ -0,0 +1,114 @@
+"""混剪引擎：不依赖GUI的视频处理组件"""
+from .assembly import (
+    BGM_VOLUME,
+    STREAM_FORMAT,
+    STREAM_INPUT_ARGS,
+    build_assembly_command,
+    stream_output_args,
+    write_concat_list,
+)
+from .cache import DEFAULT_CACHE_MAX_BYTES, ClipCache, file_identity
+from .control import TERMINATE_GRACE, JobCancelled, JobControl
+from .engine import (
+    AUDIO_KEEP,
+    AUDIO_NONE,
+    AUDIO_VOICE,
+    BGM_FOLLOW_MUSIC,
+    BGM_FOLLOW_VIDEO,
+    SOUND_EFFECT_CLIPS,
+    SOUND_EFFECT_NONE,
+    SOUND_EFFECT_VIDEO,
+    JobSpec,
+    MixEngine,
+    MixError,
+    suggest_clip_params,
+)
+from .ffmpeg import (
+    parse_progress_block,
+    probe_duration,
+    probe_frame_count,
+    read_progress,
+    run_ffmpeg,
+    run_ffmpeg_pipeline,
+)
+from .filters import (
+    BLUR_PRESETS,
+    DEFAULT_BLUR_QUALITY,
+    FILL_BLACK,
+    FILL_BLUR,
+    TARGET_HEIGHT,
+    TARGET_WIDTH,
+    VOICE_FILTER,
+    SILENCE_SOURCE,
+    FilterGraph,
+    add_blur_fill,
+    build_clip_args,
+    build_clip_filter_graph,
+    is_conforming,
+    scale_pad_filter,
+    stream_signature,
+)
+from .journal import BatchJournal, file_sha256, journal_path
+from .media_index import (
+    OFFSET_STEP,
+    PROBE_VERSION,
+    MediaIndex,
+    preceding_keyframe,
+    probe_keyframes,
+    probe_media,
+)
+from .music import (
+    BGM_TARGET_LUFS,
+    MusicLibrary,
+    analyze_audio,
+    bgm_gain_db,
+    detect_beats,
+)
+from .planner import (
+    MAX_PREROLL,
+    ClipPlanner,
+    PlannedClip,
+    PlannedOutput,
+    beat_cut_lengths,
+    clip_timing,
+    keyframe_candidates,
+    offset_candidates,
+)
+from .profiles import (
+    BUILTIN_PROFILES,
+    DEFAULT_PROFILE,
+    EncoderProfile,
+    get_profile,
+    load_profiles,
+)
+from .progress import COPY_COST, PROGRESS_INTERVAL, BatchProgress, ProgressSnapshot, format_eta
+from .proxy import (
+    PROXY_FPS,
+    PROXY_GOP,
+    PROXY_PROFILE,
+    ProxyLibrary,
+    build_proxy_command,
+    proxy_variant,
+)
+from .scheduler import (
+    ENCODER_THREADS,
+    JobGraph,
+    Scheduler,
+    Task,
+    TaskCancelled,
+    default_worker_count,
+)
+from .scratch import (
+    DEFAULT_SCRATCH_BUDGET,
+    ScratchSpace,
+    ScratchSpaceError,
+    estimate_bytes,
+    move_into_place,
+)
+from .trace import (
+    FORMAT_CHROME as TRACE_FORMAT_CHROME,
+    FORMAT_JSONL as TRACE_FORMAT_JSONL,
+    Tracer,
+    load_records,
+    summarize,
+)
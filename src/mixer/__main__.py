@@ -0,0 +1,6 @@
+"""python -m mixer 的入口"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,76 @@
+"""最终合成：在一次ffmpeg调用中完成片段合并、背景音乐混合和音效叠加"""
+from typing import List, Optional
+
+from .filters import FilterGraph
+
+# 背景音乐响度未知时使用的固定音量
+BGM_VOLUME = 0.5
+
+# 流式模式下片段通过管道传给合成进程使用的容器格式
+# MPEG-TS可以直接首尾相接，不需要像MP4那样在结尾写入moov
+STREAM_FORMAT = "mpegts"
+STREAM_INPUT_ARGS = ["-f", STREAM_FORMAT, "-i", "pipe:0"]
+
+
+def stream_output_args(offset: float) -> List[str]:
+    """片段输出到管道的参数，时间戳从offset开始，使多个片段首尾相接后时间连续"""
+    return [
+        "-output_ts_offset", f"{offset:.3f}",
+        "-muxdelay", "0",
+        "-muxpreload", "0",
+        "-f", STREAM_FORMAT,
+        "pipe:1",
+    ]
+
+
+def write_concat_list(list_file: str, clip_files: List[str]):
+    """写入concat分离器使用的文件列表"""
+    with open(list_file, "w", encoding="utf-8") as f:
+        for clip_file in clip_files:
+            f.write(f"file '{clip_file}'\n")
+
+
+def build_assembly_command(list_file: Optional[str], output_file: str, total_duration: float,
+                           background_music: Optional[str] = None,
+                           sound_effect_path: Optional[str] = None,
+                           input_args: Optional[List[str]] = None,
+                           bgm_gain_db: Optional[float] = None) -> List[str]:
+    """生成最终合成的ffmpeg命令
+
+    输入0为片段列表（concat分离器），输入1为背景音乐或视频开头音效，视频流直接复制。
+    背景音乐循环或裁剪到视频长度；跟随音乐模式下片段时长已按音乐时长规划，
+    合成方式相同。背景音乐按bgm_gain_db（由音乐库预先测得的响度计算，见mixer.music）
+    调整音量，未知时使用固定音量BGM_VOLUME。input_args用于替换输入0，例如流式模式下
+    从管道读取的STREAM_INPUT_ARGS，此时忽略list_file。
+    """
+    cmd = ["ffmpeg", "-y"] + (input_args or [
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_file,
+    ])
+    graph = FilterGraph()
+
+    if background_music:
+        cmd += ["-i", background_music]
+        audio = graph.add(["1:a"], "aloop=loop=-1:size=2e+09", "loop")
+        audio = graph.add([audio], "aresample=44100", "a")
+        volume = f"{bgm_gain_db:g}dB" if bgm_gain_db is not None else f"{BGM_VOLUME}"
+        audio = graph.add([audio], f"volume={volume}", "bgm")
+        audio = graph.add([audio], f"atrim=duration={total_duration}", "final")
+    elif sound_effect_path:
+        # 在完整视频开头添加音效
+        cmd += ["-i", sound_effect_path]
+        delayed = graph.add(["1:a"], "adelay=0|0", "delayed")
+        audio = graph.add(["0:a", delayed], "amix=inputs=2:duration=first", "mixed")
+    else:
+        return cmd + ["-c", "copy", output_file]
+
+    return cmd + [
+        "-filter_complex", str(graph),
+        "-map", "0:v",
+        "-map", f"[{audio}]",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-b:a", "192k",
+        output_file
+    ]
@@ -0,0 +1,235 @@
+"""批量任务：从JSON/YAML任务清单读取多个混剪任务，排队执行并记录结果
+
+任务清单格式（JSON与YAML结构相同）：
+
+    {
+        "max_jobs": 2,                  # 同时运行的任务数
+        "max_workers": 8,               # 所有任务合计同时运行的ffmpeg进程数
+        "defaults": {"output_folder": "输出", "clips": 10, "clip_duration": 5},
+        "jobs": [
+            {"name": "美食", "input_folder": "素材/美食", "generate_count": 20},
+            {"name": "旅行", "input_folder": "素材/旅行",
+             "matrix": {"music_pool": ["音乐/轻快", "音乐/抒情"], "clip_duration": [3, 5]}}
+        ]
+    }
+
+带matrix的任务按各取值的组合展开为多个任务（名称追加"-序号"）。未指定output_name时
+以任务名称作为输出文件名。每个任务的状态、耗时和输出记录在结果文件中，结果文件同时
+作为持久化的队列：重新运行同一清单时跳过已完成的任务，未完成的任务跳过其中已完整
+生成的输出，从中断处继续。
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .control import JobCancelled, JobControl
+from .engine import JobSpec, MixEngine, MixError
+from .scheduler import default_worker_count
+
+try:
+    import yaml
+except ImportError:  # PyYAML为可选依赖，只有读取YAML清单时需要
+    yaml = None
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def load_manifest(path: str) -> dict:
+    """读取JSON或YAML格式的任务清单"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise MixError("读取YAML任务清单需要安装PyYAML（pip install pyyaml）")
+            try:
+                manifest = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise MixError(f"任务清单格式错误: {e}")
+        else:
+            manifest = json.load(f)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise MixError("任务清单格式错误：缺少jobs列表")
+    return manifest
+
+
+def expand_jobs(manifest: dict, base_dir: str = "") -> List[Tuple[str, JobSpec]]:
+    """把任务清单展开为(任务名称, 任务描述)列表
+
+    相对路径按清单文件所在目录解析。
+    """
+    defaults = manifest.get("defaults", {})
+    jobs = []
+    for n, entry in enumerate(manifest["jobs"], 1):
+        entry = dict(entry)
+        name = str(entry.pop("name", f"job-{n}"))
+        matrix = entry.pop("matrix", {})
+        keys = list(matrix)
+        combos = list(itertools.product(*(matrix[key] for key in keys)))
+        for k, combo in enumerate(combos, 1):
+            data = {**defaults, **entry, **dict(zip(keys, combo))}
+            job_name = f"{name}-{k}" if keys else name
+            data.setdefault("output_name", job_name)
+            data["skip_existing"] = True
+            for key in ("input_folder", "output_folder", "music_pool", "sound_effect_path"):
+                if data.get(key):
+                    data[key] = os.path.join(base_dir, data[key])
+            if data.get("music_files"):
+                data["music_files"] = [os.path.join(base_dir, path) for path in data["music_files"]]
+            jobs.append((job_name, JobSpec.from_dict(data)))
+
+    names = [name for name, _ in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise MixError(f"任务名称重复: {', '.join(duplicates)}")
+    outputs = [(os.path.abspath(spec.output_folder), spec.output_name) for _, spec in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise MixError("多个任务使用了相同的输出文件夹和输出文件名")
+    return jobs
+
+
+class JobQueue:
+    """持久化的任务队列，状态保存在结果文件（JSON）中
+
+    max_jobs个任务同时运行；所有任务共享max_workers个ffmpeg进程名额。
+    所有任务共用control：暂停或取消对正在运行的任务同时生效，取消后尚未开始的任务不再开始，
+    被取消的任务保持pending状态，下次运行时继续。
+    """
+
+    def __init__(self, results_path: str, engine: MixEngine, max_jobs: int = 1,
+                 max_workers: Optional[int] = None,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 control: Optional[JobControl] = None):
+        self.results_path = results_path
+        self.engine = engine
+        self.max_jobs = max(1, max_jobs)
+        self.max_workers = max_workers or engine.max_workers or default_worker_count()
+        self.on_status = on_status or (lambda message: None)
+        self.control = control
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, dict] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.results_path):
+                with open(self.results_path, 'r', encoding='utf-8') as f:
+                    self.jobs = json.load(f).get("jobs", {})
+        except Exception as e:
+            print(f"加载任务结果失败: {e}")
+            self.jobs = {}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"jobs": self.jobs}, ensure_ascii=False, indent=2)
+        os.makedirs(os.path.dirname(os.path.abspath(self.results_path)), exist_ok=True)
+        tmp_path = self.results_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.results_path)
+
+    def add(self, name: str, spec: JobSpec):
+        """加入任务；参数未变且已完成的任务保留原结果"""
+        spec_data = spec.to_dict()
+        with self._lock:
+            job = self.jobs.get(name)
+            if job is not None and job.get("spec") == spec_data and job.get("status") == DONE:
+                return
+            self.jobs[name] = {
+                "spec": spec_data,
+                "status": PENDING,
+                "attempts": job.get("attempts", 0) if job else 0,
+                "started_at": None,
+                "finished_at": None,
+                "seconds": None,
+                "outputs": [],
+                "error": None,
+            }
+
+    def pending(self) -> List[str]:
+        """尚未完成的任务（包括上次运行中断或失败的任务）"""
+        with self._lock:
+            return [name for name, job in self.jobs.items() if job["status"] != DONE]
+
+    def _update(self, name: str, **fields):
+        with self._lock:
+            self.jobs[name].update(fields)
+        self.save()
+
+    def _run_job(self, name: str, limiter: threading.Semaphore):
+        if self.control is not None and self.control.cancelled:
+            return
+        with self._lock:
+            spec = JobSpec.from_dict(self.jobs[name]["spec"])
+            attempts = self.jobs[name]["attempts"] + 1
+        started = time.time()
+        self._update(name, status=RUNNING, attempts=attempts, started_at=started,
+                     finished_at=None, seconds=None, error=None)
+        self.on_status(f"[{name}] 开始")
+        try:
+            outputs = self.engine.run(spec, on_status=lambda message: self.on_status(f"[{name}] {message}"),
+                                      limiter=limiter, control=self.control)
+        except JobCancelled:
+            self._update(name, status=PENDING, started_at=None, finished_at=None, seconds=None)
+            self.on_status(f"[{name}] 已取消")
+            return
+        except Exception as e:
+            finished = time.time()
+            self._update(name, status=FAILED, finished_at=finished, seconds=round(finished - started, 3),
+                         error=str(e))
+            self.on_status(f"[{name}] 失败: {e}")
+            return
+        finished = time.time()
+        self._update(name, status=DONE, finished_at=finished, seconds=round(finished - started, 3),
+                     outputs=outputs)
+        self.on_status(f"[{name}] 完成，用时 {finished - started:.1f} 秒")
+
+    def run(self, names: Optional[List[str]] = None) -> Dict[str, int]:
+        """执行未完成的任务（默认为队列中全部任务），返回这些任务中各状态的任务数"""
+        self.save()
+        names = list(self.jobs) if names is None else names
+        pending = set(self.pending())
+        limiter = threading.BoundedSemaphore(self.max_workers)
+        with ThreadPoolExecutor(max_workers=self.max_jobs) as pool:
+            for future in [pool.submit(self._run_job, name, limiter) for name in names if name in pending]:
+                future.result()
+        with self._lock:
+            counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for name in names:
+                counts[self.jobs[name]["status"]] += 1
+        return counts
+
+
+def default_results_path(manifest_path: str) -> str:
+    """结果文件默认保存在清单旁边：任务.json -> 任务.results.json"""
+    root, _ = os.path.splitext(manifest_path)
+    return root + ".results.json"
+
+
+def run_manifest(manifest_path: str, engine: MixEngine, results_path: Optional[str] = None,
+                 max_jobs: Optional[int] = None, max_workers: Optional[int] = None,
+                 on_status: Optional[Callable[[str], None]] = None,
+                 control: Optional[JobControl] = None) -> Tuple[JobQueue, Dict[str, int]]:
+    """读取任务清单并执行，参数为None时使用清单中的设置
+
+    返回队列和清单中各状态的任务数。
+    """
+    manifest = load_manifest(manifest_path)
+    jobs = expand_jobs(manifest, os.path.dirname(os.path.abspath(manifest_path)))
+    queue = JobQueue(
+        results_path or default_results_path(manifest_path), engine,
+        max_jobs=max_jobs or manifest.get("max_jobs", 1),
+        max_workers=max_workers or manifest.get("max_workers"),
+        on_status=on_status,
+        control=control
+    )
+    for name, spec in jobs:
+        queue.add(name, spec)
+    counts = queue.run([name for name, _ in jobs])
+    return queue, counts
@@ -0,0 +1,407 @@
+"""性能测试：在样本视频上比较不同编码配置、不同填充方式的速度和输出大小，
+以及用合成素材按固定参数组合端到端运行混剪引擎
+
+用法（在src目录下执行）：
+    python -m mixer.benchmark profiles 样本视频.mp4 --duration 10
+    python -m mixer.benchmark fill 样本视频.mp4 --profile draft
+    python -m mixer.benchmark suite --matrix quick --save-baseline 基准.json
+    python -m mixer.benchmark suite --matrix quick --baseline 基准.json
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .engine import AUDIO_KEEP, AUDIO_NONE, AUDIO_VOICE, BGM_FOLLOW_MUSIC, BGM_FOLLOW_VIDEO, JobSpec, MixEngine
+from .ffmpeg import probe_duration, probe_frame_count, run_ffmpeg
+from .filters import BLUR_PRESETS, DEFAULT_BLUR_QUALITY, FILL_BLACK, FILL_BLUR, build_clip_args
+from .profiles import DEFAULT_PROFILE, EncoderProfile, get_profile, load_profiles
+from .trace import BLOCK_SIZE, FORMAT_JSONL, load_records
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不统计CPU时间和块设备读写
+    resource = None
+
+# 合成源视频：(名称, 宽, 高, 帧率, 时长秒)，覆盖竖屏/横屏/方形/4:3、不同帧率和时长
+# portrait与目标格式一致，用于测试直接复制视频流
+SYNTHETIC_SOURCES: List[Tuple[str, int, int, int, float]] = [
+    ("portrait", 1080, 1920, 30, 20.0),
+    ("landscape", 1920, 1080, 25, 15.0),
+    ("square", 720, 720, 24, 12.0),
+    ("classic", 640, 480, 60, 10.0),
+    ("small", 540, 960, 30, 8.0),
+    ("wide", 1280, 536, 24, 18.0),
+]
+
+# 合成背景音乐：(名称, 正弦波频率Hz, 时长秒)
+SYNTHETIC_MUSIC: List[Tuple[str, int, float]] = [
+    ("tone_a", 440, 20.0),
+    ("tone_b", 523, 35.0),
+    ("tone_c", 659, 50.0),
+]
+
+# 不使用背景音乐的参数取值
+NO_BGM = "none"
+
+# 固定的参数组合，保证与基准结果比较时运行的是同一组用例
+BENCHMARK_MATRICES: Dict[str, Dict[str, list]] = {
+    "quick": {
+        "clips": [3],
+        "clip_duration": [2.0],
+        "generate_count": [2],
+        "audio_mode": [AUDIO_KEEP, AUDIO_NONE],
+        "bgm_mode": [NO_BGM, BGM_FOLLOW_VIDEO],
+    },
+    "full": {
+        "clips": [3, 6],
+        "clip_duration": [2.0, 4.0],
+        "generate_count": [1, 4],
+        "audio_mode": [AUDIO_KEEP, AUDIO_VOICE, AUDIO_NONE],
+        "bgm_mode": [NO_BGM, BGM_FOLLOW_VIDEO, BGM_FOLLOW_MUSIC],
+    },
+}
+
+# 吞吐量低于基准的比例超过该值时视为性能下降
+REGRESSION_THRESHOLD = 0.10
+
+# 统计为中间文件的运行记录步骤
+INTERMEDIATE_STAGES = ("normalize", "copy_cut")
+
+
+def _timed_clip(cmd: List[str], output_path: str) -> dict:
+    """执行一次片段处理，返回耗时、编码帧率和文件大小"""
+    start = time.perf_counter()
+    run_ffmpeg(cmd + [output_path])
+    seconds = time.perf_counter() - start
+    frames = probe_frame_count(output_path)
+    return {
+        "seconds": seconds,
+        "frames": frames,
+        "fps": frames / seconds if seconds else 0.0,
+        "size": os.path.getsize(output_path),
+    }
+
+
+def benchmark_profiles(sample_path: str, profiles: Dict[str, EncoderProfile],
+                       duration: float = 10.0, work_dir: Optional[str] = None) -> List[dict]:
+    """用每个编码配置对样本视频做一次片段处理，记录耗时、编码帧率和文件大小"""
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="mixer_bench_")
+    results = []
+    try:
+        for name, profile in profiles.items():
+            output_path = os.path.join(work_dir, f"bench_{name}.mp4")
+            cmd = ["ffmpeg", "-y", "-i", sample_path]
+            cmd += build_clip_args(duration, profile, strip_audio=True)
+            results.append({"profile": name, **_timed_clip(cmd, output_path)})
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def benchmark_fill_modes(sample_path: str, profile: EncoderProfile, duration: float = 10.0,
+                         qualities: Optional[List[str]] = None, work_dir: Optional[str] = None) -> List[dict]:
+    """比较黑边填充和各档模糊背景填充的速度，slowdown为相对黑边填充的耗时倍数"""
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="mixer_bench_")
+    modes = [(FILL_BLACK, None)] + [(FILL_BLUR, quality) for quality in (qualities or list(BLUR_PRESETS))]
+    results = []
+    try:
+        for fill, quality in modes:
+            name = fill if quality is None else f"{fill}-{quality}"
+            output_path = os.path.join(work_dir, f"bench_{name}.mp4")
+            cmd = ["ffmpeg", "-y", "-i", sample_path]
+            cmd += build_clip_args(duration, profile, strip_audio=True, fill=fill,
+                                   blur_quality=quality or DEFAULT_BLUR_QUALITY)
+            results.append({"mode": name, **_timed_clip(cmd, output_path)})
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    baseline = results[0]["seconds"] if results else 0.0
+    for result in results:
+        result["slowdown"] = result["seconds"] / baseline if baseline else 0.0
+    return results
+
+
+def generate_sources(source_dir: str, sources: List[Tuple[str, int, int, int, float]] = SYNTHETIC_SOURCES):
+    """用testsrc2画面和sine音频生成合成源视频，已存在的文件不重新生成"""
+    os.makedirs(source_dir, exist_ok=True)
+    for n, (name, width, height, fps, duration) in enumerate(sources):
+        path = os.path.join(source_dir, f"{name}_{width}x{height}_{fps}.mp4")
+        if os.path.exists(path):
+            continue
+        run_ffmpeg([
+            "ffmpeg", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration:g}",
+            "-f", "lavfi", "-i", f"sine=frequency={300 + 100 * n}:sample_rate=44100:duration={duration:g}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-profile:v", "high", "-pix_fmt", "yuv420p",
+            "-g", str(fps * 2),
+            "-c:a", "aac", "-b:a", "128k", "-shortest",
+            path
+        ])
+
+
+def generate_music(music_dir: str, tracks: List[Tuple[str, int, float]] = SYNTHETIC_MUSIC):
+    """用sine生成合成背景音乐池，已存在的文件不重新生成"""
+    os.makedirs(music_dir, exist_ok=True)
+    for name, frequency, duration in tracks:
+        path = os.path.join(music_dir, f"{name}.m4a")
+        if os.path.exists(path):
+            continue
+        run_ffmpeg([
+            "ffmpeg", "-y",
+            "-f", "lavfi", "-i", f"sine=frequency={frequency}:sample_rate=44100:duration={duration:g}",
+            "-c:a", "aac", "-b:a", "128k",
+            path
+        ])
+
+
+def expand_matrix(matrix: Dict[str, list]) -> List[Dict[str, object]]:
+    """把参数取值表展开为各参数组合"""
+    keys = list(matrix)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(matrix[key] for key in keys))]
+
+
+def case_name(params: Dict[str, object]) -> str:
+    return (f"c{params['clips']}-d{params['clip_duration']:g}-n{params['generate_count']}"
+            f"-{params['audio_mode']}-{params['bgm_mode']}")
+
+
+def _children_usage() -> Tuple[float, int, int]:
+    """已结束子进程累计的CPU时间（秒）和块设备读、写字节数"""
+    if resource is None:
+        return 0.0, 0, 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime, usage.ru_inblock * BLOCK_SIZE, usage.ru_oublock * BLOCK_SIZE
+
+
+def run_case(params: Dict[str, object], source_dir: str, music_dir: str, work_dir: str,
+             profile: str = DEFAULT_PROFILE, seed: int = 0) -> dict:
+    """端到端运行一个参数组合（缓存为空），返回吞吐量、CPU和中间文件读写统计"""
+    name = case_name(params)
+    case_dir = os.path.join(work_dir, name)
+    shutil.rmtree(case_dir, ignore_errors=True)
+    trace_dir = os.path.join(case_dir, "trace")
+    engine = MixEngine(
+        cache_root=os.path.join(case_dir, "cache"),
+        scratch_dir=os.path.join(case_dir, "scratch"),
+        trace_dir=trace_dir,
+        trace_format=FORMAT_JSONL
+    )
+    bgm_mode = params["bgm_mode"]
+    spec = JobSpec(
+        input_folder=source_dir,
+        output_folder=os.path.join(case_dir, "out"),
+        clip_duration=params["clip_duration"],
+        clips=params["clips"],
+        generate_count=params["generate_count"],
+        output_name=name,
+        audio_mode=params["audio_mode"],
+        music_pool=music_dir if bgm_mode != NO_BGM else None,
+        bgm_mode=bgm_mode if bgm_mode != NO_BGM else BGM_FOLLOW_VIDEO,
+        encoder_profile=profile,
+        seed=seed  # 相同的片段规划，便于与基准比较
+    )
+    cpu_before, read_before, write_before = _children_usage()
+    start = time.perf_counter()
+    outputs = engine.run(spec)
+    seconds = time.perf_counter() - start
+    cpu_after, read_after, write_after = _children_usage()
+
+    output_seconds = sum(probe_duration(path) for path in outputs)
+    records = []
+    for trace_file in os.listdir(trace_dir):
+        records += load_records(os.path.join(trace_dir, trace_file))
+    cpu = cpu_after - cpu_before
+    return {
+        "case": name,
+        **params,
+        "seconds": seconds,
+        "output_seconds": output_seconds,
+        "throughput": output_seconds / seconds if seconds else 0.0,
+        "cpu_seconds": cpu,
+        "cpu_cores": cpu / seconds if seconds else 0.0,
+        "read_bytes": read_after - read_before,
+        "write_bytes": write_after - write_before,
+        "intermediate_bytes": sum(record["output_bytes"] for record in records
+                                  if record["stage"] in INTERMEDIATE_STAGES),
+    }
+
+
+def run_suite(matrix: Dict[str, list], work_dir: Optional[str] = None, profile: str = DEFAULT_PROFILE,
+              seed: int = 0, keep: bool = False,
+              on_case=None) -> List[dict]:
+    """生成合成素材后依次运行参数组合中的每个用例
+
+    合成素材保存在work_dir/media中可重复使用；keep为False时删除各用例的输出和缓存。
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="mixer_suite_")
+    source_dir = os.path.join(work_dir, "media", "videos")
+    music_dir = os.path.join(work_dir, "media", "music")
+    generate_sources(source_dir)
+    generate_music(music_dir)
+    cases_dir = os.path.join(work_dir, "cases")
+    results = []
+    try:
+        for params in expand_matrix(matrix):
+            result = run_case(params, source_dir, music_dir, cases_dir, profile, seed)
+            if not keep:
+                shutil.rmtree(os.path.join(cases_dir, result["case"]), ignore_errors=True)
+            results.append(result)
+            if on_case:
+                on_case(result)
+    finally:
+        if own_dir and not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def save_baseline(path: str, matrix_name: str, profile: str, results: List[dict]):
+    """保存基准结果"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "matrix": matrix_name,
+            "profile": profile,
+            "created_at": time.time(),
+            "cases": {result["case"]: result for result in results},
+        }, f, ensure_ascii=False, indent=2)
+
+
+def compare_with_baseline(results: List[dict], baseline: dict,
+                          threshold: float = REGRESSION_THRESHOLD) -> List[dict]:
+    """与基准结果比较，change为吞吐量的相对变化，吞吐量下降超过threshold时regression为True"""
+    comparison = []
+    for result in results:
+        base = baseline["cases"].get(result["case"])
+        if base is None or not base["throughput"]:
+            comparison.append({"case": result["case"], "change": None, "regression": False})
+            continue
+        change = result["throughput"] / base["throughput"] - 1
+        comparison.append({
+            "case": result["case"],
+            "baseline": base["throughput"],
+            "throughput": result["throughput"],
+            "change": change,
+            "regression": change < -threshold,
+        })
+    return comparison
+
+
+def format_suite_report(results: List[dict], comparison: Optional[List[dict]] = None) -> str:
+    """把run_suite的结果格式化为文本表格，有基准比较时追加相对基准的变化"""
+    changes = {item["case"]: item for item in comparison or []}
+    header = (f"{'用例':<30}{'耗时(秒)':>10}{'输出(秒)':>10}{'吞吐量':>8}{'CPU(秒)':>10}{'CPU核数':>8}"
+              f"{'中间文件(MB)':>14}{'写入(MB)':>10}")
+    if comparison is not None:
+        header += f"{'相对基准':>10}"
+    lines = [header]
+    for result in results:
+        line = (
+            f"{result['case']:<30}{result['seconds']:>10.2f}{result['output_seconds']:>10.1f}"
+            f"{result['throughput']:>7.2f}x{result['cpu_seconds']:>10.2f}{result['cpu_cores']:>8.1f}"
+            f"{result['intermediate_bytes'] / 1024 / 1024:>14.1f}{result['write_bytes'] / 1024 / 1024:>10.1f}"
+        )
+        if comparison is not None:
+            item = changes.get(result["case"], {})
+            if item.get("change") is None:
+                line += f"{'无基准':>10}"
+            else:
+                line += f"{item['change'] * 100:>+9.1f}%" + (" 下降" if item["regression"] else "")
+        lines.append(line)
+    total_seconds = sum(result["seconds"] for result in results)
+    total_output = sum(result["output_seconds"] for result in results)
+    if total_seconds:
+        lines.append(f"合计: 输出 {total_output:.1f} 秒，用时 {total_seconds:.1f} 秒，"
+                     f"吞吐量 {total_output / total_seconds:.2f}x")
+    return "\n".join(lines)
+
+
+def format_profile_report(results: List[dict]) -> str:
+    """把benchmark_profiles的结果格式化为文本表格"""
+    lines = [f"{'配置':<10}{'耗时(秒)':>10}{'编码帧率':>10}{'文件大小(MB)':>14}"]
+    for result in results:
+        lines.append(
+            f"{result['profile']:<10}{result['seconds']:>10.2f}{result['fps']:>10.1f}"
+            f"{result['size'] / 1024 / 1024:>14.2f}"
+        )
+    return "\n".join(lines)
+
+
+def format_fill_report(results: List[dict]) -> str:
+    """把benchmark_fill_modes的结果格式化为文本表格"""
+    lines = [f"{'填充方式':<16}{'耗时(秒)':>10}{'编码帧率':>10}{'相对黑边':>10}{'文件大小(MB)':>14}"]
+    for result in results:
+        lines.append(
+            f"{result['mode']:<16}{result['seconds']:>10.2f}{result['fps']:>10.1f}"
+            f"{result['slowdown']:>9.2f}x{result['size'] / 1024 / 1024:>14.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m mixer.benchmark", description="混剪引擎性能测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    profile_parser = subparsers.add_parser("profiles", help="比较编码配置的速度和输出大小")
+    profile_parser.add_argument("sample", help="样本视频路径")
+    profile_parser.add_argument("--duration", type=float, default=10.0, help="测试片段时长（秒）")
+    profile_parser.add_argument("--profiles", nargs="*", help="要测试的配置名称，默认全部")
+
+    fill_parser = subparsers.add_parser("fill", help="比较黑边填充和模糊背景填充的速度")
+    fill_parser.add_argument("sample", help="样本视频路径（宽高比与1080x1920不同时才有填充）")
+    fill_parser.add_argument("--duration", type=float, default=10.0, help="测试片段时长（秒）")
+    fill_parser.add_argument("--profile", default=DEFAULT_PROFILE, help="使用的编码配置")
+    fill_parser.add_argument("--qualities", nargs="*", choices=list(BLUR_PRESETS), help="要测试的模糊档位，默认全部")
+
+    suite_parser = subparsers.add_parser("suite", help="用合成素材端到端运行混剪引擎，可与基准结果比较")
+    suite_parser.add_argument("--matrix", choices=list(BENCHMARK_MATRICES), default="quick", help="参数组合")
+    suite_parser.add_argument("--profile", default=DEFAULT_PROFILE, help="使用的编码配置")
+    suite_parser.add_argument("--work-dir", help="工作目录，合成素材保存在其中可重复使用，默认使用临时目录")
+    suite_parser.add_argument("--seed", type=int, default=0, help="片段选择的随机种子")
+    suite_parser.add_argument("--keep", action="store_true", help="保留各用例的输出、缓存和运行记录")
+    suite_parser.add_argument("--save-baseline", metavar="FILE", help="把结果保存为基准")
+    suite_parser.add_argument("--baseline", metavar="FILE", help="与基准结果比较，吞吐量下降时返回1")
+    suite_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                              help="视为性能下降的吞吐量降幅")
+
+    args = parser.parse_args(argv)
+    if args.command == "profiles":
+        profiles = load_profiles()
+        if args.profiles:
+            profiles = {name: profiles[name] for name in args.profiles}
+        print(format_profile_report(benchmark_profiles(args.sample, profiles, args.duration)))
+    elif args.command == "fill":
+        results = benchmark_fill_modes(args.sample, get_profile(args.profile), args.duration, args.qualities)
+        print(format_fill_report(results))
+    elif args.command == "suite":
+        matrix = BENCHMARK_MATRICES[args.matrix]
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get("matrix") != args.matrix or baseline.get("profile") != args.profile:
+                print(f"警告: 基准使用的参数组合/编码配置为 {baseline.get('matrix')}/{baseline.get('profile')}",
+                      file=sys.stderr)
+        results = run_suite(
+            matrix, args.work_dir, args.profile, args.seed, args.keep,
+            on_case=lambda result: print(f"{result['case']}: {result['throughput']:.2f}x", file=sys.stderr)
+        )
+        comparison = compare_with_baseline(results, baseline, args.threshold) if baseline else None
+        print(format_suite_report(results, comparison))
+        if args.save_baseline:
+            save_baseline(args.save_baseline, args.matrix, args.profile, results)
+        if comparison and any(item["regression"] for item in comparison):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""标准化片段缓存：同一源文件、同一参数的片段只编码一次，跨批次复用"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List
+
+# 默认缓存容量上限（字节）
+DEFAULT_CACHE_MAX_BYTES = 20 * 1024 ** 3
+
+
+def file_identity(path: str) -> dict:
+    """返回用于判断源文件是否变化的标识（绝对路径、修改时间、大小）"""
+    stat = os.stat(path)
+    return {
+        "path": os.path.abspath(path),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+class ClipCache:
+    """按内容寻址的片段缓存
+
+    缓存键由源文件标识和生成片段的ffmpeg参数（起始偏移、时长、滤镜链、音频模式、
+    编码参数）共同决定。索引保存在缓存目录的index.json中，超出容量时按最近使用
+    时间淘汰。
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 共用一个缓存的多个任务同时保存索引时依次写入
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._pinned = Counter()  # 正在运行的批次使用的缓存键（引用计数），不参与淘汰
+        self.entries: Dict[str, dict] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            print(f"加载片段缓存索引失败: {e}")
+            self.entries = {}
+        # 丢弃磁盘上已不存在的条目
+        self.entries = {
+            key: entry for key, entry in self.entries.items()
+            if os.path.exists(self.path_for(key))
+        }
+
+    def save_index(self):
+        with self._save_lock:
+            with self._lock:
+                entries = {key: dict(entry) for key, entry in self.entries.items()}
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.index_path)
+
+    def make_key(self, source_path: str, args: List[str]) -> str:
+        """根据源文件标识和ffmpeg参数生成缓存键
+
+        args中通过-i引入的其他输入文件（如音效）同样按文件标识计入缓存键。
+        """
+        extra_inputs = [
+            file_identity(args[i + 1]) for i, arg in enumerate(args[:-1])
+            if arg == "-i" and os.path.exists(args[i + 1])
+        ]
+        payload = json.dumps(
+            {"source": file_identity(source_path), "inputs": extra_inputs, "args": args},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp4")
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self.entries and os.path.exists(self.path_for(key))
+
+    def pin(self, key: str):
+        with self._lock:
+            self._pinned[key] += 1
+
+    def unpin(self, keys: Iterable[str]):
+        """释放一个批次固定的缓存键，其他批次仍在使用的键保持固定"""
+        with self._lock:
+            self._pinned.subtract(keys)
+            self._pinned = +self._pinned
+
+    def unpin_all(self):
+        with self._lock:
+            self._pinned.clear()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def produce(self, key: str, producer: Callable[[str], None]) -> str:
+        """确保缓存中存在该片段，不存在时调用producer(临时路径)生成
+
+        返回缓存文件路径。同一缓存键的并发调用只会生成一次。
+        """
+        final_path = self.path_for(key)
+        with self._key_lock(key):
+            if self.has(key):
+                self._touch(key)
+                return final_path
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            tmp_path = os.path.join(os.path.dirname(final_path), f"{key}.{threading.get_ident()}.tmp.mp4")
+            try:
+                producer(tmp_path)
+                os.replace(tmp_path, final_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            with self._lock:
+                self.entries[key] = {
+                    "size": os.path.getsize(final_path),
+                    "last_used": time.time(),
+                }
+        return final_path
+
+    def adopt(self, key: str, size: int) -> bool:
+        """登记磁盘上已有但不在索引中的片段（例如进程在保存索引前中断），大小不一致时不登记"""
+        try:
+            if os.path.getsize(self.path_for(key)) != size:
+                return False
+        except OSError:
+            return False
+        with self._lock:
+            self.entries.setdefault(key, {"size": size, "last_used": time.time()})
+        return True
+
+    def _touch(self, key: str):
+        with self._lock:
+            self.entries[key]["last_used"] = time.time()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self.entries.values())
+
+    def prune(self):
+        """淘汰最久未使用的片段，直到缓存总大小不超过上限"""
+        with self._lock:
+            total = sum(entry["size"] for entry in self.entries.values())
+            candidates = sorted(
+                (key for key in self.entries if key not in self._pinned),
+                key=lambda key: self.entries[key]["last_used"]
+            )
+            for key in candidates:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self.path_for(key))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除缓存片段失败: {e}")
+                    continue
+                total -= self.entries.pop(key)["size"]
+        self.save_index()
@@ -0,0 +1,202 @@
+"""命令行入口：在无界面的服务器上执行混剪任务
+
+用法（在src目录下执行）：
+    python -m mixer 输入文件夹 输出文件夹 --clips 10 --duration 5 --count 20
+    python -m mixer 输入文件夹 输出文件夹 --target-duration 60 --music-pool 音乐文件夹
+    python -m mixer --job 任务.json
+    python -m mixer --manifest 任务清单.yaml --max-jobs 2 --workers 8
+    python -m mixer 输入文件夹 --build-proxies --fill blur
+    python -m mixer 输入文件夹 输出文件夹 --use-proxies --fill blur
+    python -m mixer 输入文件夹 输出文件夹 --trace 运行记录
+    python -m mixer --trace-summary 运行记录/run-*.jsonl --top 10
+
+处理过程中按Ctrl+C取消：正在运行的ffmpeg进程被结束，已完整生成的输出保留；再按一次立即退出。
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+from typing import List, Optional
+
+from .control import JobCancelled, JobControl
+from .engine import (
+    AUDIO_KEEP,
+    AUDIO_NONE,
+    AUDIO_VOICE,
+    BGM_FOLLOW_MUSIC,
+    BGM_FOLLOW_VIDEO,
+    DEFAULT_CACHE_ROOT,
+    SOUND_EFFECT_CLIPS,
+    SOUND_EFFECT_NONE,
+    SOUND_EFFECT_VIDEO,
+    JobSpec,
+    MixEngine,
+    MixError,
+)
+from .batch import DONE, FAILED, run_manifest
+from .filters import BLUR_PRESETS, DEFAULT_BLUR_QUALITY, FILL_BLACK, FILL_BLUR
+from .profiles import DEFAULT_PROFILE
+from .trace import FORMAT_CHROME, FORMAT_JSONL, load_records, summarize
+
+# 与GUI共用的配置文件（src/config.json）
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(DEFAULT_CACHE_ROOT), "config.json")
+
+
+def load_config(path: Optional[str]) -> dict:
+    """读取config.json中的缓存和编码配置，文件不存在时返回空配置"""
+    path = path or DEFAULT_CONFIG_FILE
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m mixer", description="TikTok视频混剪（命令行模式）")
+    parser.add_argument("input_folder", nargs="?", help="输入视频文件夹")
+    parser.add_argument("output_folder", nargs="?", help="输出文件夹")
+    parser.add_argument("--job", help="JSON格式的任务描述文件，命令行参数会覆盖其中的同名设置")
+    parser.add_argument("--manifest", help="JSON/YAML格式的批量任务清单，按队列执行其中所有任务")
+    parser.add_argument("--max-jobs", type=int, help="批量任务同时运行的任务数（默认使用清单中的设置）")
+    parser.add_argument("--results", help="批量任务结果文件，默认为清单旁边的 *.results.json")
+    parser.add_argument("--duration", type=float, dest="clip_duration", help="片段时长（秒）")
+    parser.add_argument("--clips", type=int, help="片段数量")
+    parser.add_argument("--target-duration", type=float, help="目标总时长（秒），自动计算片段时长和数量")
+    parser.add_argument("--count", type=int, dest="generate_count", help="生成数量")
+    parser.add_argument("--name", dest="output_name", help="输出文件名")
+    parser.add_argument("--videos", nargs="*", help="使用的视频文件名，默认使用输入文件夹中所有视频")
+    parser.add_argument("--audio", dest="audio_mode", choices=[AUDIO_KEEP, AUDIO_VOICE, AUDIO_NONE],
+                        help="音频处理方式：保留原声/仅保留人声/去除音频")
+    parser.add_argument("--music-pool", help="背景音乐文件夹（每个输出随机选择一首）")
+    parser.add_argument("--music", nargs="*", dest="music_files", help="背景音乐文件")
+    parser.add_argument("--bgm-mode", choices=[BGM_FOLLOW_VIDEO, BGM_FOLLOW_MUSIC], help="背景音乐模式")
+    parser.add_argument("--no-beat-sync", dest="beat_sync", action="store_false", default=None,
+                        help="跟随音乐模式下片段均分音乐时长，不对齐到节拍")
+    parser.add_argument("--sfx", dest="sound_effect_path", help="音效文件")
+    parser.add_argument("--sfx-mode", dest="sound_effect_type",
+                        choices=[SOUND_EFFECT_NONE, SOUND_EFFECT_CLIPS, SOUND_EFFECT_VIDEO], help="音效添加位置")
+    parser.add_argument("--profile", dest="encoder_profile", help=f"编码配置（默认{DEFAULT_PROFILE}）")
+    parser.add_argument("--stream", dest="streaming", action="store_true", default=None,
+                        help="流式模式：片段通过管道直接传给合成进程，不生成片段文件")
+    parser.add_argument("--fill", dest="fill_mode", choices=[FILL_BLACK, FILL_BLUR],
+                        help="画面填充方式：黑边/模糊背景")
+    parser.add_argument("--blur-quality", choices=list(BLUR_PRESETS), help="模糊背景的质量/速度档位")
+    parser.add_argument("--no-stream-copy", dest="stream_copy", action="store_false", default=None,
+                        help="已符合目标格式的源视频也重新编码")
+    parser.add_argument("--seed", type=int, help="片段规划的随机种子，相同种子和素材得到相同的结果")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", default=None,
+                        help="不继续输出文件夹中参数相同的未完成批次，重新开始")
+    parser.add_argument("--use-proxies", dest="use_proxies", action="store_true", default=None,
+                        help="有代理文件的源视频使用代理文件")
+    parser.add_argument("--build-proxies", action="store_true",
+                        help="为输入文件夹生成代理文件（按--fill/--blur-quality填充），不执行混剪")
+    parser.add_argument("--workers", type=int,
+                        help="并行任务数，默认按CPU核数计算；批量任务时为所有任务合计的上限")
+    parser.add_argument("--trace", dest="trace_dir",
+                        help="把每次运行的步骤耗时和资源占用写入该目录（用--trace-summary汇总）")
+    parser.add_argument("--trace-format", choices=[FORMAT_JSONL, FORMAT_CHROME],
+                        help="运行记录格式：JSON lines或Chrome trace（chrome://tracing）")
+    parser.add_argument("--trace-summary", nargs="+", metavar="FILE",
+                        help="汇总运行记录文件中最慢的步骤、源视频和输出，不执行混剪")
+    parser.add_argument("--top", type=int, default=10, help="运行记录汇总中列出的条目数")
+    parser.add_argument("--config", help="配置文件路径，默认使用src/config.json")
+    parser.add_argument("--cache-root", default=DEFAULT_CACHE_ROOT, help="缓存和索引文件的根目录")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出处理进度")
+    return parser
+
+
+# 可以由命令行覆盖的任务参数
+SPEC_ARGS = (
+    "input_folder", "output_folder", "clip_duration", "clips", "target_duration", "generate_count",
+    "output_name", "videos", "audio_mode", "music_pool", "music_files", "bgm_mode", "beat_sync",
+    "sound_effect_type", "sound_effect_path", "encoder_profile", "streaming", "stream_copy",
+    "fill_mode", "blur_quality", "seed", "resume", "use_proxies",
+)
+
+
+def spec_from_args(args: argparse.Namespace) -> JobSpec:
+    """合并任务文件和命令行参数，生成任务描述"""
+    data = {}
+    if args.job:
+        with open(args.job, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    for name in SPEC_ARGS:
+        value = getattr(args, name)
+        if value is not None:
+            data[name] = value
+    if data.get("sound_effect_path") and not data.get("sound_effect_type"):
+        data["sound_effect_type"] = SOUND_EFFECT_CLIPS
+    if not data.get("input_folder") or not data.get("output_folder"):
+        raise MixError("请指定输入文件夹和输出文件夹")
+    return JobSpec.from_dict(data)
+
+
+def install_cancel_handler(control: JobControl):
+    """第一次Ctrl+C取消任务，之后恢复默认处理（再按一次立即退出）"""
+    def on_interrupt(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        print("正在取消...", file=sys.stderr, flush=True)
+        control.cancel()
+
+    signal.signal(signal.SIGINT, on_interrupt)
+
+
+def run_batch(args: argparse.Namespace, engine: MixEngine, on_status, control: JobControl) -> int:
+    """执行批量任务清单，有任务失败时返回1，被取消时返回130"""
+    queue, counts = run_manifest(args.manifest, engine, results_path=args.results, max_jobs=args.max_jobs,
+                                 max_workers=args.workers, on_status=on_status, control=control)
+    for job in queue.jobs.values():
+        for output in job["outputs"]:
+            print(output)
+    print(f"完成 {counts[DONE]} 个任务，失败 {counts[FAILED]} 个，结果已保存到 {queue.results_path}",
+          file=sys.stderr)
+    if control.cancelled:
+        return 130
+    return 1 if counts[FAILED] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        if args.trace_summary:
+            records = []
+            for path in args.trace_summary:
+                records += load_records(path)
+            print(summarize(records, args.top))
+            return 0
+        config = load_config(args.config)
+        if args.trace_dir:
+            config['trace_dir'] = args.trace_dir
+        if args.trace_format:
+            config['trace_format'] = args.trace_format
+        engine = MixEngine.from_config(config, cache_root=args.cache_root, max_workers=args.workers)
+        on_status = None if args.quiet else (lambda message: print(message, file=sys.stderr, flush=True))
+        control = JobControl()
+        if args.manifest:
+            install_cancel_handler(control)
+            return run_batch(args, engine, on_status, control)
+        if args.build_proxies:
+            if not args.input_folder:
+                raise MixError("请指定输入文件夹")
+            install_cancel_handler(control)
+            counts = engine.build_proxies(args.input_folder, args.fill_mode or FILL_BLACK,
+                                          args.blur_quality or DEFAULT_BLUR_QUALITY, on_status=on_status,
+                                          control=control)
+            return 1 if counts["failed"] else 0
+        spec = spec_from_args(args)
+        install_cancel_handler(control)
+        for output in engine.run(spec, on_status=on_status, control=control):
+            print(output)
+        return 0
+    except JobCancelled:
+        print("已取消", file=sys.stderr)
+        return 130
+    except MixError as e:
+        print(f"错误: {e}", file=sys.stderr)
+    except subprocess.CalledProcessError as e:
+        print(f"视频处理失败: {e}", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"发生错误: {e}", file=sys.stderr)
+    return 1
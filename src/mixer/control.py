@@ -0,0 +1,155 @@
+"""任务控制：取消或暂停正在运行的混剪任务
+
+JobControl由界面或命令行持有并传给MixEngine.run()。调度器在每个任务开始前检查控制状态：
+暂停时等待，取消后不再开始新任务。任务执行期间启动的ffmpeg进程登记在当前线程的控制对象中
+（与运行记录相同，通过contextvar传递）：
+
+- 取消时向进程发送SIGTERM，ffmpeg收到后停止编码并退出；TERMINATE_GRACE秒后仍未退出的强制结束
+- 暂停时向进程发送SIGSTOP，继续时发送SIGCONT；Windows不支持暂停进程，只暂停开始新任务
+"""
+import contextvars
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set
+
+# 取消时等待ffmpeg自行退出的时间（秒），超时后强制结束
+TERMINATE_GRACE = 0.5
+
+# 支持暂停子进程的系统（POSIX）
+CAN_SUSPEND = hasattr(signal, "SIGSTOP")
+
+_current_control: contextvars.ContextVar[Optional["JobControl"]] = contextvars.ContextVar(
+    "mixer_job_control", default=None
+)
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+def _send(process: subprocess.Popen, sig: int):
+    # send_signal对已结束的进程不做任何事
+    try:
+        process.send_signal(sig)
+    except OSError:
+        pass
+
+
+class JobControl:
+    """一次运行（或一组任务）的取消和暂停状态
+
+    keep_outputs表示取消后是否保留已完整生成的输出，由cancel()设置。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._cancelled = False
+        self._paused = False
+        self._processes: Set[subprocess.Popen] = set()
+        self.keep_outputs = True
+
+    @property
+    def cancelled(self) -> bool:
+        with self._cond:
+            return self._cancelled
+
+    @property
+    def paused(self) -> bool:
+        with self._cond:
+            return self._paused
+
+    def cancel(self, keep_outputs: bool = True):
+        """取消：正在运行的ffmpeg进程被结束，不再开始新任务"""
+        with self._cond:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            self.keep_outputs = keep_outputs
+            was_paused, self._paused = self._paused, False
+            processes = list(self._processes)
+            self._cond.notify_all()
+        for process in processes:
+            if was_paused and CAN_SUSPEND:
+                _send(process, signal.SIGCONT)  # 已暂停的进程需要先继续才能处理SIGTERM
+            _send(process, signal.SIGTERM)
+        if processes:
+            threading.Thread(target=self._kill_remaining, args=(processes,), daemon=True).start()
+
+    def _kill_remaining(self, processes: List[subprocess.Popen]):
+        time.sleep(TERMINATE_GRACE)
+        with self._cond:
+            remaining = [process for process in processes if process in self._processes]
+        for process in remaining:
+            _send(process, signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+
+    def pause(self):
+        """暂停：不再开始新任务，正在运行的ffmpeg进程被挂起"""
+        with self._cond:
+            if self._cancelled or self._paused:
+                return
+            self._paused = True
+            processes = list(self._processes)
+        if CAN_SUSPEND:
+            for process in processes:
+                _send(process, signal.SIGSTOP)
+
+    def resume(self):
+        """从暂停中继续"""
+        with self._cond:
+            if not self._paused:
+                return
+            self._paused = False
+            processes = list(self._processes)
+            self._cond.notify_all()
+        if CAN_SUSPEND:
+            for process in processes:
+                _send(process, signal.SIGCONT)
+
+    def checkpoint(self):
+        """暂停时等待继续；已取消时抛出JobCancelled"""
+        with self._cond:
+            while self._paused and not self._cancelled:
+                self._cond.wait()
+            if self._cancelled:
+                raise JobCancelled("任务已取消")
+
+    @contextmanager
+    def attach(self) -> Iterator["JobControl"]:
+        """在当前线程中登记本控制对象，其间启动的ffmpeg进程受其控制"""
+        token = _current_control.set(self)
+        try:
+            yield self
+        finally:
+            _current_control.reset(token)
+
+    def register(self, process: subprocess.Popen):
+        with self._cond:
+            self._processes.add(process)
+            cancelled, paused = self._cancelled, self._paused
+        # 在取消或暂停之后才启动的进程立即按当前状态处理
+        if cancelled:
+            _send(process, signal.SIGTERM)
+            threading.Thread(target=self._kill_remaining, args=([process],), daemon=True).start()
+        elif paused and CAN_SUSPEND:
+            _send(process, signal.SIGSTOP)
+
+    def unregister(self, process: subprocess.Popen):
+        with self._cond:
+            self._processes.discard(process)
+
+
+def register_process(process: subprocess.Popen):
+    """把新启动的子进程登记到当前线程的控制对象（没有则忽略）"""
+    control = _current_control.get()
+    if control is not None:
+        control.register(process)
+
+
+def release_process(process: subprocess.Popen):
+    """子进程结束后取消登记"""
+    control = _current_control.get()
+    if control is not None:
+        control.unregister(process)
@@ -0,0 +1,707 @@
+"""混剪引擎：根据任务描述生成混剪视频，不依赖GUI，可在无界面的服务器上运行"""
+import json
+import math
+import os
+import random
+import shutil
+import threading
+from dataclasses import asdict, dataclass, field, fields
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .assembly import STREAM_INPUT_ARGS, build_assembly_command, stream_output_args, write_concat_list
+from .cache import DEFAULT_CACHE_MAX_BYTES, ClipCache
+from .control import JobCancelled, JobControl
+from .ffmpeg import ProgressCallback, probe_duration, run_ffmpeg, run_ffmpeg_pipeline
+from .filters import BLUR_PRESETS, DEFAULT_BLUR_QUALITY, FILL_BLACK, FILL_BLUR, build_clip_args
+from .journal import BatchJournal, journal_path
+from .media_index import MediaIndex, preceding_keyframe
+from .music import MusicLibrary, bgm_gain_db
+from .planner import ClipPlanner
+from .profiles import DEFAULT_PROFILE, EncoderProfile, get_profile
+from .proxy import ProxyLibrary
+from .progress import COPY_COST, BatchProgress, ProgressSnapshot
+from .scheduler import JobGraph, Scheduler, Task, default_worker_count
+from .scratch import DEFAULT_SCRATCH_BUDGET, ScratchSpace, estimate_bytes, move_into_place
+from .trace import FORMAT_CHROME, FORMAT_JSONL, Tracer
+
+# 音频处理方式
+AUDIO_KEEP = "keep"  # 保留原始音频
+AUDIO_VOICE = "voice"  # 仅保留人声
+AUDIO_NONE = "none"  # 完全去除音频
+
+# 背景音乐模式
+BGM_FOLLOW_VIDEO = "follow_video"
+BGM_FOLLOW_MUSIC = "follow_music"
+
+# 音效添加位置
+SOUND_EFFECT_NONE = "none"
+SOUND_EFFECT_CLIPS = "clips"
+SOUND_EFFECT_VIDEO = "video"
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+MUSIC_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.aac')
+
+# 按总时长自动计算时使用的默认片段时长（秒）
+DEFAULT_CLIP_DURATION = 5
+
+# 缓存和索引文件的默认根目录（src/cache）
+DEFAULT_CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+
+
+class MixError(Exception):
+    """任务参数无效或无法执行"""
+
+
+def suggest_clip_params(target_duration: float,
+                        default_clip_duration: float = DEFAULT_CLIP_DURATION) -> Tuple[float, int]:
+    """根据目标总时长计算片段时长和片段数量"""
+    if target_duration <= 0:
+        raise MixError("目标时长必须大于0")
+    # 计算建议的片段数量（向上取整）
+    clips = math.ceil(target_duration / default_clip_duration)
+    # 计算实际的片段时长
+    return target_duration / clips, clips
+
+
+def list_media_files(folder: str, extensions: Tuple[str, ...]) -> List[str]:
+    """列出文件夹中指定扩展名的文件名"""
+    return [f for f in os.listdir(folder) if f.lower().endswith(extensions)]
+
+
+def unique_output_name(output_folder: str, base_name: str, index: int) -> str:
+    """生成不冲突的文件名"""
+    # 基础文件名格式
+    filename = f"{base_name}-{index}.mp4"
+    # 如果文件已存在，增加序号直到找到不存在的文件名
+    counter = 1
+    while os.path.exists(os.path.join(output_folder, filename)):
+        filename = f"{base_name}-{index}-{counter}.mp4"
+        counter += 1
+    return filename
+
+
+def is_complete_output(path: str) -> bool:
+    """输出文件存在且能读出时长（写到一半的mp4缺少moov，ffprobe无法读取）"""
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    try:
+        return probe_duration(path) > 0
+    except Exception:
+        return False
+
+
+@dataclass
+class JobSpec:
+    """一次混剪任务的全部参数"""
+    input_folder: str
+    output_folder: str
+    clip_duration: float = DEFAULT_CLIP_DURATION
+    clips: int = 10
+    target_duration: Optional[float] = None  # 设置后按总时长自动计算片段时长和数量
+    generate_count: int = 1
+    output_name: str = "混剪视频"
+    videos: List[str] = field(default_factory=list)  # 使用的视频文件名，为空时使用输入文件夹中所有视频
+    audio_mode: str = AUDIO_KEEP
+    music_files: List[str] = field(default_factory=list)  # 背景音乐路径，每个输出随机选择一首
+    music_pool: Optional[str] = None  # 背景音乐文件夹，music_files为空时使用其中所有音乐
+    bgm_mode: str = BGM_FOLLOW_VIDEO
+    beat_sync: bool = True  # 跟随音乐模式下片段切换点对齐到音乐的节拍
+    sound_effect_type: str = SOUND_EFFECT_NONE
+    sound_effect_path: Optional[str] = None
+    encoder_profile: str = DEFAULT_PROFILE
+    seed: Optional[int] = None  # 片段规划的随机种子，为空时每次随机
+    resume: bool = True  # 输出文件夹中有参数相同的未完成批次时从中断处继续（见mixer.journal）
+    use_proxies: bool = False  # 有代理文件的源视频使用代理文件（见mixer.proxy）
+    skip_existing: bool = False  # 输出固定命名为"名称-序号.mp4"，已存在且完整的输出不再生成
+    streaming: bool = False  # 片段以MPEG-TS通过管道直接传给合成进程，不写入片段缓存
+    stream_copy: bool = True  # 源视频已符合目标格式时从关键帧开始直接复制视频流
+    fill_mode: str = FILL_BLACK  # 画面填充方式：黑边/模糊背景
+    blur_quality: str = DEFAULT_BLUR_QUALITY  # 模糊背景的质量/速度档位
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "JobSpec":
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise MixError(f"未知的任务参数: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def resolve_clip_params(self) -> Tuple[float, int]:
+        """返回实际使用的(片段时长, 片段数量)"""
+        if self.target_duration:
+            return suggest_clip_params(self.target_duration)
+        return float(self.clip_duration), int(self.clips)
+
+    def resolve_music(self) -> List[str]:
+        """返回可用的背景音乐路径"""
+        if self.music_files:
+            return list(self.music_files)
+        if self.music_pool:
+            if not os.path.isdir(self.music_pool):
+                raise MixError(f"音乐池文件夹不存在: {self.music_pool}")
+            return [os.path.join(self.music_pool, f) for f in list_media_files(self.music_pool, MUSIC_EXTENSIONS)]
+        return []
+
+    @property
+    def use_bgm(self) -> bool:
+        return bool(self.music_files or self.music_pool)
+
+
+class MixEngine:
+    """混剪引擎，持有片段缓存和媒体信息索引，可连续执行多个任务"""
+
+    def __init__(self, cache_root: str = DEFAULT_CACHE_ROOT, clip_cache_dir: Optional[str] = None,
+                 clip_cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                 encoder_profiles: Optional[Dict[str, dict]] = None,
+                 max_workers: Optional[int] = None,
+                 scratch_dir: Optional[str] = None,
+                 scratch_budget_bytes: int = DEFAULT_SCRATCH_BUDGET,
+                 trace_dir: Optional[str] = None,
+                 trace_format: str = FORMAT_JSONL,
+                 proxy_dir: Optional[str] = None,
+                 music_beats: bool = False):
+        if trace_format not in (FORMAT_JSONL, FORMAT_CHROME):
+            raise MixError(f"未知的运行记录格式: {trace_format}")
+        self.cache_root = cache_root
+        self.clip_cache_dir = clip_cache_dir or os.path.join(cache_root, "clips")
+        self.clip_cache_max_bytes = clip_cache_max_bytes
+        self.encoder_profiles = encoder_profiles or {}
+        self.max_workers = max_workers
+        self.scratch = ScratchSpace(scratch_dir, scratch_budget_bytes)
+        self.trace_dir = trace_dir or None  # 指定时每次运行的步骤耗时和资源占用写入该目录
+        self.trace_format = trace_format
+        self.proxy_dir = proxy_dir or os.path.join(cache_root, "proxies")
+        self.music_beats = music_beats  # 分析背景音乐时同时估计速度和节拍位置
+        self._proxies: Optional[ProxyLibrary] = None
+        self._music_library: Optional[MusicLibrary] = None
+        self._clip_cache: Optional[ClipCache] = None
+        self._media_index: Optional[MediaIndex] = None
+        self._music_index: Optional[MediaIndex] = None
+        # 同一引擎上并发运行的任务（见batch.JobQueue）共用缓存和索引，首次创建时加锁，避免各建一个实例
+        self._lock = threading.RLock()
+        self._active_runs = 0  # 正在运行的任务数，全部结束后才整理片段缓存
+
+    @classmethod
+    def from_config(cls, config: dict, cache_root: str = DEFAULT_CACHE_ROOT, **kwargs) -> "MixEngine":
+        """根据config.json中的设置创建引擎"""
+        max_mb = config.get('clip_cache_max_mb')
+        budget_mb = config.get('scratch_budget_mb')
+        return cls(
+            cache_root=cache_root,
+            clip_cache_dir=config.get('clip_cache_dir') or None,
+            clip_cache_max_bytes=int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_CACHE_MAX_BYTES,
+            encoder_profiles=config.get('encoder_profiles', {}),
+            scratch_dir=config.get('scratch_dir') or None,
+            scratch_budget_bytes=int(budget_mb) * 1024 * 1024 if budget_mb else DEFAULT_SCRATCH_BUDGET,
+            trace_dir=config.get('trace_dir') or None,
+            trace_format=config.get('trace_format') or FORMAT_JSONL,
+            proxy_dir=config.get('proxy_dir') or None,
+            music_beats=bool(config.get('music_beats', False)),
+            **kwargs
+        )
+
+    @property
+    def clip_cache(self) -> ClipCache:
+        """片段缓存（首次使用时创建）"""
+        with self._lock:
+            if self._clip_cache is None:
+                self._clip_cache = ClipCache(self.clip_cache_dir, self.clip_cache_max_bytes)
+            return self._clip_cache
+
+    @property
+    def media_index(self) -> MediaIndex:
+        """媒体信息索引（首次使用时加载）"""
+        with self._lock:
+            if self._media_index is None:
+                self._media_index = MediaIndex(os.path.join(self.cache_root, "media_index.json"))
+            return self._media_index
+
+    @property
+    def music_index(self) -> MediaIndex:
+        """音乐信息索引（首次使用时加载）"""
+        with self._lock:
+            if self._music_index is None:
+                self._music_index = MediaIndex(os.path.join(self.cache_root, "music_index.json"))
+            return self._music_index
+
+    @property
+    def music_library(self) -> MusicLibrary:
+        """背景音乐库（响度、节拍分析），结果保存在音乐信息索引中"""
+        with self._lock:
+            if self._music_library is None:
+                self._music_library = MusicLibrary(self.music_index)
+            return self._music_library
+
+    @property
+    def proxies(self) -> ProxyLibrary:
+        """代理素材库（首次使用时创建），代理文件的位置记录在媒体信息索引中"""
+        with self._lock:
+            if self._proxies is None:
+                self._proxies = ProxyLibrary(self.proxy_dir, self.media_index, self.max_workers)
+            return self._proxies
+
+    def build_proxies(self, input_folder: str, fill_mode: str = FILL_BLACK,
+                      blur_quality: str = DEFAULT_BLUR_QUALITY,
+                      on_status: Optional[Callable[[str], None]] = None,
+                      stop: Optional[threading.Event] = None,
+                      control: Optional[JobControl] = None) -> Dict[str, int]:
+        """为输入文件夹中的视频生成代理文件，已有有效代理的跳过
+
+        stop被设置后不再开始新的文件；control被取消时正在生成的文件也立即停止，最后抛出JobCancelled。
+        """
+        status = on_status or (lambda message: None)
+        if not os.path.isdir(input_folder):
+            raise MixError("输入文件夹不存在")
+        if fill_mode not in (FILL_BLACK, FILL_BLUR):
+            raise MixError(f"未知的填充方式: {fill_mode}")
+        if blur_quality not in BLUR_PRESETS:
+            raise MixError(f"未知的模糊质量: {blur_quality}")
+        sources = [os.path.join(input_folder, video)
+                   for video in list_media_files(input_folder, VIDEO_EXTENSIONS)]
+        status("正在分析视频信息...")
+        counts = self.proxies.build(
+            sources, fill_mode, blur_quality,
+            on_progress=lambda done, total, path: status(f"正在生成代理文件 {done}/{total}: {os.path.basename(path)}"),
+            stop=stop,
+            control=control
+        )
+        status(f"代理文件: 新生成 {counts['built']} 个，已有 {counts['existing']} 个，"
+               f"失败 {counts['failed']} 个，未处理 {counts['skipped']} 个")
+        if control is not None and control.cancelled:
+            raise JobCancelled("任务已取消")
+        return counts
+
+    def profile_for(self, spec: JobSpec) -> EncoderProfile:
+        return get_profile(spec.encoder_profile, self.encoder_profiles)
+
+    def run(self, spec: JobSpec, on_status: Optional[Callable[[str], None]] = None,
+            limiter: Optional[threading.Semaphore] = None,
+            on_progress: Optional[Callable[[ProgressSnapshot], None]] = None,
+            control: Optional[JobControl] = None) -> List[str]:
+        """执行混剪任务，返回生成的视频路径
+
+        limiter为多个任务共享的并发上限，同时执行的ffmpeg进程不超过其名额。
+        on_status接收带进度、剩余时间和速度的文字消息，on_progress接收同一时刻的进度数据。
+        control用于暂停或取消（见mixer.control），取消时抛出JobCancelled；此前已完整生成的
+        输出按control.keep_outputs保留或删除，未完成的输出不会出现在输出文件夹中。
+        设置了trace_dir时，无论成功与否都把本次运行的步骤记录写入该目录。
+        """
+        status = on_status or (lambda message: None)
+        duration, clips = spec.resolve_clip_params()
+        if duration <= 0 or clips < 1:
+            raise MixError("片段时长和片段数量必须大于0")
+        if spec.generate_count < 1:
+            raise MixError("生成数量必须大于0")
+        if spec.fill_mode not in (FILL_BLACK, FILL_BLUR):
+            raise MixError(f"未知的填充方式: {spec.fill_mode}")
+        if spec.blur_quality not in BLUR_PRESETS:
+            raise MixError(f"未知的模糊质量: {spec.blur_quality}")
+        if not os.path.isdir(spec.input_folder):
+            raise MixError("输入文件夹不存在")
+        videos = list(spec.videos) or list_media_files(spec.input_folder, VIDEO_EXTENSIONS)
+        if not videos:
+            raise MixError("所选文件夹中没有视频文件")
+        if len(videos) < clips:
+            raise MixError("选中的视频数量少于需要的片段数量")
+        music = spec.resolve_music()
+        if spec.use_bgm and not music:
+            raise MixError("没有可用的背景音乐，请检查音乐池设置")
+        os.makedirs(spec.output_folder, exist_ok=True)
+
+        # 在临时目录中为本任务创建单独的文件夹（不放在输出文件夹中）
+        output_bytes = estimate_bytes(duration * clips, self.profile_for(spec).estimated_bitrate())
+        temp_dir = self.scratch.make_job_dir(needed=output_bytes)
+        clip_cache = self.clip_cache
+        pinned: List[str] = []
+        planned: List[str] = []  # 本次运行要生成的输出（不含跳过的已有输出）
+        tracer = Tracer(spec.output_name)
+        with self._lock:
+            self._active_runs += 1
+        try:
+            outputs = self._run(spec, videos, music, duration, clips, temp_dir, status, pinned, planned, limiter,
+                                on_progress, tracer, control)
+            status("处理完成!")
+            return outputs
+        except JobCancelled:
+            completed = [path for path in planned if os.path.exists(path)]
+            if control is not None and not control.keep_outputs:
+                for path in completed:
+                    os.remove(path)
+                status(f"已取消，删除了已完成的 {len(completed)} 个视频")
+            else:
+                status(f"已取消，保留已完成的 {len(completed)} 个视频")
+            raise
+        finally:
+            if self.trace_dir:
+                try:
+                    path = tracer.write_to_dir(self.trace_dir, self.trace_format)
+                    status(f"运行记录已保存: {path}")
+                except Exception as e:
+                    print(f"保存运行记录失败: {e}")
+            # 所有任务都结束后按容量上限淘汰旧的缓存片段，其他任务运行中时不淘汰
+            clip_cache.unpin(pinned)
+            with self._lock:
+                self._active_runs -= 1
+                if self._active_runs == 0:
+                    # 持有锁期间新的任务不会开始，淘汰不会删除它将要使用的片段
+                    try:
+                        clip_cache.prune()
+                    except Exception as e:
+                        print(f"整理片段缓存失败: {e}")
+            # 确保清理临时文件
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _run(self, spec: JobSpec, videos: List[str], music: List[str], duration: float, clips: int,
+             temp_dir: str, status: Callable[[str], None], pinned: List[str], planned: List[str],
+             limiter: Optional[threading.Semaphore],
+             on_progress: Optional[Callable[[ProgressSnapshot], None]], tracer: Tracer,
+             control: Optional[JobControl]) -> List[str]:
+        generate_count = spec.generate_count
+        use_bgm = bool(music)
+        strip_audio = spec.audio_mode == AUDIO_NONE or use_bgm  # 如果使用背景音乐，也需要去除原音频
+        voice_only = spec.audio_mode == AUDIO_VOICE
+        sound_effect_path = spec.sound_effect_path if spec.sound_effect_type != SOUND_EFFECT_NONE else None
+        profile = self.profile_for(spec)
+        checkpoint = control.checkpoint if control is not None else (lambda: None)
+
+        sources = [os.path.join(spec.input_folder, video) for video in videos]
+        if spec.use_proxies:
+            # 有有效代理文件的源视频改用代理文件（源视频变化后代理自动失效）
+            proxies = self.proxies.lookup(sources, spec.fill_mode, spec.blur_quality)
+            if len(proxies) < len(sources):
+                status(f"{len(sources) - len(proxies)} 个视频没有可用的代理文件，使用原视频")
+            sources = [proxies.get(source, source) for source in sources]
+
+        # 分析源视频信息（只分析新增或变化的文件）
+        status("正在分析视频信息...")
+        with tracer.span("probe", sources=len(sources)):
+            media_info = self.media_index.refresh(
+                sources,
+                on_progress=lambda done, total, path: status(f"正在分析视频信息 {done}/{total}...")
+            )
+        # 关键帧位置（只分析尚未记录的文件）：符合目标格式的源视频从关键帧开始直接复制，
+        # 需要重新编码的片段起始位置选在关键帧附近，输入定位后只需解码很短一段
+        status("正在分析关键帧...")
+        usable = [path for path, info in media_info.items() if info.get("duration")]
+        with tracer.span("keyframes", sources=len(usable)):
+            self.media_index.ensure_keyframes(usable, control=control)
+        media_info.update({path: self.media_index.get(path) for path in media_info})
+        checkpoint()
+
+        # 构建依赖图：片段处理 → 最终合成
+        # 任务权重按需要编码的媒体时长计算，直接复制视频流的步骤按COPY_COST折算
+        graph = JobGraph()
+        progress = BatchProgress()
+        media_seconds: Dict[str, float] = {}  # 任务名 -> 输出的媒体时长
+
+        def publish(label: str):
+            snapshot = progress.snapshot()
+            status(f"{label} - {snapshot.format()}")
+            if on_progress:
+                on_progress(snapshot)
+
+        def reporter(name: str, label: str) -> ProgressCallback:
+            def report(info: dict):
+                if progress.update(name, info):
+                    publish(label)
+            return report
+
+        # 背景音乐的时长、响度和节拍从音乐库读取（只分析新增或变化的文件），
+        # 跟随音乐模式按时长和节拍规划片段，混合时按响度调整音量
+        follow_music = use_bgm and spec.bgm_mode == BGM_FOLLOW_MUSIC
+        beat_sync = follow_music and spec.beat_sync
+        music_info: Dict[str, dict] = {}
+        if use_bgm:
+            status("正在分析音乐信息...")
+            with tracer.span("probe_music", sources=len(music)):
+                music_info = self.music_library.analyze(
+                    music, beats=self.music_beats or beat_sync,
+                    on_progress=lambda done, total, path: status(f"正在分析音乐响度 {done}/{total}..."),
+                    control=control
+                )
+            if follow_music:
+                music = [path for path in music if music_info.get(path, {}).get("duration")]
+                if not music:
+                    raise MixError("无法读取背景音乐的时长")
+            checkpoint()
+
+        clip_cache = self.clip_cache
+        normalize_tasks = {}  # 缓存键 -> 标准化任务，同一批次内相同片段只编码一次
+        outputs = []
+        # 运行记录中合成步骤按所做的处理区分
+        if use_bgm:
+            assemble_stage = "follow_music" if spec.bgm_mode == BGM_FOLLOW_MUSIC else "bgm_mix"
+        elif sound_effect_path and spec.sound_effect_type == SOUND_EFFECT_VIDEO:
+            assemble_stage = "sfx_mix"
+        else:
+            assemble_stage = "concat"
+
+        # 批次日志：参数相同的未完成批次沿用日志中的规划和输出文件名，从中断处继续
+        journal = BatchJournal(journal_path(spec.output_folder, spec.output_name))
+        fingerprint = spec.to_dict()
+        del fingerprint["resume"]
+        fingerprint["sources"] = sources
+        fingerprint = json.loads(json.dumps(fingerprint))  # 与从日志读出的记录格式一致
+        streaming = spec.streaming
+        if spec.resume and journal.matches(fingerprint):
+            seed, plans, names = journal.seed, journal.plans(), journal.names
+            # 上次生成的片段可能还没有写入片段缓存的索引
+            for key, size in journal.clips.items():
+                clip_cache.adopt(key, size)
+            status(f"继续上次未完成的批次，已完成 {len(journal.outputs)}/{generate_count} 个视频")
+            if streaming:
+                # 流式模式的片段不写入文件，中断时只保留已完成的输出；继续的批次改为生成片段文件，
+                # 再次中断时已完成的片段也记入日志，可以复用
+                streaming = False
+                status("继续的批次改为生成片段文件，再次中断时已完成的片段不需要重新编码")
+        else:
+            # 按随机种子一次规划整个批次：源视频和起始位置均衡使用，同一种子可以复现同样的结果
+            seed = spec.seed if spec.seed is not None else random.randrange(2 ** 32)
+            # 变速只调整视频，保留原音频时不放慢不够长的源视频，避免音画不同步
+            planner = ClipPlanner(media_info, seed, stream_copy=spec.stream_copy, retime=strip_audio)
+            with tracer.span("plan", seed=seed, outputs=generate_count):
+                plans = planner.plan(
+                    sources, clips, duration, generate_count,
+                    music=music if use_bgm else (),
+                    music_durations={path: music_info[path]["duration"] for path in music} if follow_music else None,
+                    music_beats={path: music_info[path].get("beats") or [] for path in music} if beat_sync else None
+                )
+            # 输出文件名在开始前全部确定并记入日志，继续时不会因为已有文件而改名
+            if spec.skip_existing:
+                names = [f"{spec.output_name}-{plan.index + 1}.mp4" for plan in plans]
+            else:
+                names = [unique_output_name(spec.output_folder, spec.output_name, plan.index + 1) for plan in plans]
+            journal.start(fingerprint, seed, plans, names)
+        status(f"随机种子: {seed}")
+
+        def journaled(func: Callable[[], None], record: Callable[[], None]) -> Callable[[], None]:
+            def run():
+                func()
+                record()
+            return run
+
+        for plan in plans:
+            video_index = plan.index
+            output_file = os.path.join(spec.output_folder, names[video_index])
+            if journal.verified_output(video_index, output_file):
+                status(f"第 {video_index + 1}/{generate_count} 个视频已完成，跳过")
+                outputs.append(output_file)
+                continue
+            if spec.skip_existing and is_complete_output(output_file):
+                status(f"第 {video_index + 1}/{generate_count} 个视频已存在，跳过")
+                outputs.append(output_file)
+                continue
+
+            # 规划中已确定源视频、起始位置（直接复制视频流时为关键帧）、每个片段的时长和速度；
+            # 跟随音乐模式下片段总时长等于音乐时长（切换点可能对齐到节拍），合成时与其他模式一样直接复制视频流
+            background_music = plan.music
+            bgm_gain = bgm_gain_db(music_info.get(background_music)) if background_music else None
+            copy_video = plan.copy_video
+            total_duration = plan.total_duration
+
+            # 处理每个视频片段
+            clip_files = []
+            clip_tasks = []
+            stream_clips = []
+            for i, clip in enumerate(plan.clips, 1):
+                clip_length = clip.length
+                clip_weight = clip_length * COPY_COST if copy_video else clip_length
+                label = f"第 {video_index + 1}/{generate_count} 个视频的片段 {i}/{clips}"
+                input_path = clip.source
+                info = media_info.get(input_path)
+                offset = clip.offset
+
+                # -ss放在-i之前使用输入定位：直接跳到起始位置之前最近的关键帧，只解码从该关键帧到
+                # 起始位置的一小段（规划时已限制在MAX_PREROLL以内）并精确裁剪，不会从文件开头读取和解码
+                # 起始位置固定保留3位小数（与关键帧时间相同），较大的位置也不会被舍入到其他关键帧之前
+                input_args = ["-ss", f"{offset:.3f}", "-i", input_path]
+                keyframe = preceding_keyframe(info.get("keyframes", []), offset) if info else None
+
+                # 裁剪、缩放、变速、人声过滤、片段音效在一次ffmpeg调用中完成
+                # 结果写入片段缓存，同一批次或之后的批次遇到相同参数时直接复用
+                normalize_args = build_clip_args(
+                    clip_length, profile,
+                    strip_audio=strip_audio,
+                    voice_only=voice_only,
+                    clip_effect_path=sound_effect_path if spec.sound_effect_type == SOUND_EFFECT_CLIPS else None,
+                    has_audio=info.get("has_audio", True) if info else True,
+                    copy_video=copy_video,
+                    fill=spec.fill_mode,
+                    blur_quality=spec.blur_quality,
+                    speed=clip.speed
+                )
+                cache_key = clip_cache.make_key(input_path, input_args + normalize_args)
+                clip_cache.pin(cache_key)
+                pinned.append(cache_key)
+                if streaming:
+                    stream_clips.append((cache_key, input_args, normalize_args, clip_length))
+                    continue
+                task = normalize_tasks.get(cache_key)
+                if task is None:
+                    name = f"normalize_{video_index}_{i}"
+                    estimated = estimate_bytes(clip_length, profile.estimated_bitrate(), with_audio=not strip_audio)
+                    task = graph.add(
+                        name,
+                        tracer.wrap(
+                            journaled(
+                                partial(self._normalize_clip, cache_key, input_args, normalize_args, estimated,
+                                        reporter(name, label)),
+                                partial(journal.record_clip, cache_key, clip_cache.path_for(cache_key))
+                            ),
+                            "copy_cut" if copy_video else "normalize", name,
+                            output_path=clip_cache.path_for(cache_key),
+                            source=input_path, output=output_file, offset=offset,
+                            preroll=round(offset - keyframe, 3) if keyframe is not None else None,
+                            cached=clip_cache.has(cache_key)
+                        ),
+                        weight=0 if clip_cache.has(cache_key) else clip_weight, label=label
+                    )
+                    media_seconds[name] = clip_length
+                    normalize_tasks[cache_key] = task
+                clip_files.append(clip_cache.path_for(cache_key))
+                clip_tasks.append(task)
+
+            # 合并片段并添加背景音乐或音效，一次ffmpeg调用直接输出最终视频
+            # 片段顺序由clip_files决定，与完成顺序无关
+            assemble_weight = total_duration * COPY_COST
+            label = f"合成第 {video_index + 1}/{generate_count} 个视频"
+            list_file = os.path.join(temp_dir, f"list_{video_index}.txt")
+            scratch_file = os.path.join(temp_dir, f"output_{video_index}.mp4")
+            outputs.append(output_file)
+            planned.append(output_file)
+            if streaming:
+                # 流式模式：片段依次编码并通过管道送入合成进程，整个输出为一个任务
+                name = f"stream_{video_index}"
+                graph.add(
+                    name,
+                    tracer.wrap(
+                        journaled(
+                            partial(
+                                self._stream_output, stream_clips, scratch_file, output_file,
+                                background_music, bgm_gain,
+                                sound_effect_path if spec.sound_effect_type == SOUND_EFFECT_VIDEO else None, profile,
+                                reporter(name, label)
+                            ),
+                            partial(journal.record_output, video_index, output_file)
+                        ),
+                        "stream", name, output_path=output_file, output=output_file, clips=clips
+                    ),
+                    weight=total_duration * (COPY_COST if copy_video else 1) + assemble_weight, label=label
+                )
+                media_seconds[name] = total_duration
+                continue
+            name = f"assemble_{video_index}"
+            graph.add(
+                name,
+                tracer.wrap(
+                    journaled(
+                        partial(
+                            self._assemble_output, clip_files, list_file, scratch_file, output_file, total_duration,
+                            background_music, bgm_gain,
+                            sound_effect_path if spec.sound_effect_type == SOUND_EFFECT_VIDEO else None,
+                            reporter(name, label)
+                        ),
+                        partial(journal.record_output, video_index, output_file)
+                    ),
+                    assemble_stage, name, output_path=output_file, output=output_file, clips=clips
+                ),
+                deps=clip_tasks, weight=assemble_weight, label=label
+            )
+            media_seconds[name] = total_duration
+
+        for task in graph.tasks:
+            progress.add(task.name, task.weight, media_seconds[task.name])
+
+        def on_task_done(done: float, total: float, task: Task):
+            progress.finish(task.name)
+            publish(f"{task.label} 完成")
+
+        status("开始处理...")
+        max_workers = self.max_workers or default_worker_count(profile.threads)
+        Scheduler(max_workers=max_workers, on_progress=on_task_done, limiter=limiter, control=control).run(graph)
+        journal.finish()
+        return outputs
+
+    def _normalize_clip(self, cache_key: str, input_args: List[str], args: List[str], estimated: int,
+                        report: Optional[ProgressCallback] = None):
+        """将源视频处理为标准片段，结果存入片段缓存
+
+        estimated为预估的片段大小，写入前检查缓存目录的剩余空间并登记中间文件预算。
+        """
+        def produce(output_path: str):
+            self.scratch.check_free(os.path.dirname(output_path), estimated)
+            with self.scratch.budget(estimated):
+                run_ffmpeg(["ffmpeg", "-y"] + input_args + args + [output_path], on_progress=report)
+
+        self.clip_cache.produce(cache_key, produce)
+
+    def _stream_output(self, stream_clips: List[Tuple[str, List[str], List[str], float]],
+                       scratch_file: str, output_file: str, background_music: Optional[str],
+                       bgm_gain: Optional[float], video_effect_path: Optional[str], profile: EncoderProfile,
+                       report: Optional[ProgressCallback] = None):
+        """流式生成一个输出：片段编码为MPEG-TS写入合成进程的标准输入，不产生片段文件
+
+        stream_clips为每个片段的(缓存键, 输入参数, 处理参数, 时长)，片段缓存中已有的片段直接复制流，
+        其余片段现场编码（结果不写入缓存）。bgm_gain为背景音乐的音量调整（dB），为None时使用固定音量。
+        """
+        producers = []
+        offset = 0.0
+        for cache_key, input_args, args, length in stream_clips:
+            output_args = stream_output_args(offset)
+            offset += length
+            if self.clip_cache.has(cache_key):
+                producers.append(["ffmpeg", "-i", self.clip_cache.path_for(cache_key), "-map", "0", "-c", "copy"]
+                                 + output_args)
+            else:
+                producers.append(["ffmpeg"] + input_args + args + output_args)
+
+        total_duration = offset
+        estimated = estimate_bytes(total_duration, profile.estimated_bitrate())
+        # 临时目录空间不足时改用其他临时目录（见ScratchSpace.reserve_path）
+        scratch_file = self.scratch.reserve_path(scratch_file, estimated)
+        consumer = build_assembly_command(
+            None, scratch_file, total_duration,
+            background_music=background_music,
+            sound_effect_path=video_effect_path,
+            input_args=STREAM_INPUT_ARGS,
+            bgm_gain_db=bgm_gain
+        )
+        try:
+            with self.scratch.budget(estimated):
+                run_ffmpeg_pipeline(producers, consumer, on_progress=report)
+                move_into_place(scratch_file, output_file)
+        finally:
+            if os.path.exists(scratch_file):
+                os.remove(scratch_file)
+
+    def _assemble_output(self, clip_files: List[str], list_file: str, scratch_file: str, output_file: str,
+                         total_duration: float, background_music: Optional[str], bgm_gain: Optional[float],
+                         video_effect_path: Optional[str],
+                         report: Optional[ProgressCallback] = None):
+        """合并片段并混合背景音乐或视频开头音效，生成最终输出
+
+        先在临时目录中生成scratch_file，完成后移动到输出文件夹，输出文件名存在即表示已完整生成。
+        bgm_gain为背景音乐的音量调整（dB），为None时使用固定音量。
+        """
+        write_concat_list(list_file, clip_files)
+        # 视频流直接复制，输出大小约等于片段大小之和
+        estimated = sum(os.path.getsize(path) for path in clip_files)
+        scratch_file = self.scratch.reserve_path(scratch_file, estimated)
+        cmd = build_assembly_command(
+            list_file, scratch_file, total_duration,
+            background_music=background_music,
+            sound_effect_path=video_effect_path,
+            bgm_gain_db=bgm_gain
+        )
+        try:
+            with self.scratch.budget(estimated):
+                run_ffmpeg(cmd, on_progress=report)
+                move_into_place(scratch_file, output_file)
+        finally:
+            if os.path.exists(scratch_file):
+                os.remove(scratch_file)
+        os.remove(list_file)
@@ -0,0 +1,207 @@
+"""FFmpeg命令执行辅助函数"""
+import os
+import subprocess
+import threading
+from typing import IO, Callable, List, Optional, Tuple
+
+from .control import register_process, release_process
+from .trace import note_process
+
+# ffmpeg -progress输出的一组进度信息，字段见parse_progress_block
+ProgressCallback = Callable[[dict], None]
+
+
+def with_progress(cmd: List[str]) -> List[str]:
+    """在ffmpeg命令中加入-progress pipe:1，进度以key=value形式写到标准输出"""
+    return cmd[:1] + ["-progress", "pipe:1", "-nostats"] + cmd[1:]
+
+
+def _to_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_progress_block(block: dict) -> dict:
+    """把一组-progress输出转换为进度信息
+
+    out_time为已输出的媒体时长（秒），fps为编码帧率，speed为相对实时的倍数，
+    end表示ffmpeg已处理完毕。ffmpeg的out_time_ms字段单位实际为微秒，与out_time_us相同。
+    """
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms")
+    return {
+        "out_time": max(0.0, _to_float(out_time_us) / 1_000_000),
+        "frame": int(_to_float(block.get("frame"))),
+        "fps": _to_float(block.get("fps")),
+        "speed": _to_float((block.get("speed") or "").rstrip("x")),
+        "end": block.get("progress") == "end",
+    }
+
+
+def read_progress(stream: IO[bytes], on_progress: ProgressCallback):
+    """逐行读取-progress输出，每读完一组（以progress=结尾）回调一次"""
+    block = {}
+    for raw in stream:
+        key, _, value = raw.decode("utf-8", "replace").strip().partition("=")
+        if not key:
+            continue
+        block[key] = value
+        if key == "progress":
+            on_progress(parse_progress_block(block))
+            block = {}
+
+
+def _popen(cmd: List[str], **kwargs) -> subprocess.Popen:
+    """启动子进程并登记到当前线程的任务控制（见mixer.control），取消或暂停时可向其发送信号"""
+    process = subprocess.Popen(cmd, **kwargs)
+    register_process(process)
+    return process
+
+
+def _wait(process: subprocess.Popen, cmd: List[str]) -> int:
+    """等待进程结束并把它的资源占用记入当前的运行记录步骤，返回退出码
+
+    支持os.wait4的系统上直接回收该进程以取得它自己的rusage。
+    """
+    try:
+        if process.returncode is None and hasattr(os, "wait4"):
+            try:
+                _, status, usage = os.wait4(process.pid, 0)
+            except ChildProcessError:
+                pass
+            else:
+                process.returncode = os.waitstatus_to_exitcode(status)
+                note_process(cmd, usage)
+                return process.returncode
+        returncode = process.wait()
+        note_process(cmd)
+        return returncode
+    finally:
+        release_process(process)
+
+
+def _run_process(cmd: List[str], **kwargs):
+    """执行命令并记录资源占用，失败时抛出subprocess.CalledProcessError"""
+    process = _popen(cmd, **kwargs)
+    try:
+        returncode = _wait(process, cmd)
+    except BaseException:
+        process.kill()
+        process.wait()
+        release_process(process)
+        raise
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def capture_output(cmd: List[str]) -> bytes:
+    """执行命令并返回标准输出，进程同样登记到任务控制，失败时抛出subprocess.CalledProcessError"""
+    process = _popen(cmd, stdout=subprocess.PIPE)
+    try:
+        output = process.stdout.read()
+    finally:
+        process.stdout.close()
+        returncode = _wait(process, cmd)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, output)
+    return output
+
+
+def capture_output_and_log(cmd: List[str]) -> Tuple[bytes, bytes]:
+    """执行命令并返回(标准输出, 标准错误)，进程登记到任务控制，失败时抛出subprocess.CalledProcessError"""
+    process = _popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log = []
+    reader = threading.Thread(target=lambda: log.append(process.stderr.read()), daemon=True)
+    reader.start()
+    try:
+        output = process.stdout.read()
+    finally:
+        process.stdout.close()
+        reader.join()
+        process.stderr.close()
+        returncode = _wait(process, cmd)
+    stderr = log[0] if log else b""
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, output, stderr)
+    return output, stderr
+
+
+def run_ffmpeg(cmd: List[str], on_progress: Optional[ProgressCallback] = None):
+    """执行一条ffmpeg命令，失败时抛出subprocess.CalledProcessError
+
+    传入on_progress时以-progress运行，并把解析后的进度信息传给回调。
+    """
+    if on_progress is None:
+        _run_process(cmd)
+        return
+    process = _popen(with_progress(cmd), stdout=subprocess.PIPE)
+    try:
+        read_progress(process.stdout, on_progress)
+    finally:
+        process.stdout.close()
+        returncode = _wait(process, cmd)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def run_ffmpeg_pipeline(producers: List[List[str]], consumer: List[str],
+                        on_progress: Optional[ProgressCallback] = None):
+    """依次执行producers，把它们的标准输出首尾相接写入consumer的标准输入
+
+    任一命令失败时终止其余进程并抛出subprocess.CalledProcessError。
+    on_progress接收consumer的进度（producers的标准输出已用于传输数据）。
+    """
+    if on_progress is None:
+        process = _popen(consumer, stdin=subprocess.PIPE)
+        reader = None
+    else:
+        process = _popen(with_progress(consumer), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        reader = threading.Thread(target=read_progress, args=(process.stdout, on_progress), daemon=True)
+        reader.start()
+    try:
+        for cmd in producers:
+            _run_process(cmd, stdout=process.stdin)
+    except BaseException:
+        process.kill()
+        process.wait()
+        release_process(process)
+        raise
+    finally:
+        if process.stdin:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+    returncode = _wait(process, consumer)
+    if reader is not None:
+        reader.join()
+        process.stdout.close()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, consumer)
+
+
+def probe_duration(file_path: str) -> float:
+    """使用ffprobe获取媒体文件时长（秒）"""
+    output = subprocess.check_output([
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        file_path
+    ])
+    return float(output.decode().strip())
+
+
+def probe_frame_count(file_path: str) -> int:
+    """使用ffprobe统计视频流的帧数"""
+    output = subprocess.check_output([
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-count_packets",
+        "-show_entries", "stream=nb_read_packets",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        file_path
+    ])
+    return int(output.decode().strip())
@@ -0,0 +1,194 @@
+"""FFmpeg滤镜图构建：把片段的缩放填充、人声过滤、音效混合合并到一次-filter_complex中"""
+from typing import Dict, List, Optional, Tuple
+
+from .profiles import EncoderProfile
+
+# TikTok标准分辨率
+TARGET_WIDTH = 1080
+TARGET_HEIGHT = 1920
+
+# 仅保留人声的音频滤镜
+VOICE_FILTER = "pan=stereo|c0=c0,lowpass=3000,highpass=200"
+
+# 源视频没有音轨时使用的静音输入
+SILENCE_SOURCE = "anullsrc=r=44100:cl=stereo"
+
+# 画面不足目标尺寸时的填充方式
+FILL_BLACK = "black"  # 黑边
+FILL_BLUR = "blur"  # 模糊背景
+
+# 模糊背景的质量/速度档位：背景板先缩小到plate_width宽再模糊，半径按缩小后的尺寸计算，
+# 缩得越小模糊越快，放大回目标尺寸后同样足够模糊
+BLUR_PRESETS: Dict[str, dict] = {
+    "fast": {"plate_width": 54, "radius": 3, "power": 1, "flags": "fast_bilinear"},
+    "balanced": {"plate_width": 108, "radius": 6, "power": 2, "flags": "bilinear"},
+    "high": {"plate_width": 270, "radius": 16, "power": 2, "flags": "bicubic"},
+}
+DEFAULT_BLUR_QUALITY = "balanced"
+
+# 可以直接复制视频流的源视频：H.264、目标分辨率、yuv420p、以下profile之一
+CONFORMING_CODEC = "h264"
+CONFORMING_PIX_FMT = "yuv420p"
+CONFORMING_PROFILES = ("Constrained Baseline", "Main", "High")
+
+
+def scale_pad_filter(width: int = TARGET_WIDTH, height: int = TARGET_HEIGHT) -> str:
+    """等比缩放到目标尺寸以内，不足部分用黑边填充"""
+    return (
+        f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black"
+    )
+
+
+def add_blur_fill(graph: "FilterGraph", source: str, quality: str = DEFAULT_BLUR_QUALITY,
+                  width: int = TARGET_WIDTH, height: int = TARGET_HEIGHT, output: str = "v") -> str:
+    """添加模糊背景填充：源画面等比缩放居中，空白处为同一画面放大模糊后的背景
+
+    只split一次：背景支路先缩小到很小的背景板再模糊，然后放大到目标尺寸，
+    前景支路等比缩放后叠加在背景中央。返回输出标签。
+    """
+    preset = BLUR_PRESETS[quality]
+    plate_width = preset["plate_width"]
+    plate_height = round(plate_width * height / width / 2) * 2
+    background, foreground = graph.add_multi([source], "split=2", [f"{output}_bg", f"{output}_fg"])
+    plate = graph.add(
+        [background],
+        f"scale=w={plate_width}:h={plate_height}:force_original_aspect_ratio=increase:flags={preset['flags']},"
+        f"crop={plate_width}:{plate_height},"
+        f"boxblur=luma_radius={preset['radius']}:luma_power={preset['power']},"
+        f"scale=w={width}:h={height}:flags={preset['flags']},setsar=1",
+        f"{output}_plate"
+    )
+    front = graph.add(
+        [foreground], f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease", f"{output}_front"
+    )
+    return graph.add([plate, front], "overlay=x=(W-w)/2:y=(H-h)/2", output)
+
+
+def is_conforming(info: Optional[dict]) -> bool:
+    """源视频是否已符合目标格式，可以不缩放、不重新编码直接复制视频流"""
+    if not info:
+        return False
+    return (
+        info.get("video_codec") == CONFORMING_CODEC
+        and info.get("width") == TARGET_WIDTH
+        and info.get("height") == TARGET_HEIGHT
+        and info.get("pix_fmt") == CONFORMING_PIX_FMT
+        and info.get("video_profile") in CONFORMING_PROFILES
+    )
+
+
+def stream_signature(info: Optional[dict]) -> Optional[tuple]:
+    """直接复制的片段合并为一个视频轨时必须一致的编码参数，编码参数未知时返回None
+
+    合并后的MP4只保存第一个片段的编码参数（avcC），档次、级别或SPS/PPS不同的片段会解码出错。
+    """
+    if not info or not info.get("video_extradata"):
+        return None
+    return (
+        info.get("video_profile"),
+        info.get("video_level"),
+        info["video_extradata"],
+        round(info.get("fps") or 0, 2),
+    )
+
+
+class FilterGraph:
+    """按顺序拼接带标签的滤镜链，生成-filter_complex参数"""
+
+    def __init__(self):
+        self.chains: List[str] = []
+
+    def add(self, inputs: List[str], filters: str, output: str) -> str:
+        """添加一条滤镜链，返回输出标签"""
+        labels = "".join(f"[{label}]" for label in inputs)
+        self.chains.append(f"{labels}{filters}[{output}]")
+        return output
+
+    def add_multi(self, inputs: List[str], filters: str, outputs: List[str]) -> List[str]:
+        """添加一条有多个输出的滤镜链（如split），返回输出标签"""
+        labels = "".join(f"[{label}]" for label in inputs)
+        self.chains.append(labels + filters + "".join(f"[{label}]" for label in outputs))
+        return outputs
+
+    def __str__(self) -> str:
+        return ";".join(self.chains)
+
+    def __bool__(self) -> bool:
+        return bool(self.chains)
+
+
+def build_clip_filter_graph(strip_audio: bool, voice_only: bool,
+                            sound_effect_input: Optional[int] = None,
+                            audio_input: str = "0:a",
+                            copy_video: bool = False, fill: str = FILL_BLACK,
+                            blur_quality: str = DEFAULT_BLUR_QUALITY,
+                            speed: float = 1.0) -> Tuple[FilterGraph, List[str]]:
+    """构建单个片段的滤镜图
+
+    输入0为源视频，audio_input为使用的音频流，sound_effect_input为音效文件的输入序号
+    （不加音效时为None）。copy_video为True时视频流不经过滤镜，直接复制；
+    fill为画面填充方式（黑边或模糊背景）；speed不为1时视频时间戳乘以speed（大于1为放慢）。
+    返回滤镜图和对应的-map参数。
+    """
+    graph = FilterGraph()
+    video = "0:v"
+    if speed != 1.0 and not copy_video:
+        video = graph.add([video], f"setpts=PTS*{speed:g}", "retimed")
+    if copy_video:
+        maps = ["-map", "0:v"]
+    elif fill == FILL_BLUR:
+        maps = ["-map", "[" + add_blur_fill(graph, video, blur_quality) + "]"]
+    else:
+        maps = ["-map", "[" + graph.add([video], scale_pad_filter(), "v") + "]"]
+    if strip_audio:
+        return graph, maps + ["-an"]
+
+    if not voice_only and sound_effect_input is None:
+        # 保留原始音频，无需音频滤镜
+        return graph, maps + ["-map", f"{audio_input}?"]
+
+    audio = audio_input
+    if voice_only:
+        audio = graph.add([audio], VOICE_FILTER, "voice")
+    if sound_effect_input is not None:
+        delayed = graph.add([f"{sound_effect_input}:a"], "adelay=0|0", "delayed")
+        audio = graph.add([audio, delayed], "amix=inputs=2:duration=first", "mixed")
+    return graph, maps + ["-map", f"[{audio}]"]
+
+
+def build_clip_args(duration: float, profile: EncoderProfile, strip_audio: bool,
+                    voice_only: bool = False, clip_effect_path: Optional[str] = None,
+                    has_audio: bool = True, copy_video: bool = False, fill: str = FILL_BLACK,
+                    blur_quality: str = DEFAULT_BLUR_QUALITY, speed: float = 1.0) -> List[str]:
+    """生成片段处理的ffmpeg参数（不含源视频输入和输出路径）
+
+    duration为片段在输出中的时长。源视频没有音轨但需要保留音频时以静音代替，
+    保证同一输出的所有片段音轨一致。copy_video用于已符合目标格式的源视频：视频流直接复制
+    （起始位置需为关键帧），只处理音频。fill、blur_quality和speed见build_clip_filter_graph；
+    speed只调整视频，只用于去除音频的片段（使用背景音乐或去除音频时），不能与copy_video同时使用。
+    """
+    args = []
+    next_input = 1
+    audio_input = "0:a"
+    if not strip_audio and not has_audio:
+        args += ["-f", "lavfi", "-i", SILENCE_SOURCE]
+        audio_input = f"{next_input}:a"
+        next_input += 1
+        voice_only = False
+    sound_effect_input = None
+    if clip_effect_path and not strip_audio:
+        # 在每个片段开头添加音效
+        args += ["-i", clip_effect_path]
+        sound_effect_input = next_input
+    filter_graph, maps = build_clip_filter_graph(
+        strip_audio, voice_only and not strip_audio, sound_effect_input, audio_input, copy_video,
+        fill, blur_quality, speed
+    )
+    if filter_graph:
+        args += ["-filter_complex", str(filter_graph)]
+    args += maps
+    args += ["-t", str(duration)] + (["-c:v", "copy"] if copy_video else profile.video_args())
+    if not strip_audio:
+        args += ["-c:a", "aac", "-b:a", "192k"]
+    return args
@@ -0,0 +1,134 @@
+"""批次日志：记录批次的规划、已完成的片段和已完成的输出，中断后从中断处继续
+
+日志保存在输出文件夹中的隐藏文件".输出文件名.journal.jsonl"里，只追加写入，每行一条记录，
+每条记录写入后立即刷新到磁盘（fsync），断电或崩溃时最多丢失正在写入的最后一行：
+
+    {"type": "batch", "fingerprint": {...}, "seed": 123, "plans": [...], "names": [...]}
+    {"type": "clip", "key": "片段缓存键", "size": 1234567}
+    {"type": "output", "index": 0, "name": "混剪视频-1.mp4", "size": 2345678, "sha256": "..."}
+    {"type": "done"}
+
+用相同参数重新运行时沿用日志中的规划（源视频、起始位置、背景音乐）和输出文件名，
+大小和校验和一致的已完成输出直接跳过，已生成的片段重新登记到片段缓存后复用。
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from .planner import PlannedOutput
+
+# 计算校验和时每次读取的字节数
+CHUNK_SIZE = 1024 * 1024
+
+
+def journal_path(output_folder: str, output_name: str) -> str:
+    """批次日志的路径"""
+    return os.path.join(output_folder, f".{output_name}.journal.jsonl")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchJournal:
+    """一个批次的日志，创建时读取已有的记录"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.batch: Optional[dict] = None
+        self.clips: Dict[str, int] = {}  # 缓存键 -> 片段大小
+        self.outputs: Dict[int, dict] = {}  # 输出序号 -> 输出记录
+        self.done = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 中断时只写了一半的最后一行
+                self._apply(record)
+
+    def _apply(self, record: dict):
+        kind = record.get("type")
+        if kind == "batch":
+            self.batch = record
+            self.clips, self.outputs, self.done = {}, {}, False
+        elif kind == "clip":
+            self.clips[record["key"]] = record["size"]
+        elif kind == "output":
+            self.outputs[record["index"]] = record
+        elif kind == "done":
+            self.done = True
+
+    def _append(self, record: dict, mode: str = 'a'):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, mode, encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(record)
+
+    def matches(self, fingerprint: dict) -> bool:
+        """日志中有参数相同且尚未完成的批次"""
+        return self.batch is not None and not self.done and self.batch["fingerprint"] == fingerprint
+
+    @property
+    def seed(self) -> int:
+        return self.batch["seed"]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.batch["names"])
+
+    def plans(self) -> List[PlannedOutput]:
+        return [PlannedOutput.from_dict(data) for data in self.batch["plans"]]
+
+    def start(self, fingerprint: dict, seed: int, plans: List[PlannedOutput], names: List[str]):
+        """开始新批次，覆盖之前的日志"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._append({
+            "type": "batch",
+            "fingerprint": fingerprint,
+            "seed": seed,
+            "plans": [plan.to_dict() for plan in plans],
+            "names": names,
+        }, mode='w')
+
+    def record_clip(self, key: str, path: str):
+        size = os.path.getsize(path)
+        if self.clips.get(key) != size:
+            self._append({"type": "clip", "key": key, "size": size})
+
+    def record_output(self, index: int, path: str):
+        self._append({
+            "type": "output",
+            "index": index,
+            "name": os.path.basename(path),
+            "size": os.path.getsize(path),
+            "sha256": file_sha256(path),
+        })
+
+    def verified_output(self, index: int, path: str) -> bool:
+        """该输出已记录为完成，且文件的大小和校验和与记录一致"""
+        record = self.outputs.get(index)
+        if record is None or record["name"] != os.path.basename(path):
+            return False
+        try:
+            return os.path.getsize(path) == record["size"] and file_sha256(path) == record["sha256"]
+        except OSError:
+            return False
+
+    def finish(self):
+        self._append({"type": "done"})
@@ -0,0 +1,262 @@
+"""媒体信息索引：持久保存源文件的时长、分辨率、帧率、编码和音轨信息
+
+索引按文件路径+修改时间+大小判断是否需要重新分析，只有新增或变化的文件才会
+调用ffprobe，分析在线程池中并行进行。
+"""
+import json
+import os
+import subprocess
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .cache import file_identity
+from .control import JobControl
+from .ffmpeg import capture_output
+
+# 随机起始偏移的取值粒度（秒），取整后相同参数的片段仍可命中片段缓存
+OFFSET_STEP = 1.0
+
+# 分析结果的版本，probe_media增加字段或分析方式变化时加1，旧版本的条目在下次refresh时重新分析
+PROBE_VERSION = 3
+
+# 重新分析时不保留的追加信息（版本变化可能改变了它们的计算方式）
+RESCAN_FIELDS = ("keyframes",)
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """把ffprobe的"30000/1001"格式帧率转换为浮点数"""
+    if not rate:
+        return 0.0
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except ValueError:
+        return 0.0
+
+
+def probe_media(path: str) -> dict:
+    """使用ffprobe分析单个媒体文件"""
+    output = subprocess.check_output([
+        "ffprobe",
+        "-v", "error",
+        "-show_entries",
+        "format=duration:stream=codec_type,codec_name,width,height,r_frame_rate,profile,level,pix_fmt,"
+        "sample_rate,extradata_hash",
+        "-show_data_hash", "sha256",
+        "-of", "json",
+        path
+    ])
+    data = json.loads(output.decode("utf-8"))
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    try:
+        duration = float(data.get("format", {}).get("duration", 0))
+    except (TypeError, ValueError):
+        duration = 0.0
+    return {
+        "duration": duration,
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "fps": _parse_rate(video.get("r_frame_rate")),
+        "video_codec": video.get("codec_name"),
+        "video_profile": video.get("profile"),
+        "video_level": video.get("level"),
+        "video_extradata": video.get("extradata_hash"),  # 编码参数（H.264为SPS/PPS）的校验和
+        "pix_fmt": video.get("pix_fmt"),
+        "audio_codec": audio.get("codec_name"),
+        "sample_rate": int(audio["sample_rate"]) if audio.get("sample_rate") else None,
+        "has_audio": bool(audio),
+    }
+
+
+def probe_keyframes(path: str) -> List[float]:
+    """列出视频流所有关键帧的时间（秒），只读取数据包，不解码
+
+    时间从文件的起始时间算起，与输入定位-ss的起点相同：ffmpeg定位时会加上文件的start_time
+    （MPEG-TS和部分相机、手机拍摄的MP4不从0开始）。文件的起始时间未知时使用视频流的起始时间。
+    ffprobe进程登记到当前线程的任务控制，取消任务时随之结束。
+    """
+    output = capture_output([
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "format=start_time:stream=start_time:packet=pts_time,flags",
+        "-of", "csv",
+        path
+    ])
+    starts = {}
+    times = []
+    for line in output.decode("utf-8").splitlines():
+        section, _, fields = line.partition(",")
+        if section in ("format", "stream") and fields not in ("", "N/A"):
+            starts[section] = float(fields)
+        elif section == "packet":
+            pts_time, _, flags = fields.partition(",")
+            if "K" in flags and pts_time not in ("", "N/A"):
+                times.append(float(pts_time))
+    start = starts.get("format", starts.get("stream", 0.0))
+    return sorted(round(time - start, 3) for time in times)
+
+
+class MediaIndex:
+    """持久化的媒体信息索引，保存在JSON文件中"""
+
+    def __init__(self, index_path: str, prober: Callable[[str], dict] = probe_media):
+        self.index_path = index_path
+        self.prober = prober
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 多个线程（如后台生成代理）同时保存时依次写入
+        self.entries: Dict[str, dict] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            print(f"加载媒体索引失败: {e}")
+            self.entries = {}
+
+    def save(self):
+        """索引有变化时写回磁盘"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = json.loads(json.dumps(self.entries))
+                self._dirty = False
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.index_path)
+
+    def _is_current(self, path: str, identity: dict) -> bool:
+        entry = self.entries.get(identity["path"])
+        return (
+            entry is not None
+            and entry.get("mtime") == identity["mtime"]
+            and entry.get("size") == identity["size"]
+        )
+
+    def get(self, path: str) -> Optional[dict]:
+        """返回文件的媒体信息，文件已变化或未分析时返回None"""
+        try:
+            identity = file_identity(path)
+        except OSError:
+            return None
+        with self._lock:
+            if self._is_current(path, identity):
+                return self.entries[identity["path"]]["info"]
+        return None
+
+    def update(self, path: str, **fields):
+        """为已分析的文件追加信息（如关键帧位置、响度）"""
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self.entries:
+                self.entries[key]["info"].update(fields)
+                self._dirty = True
+
+    def ensure_keyframes(self, paths: Iterable[str], max_workers: Optional[int] = None,
+                         prober: Callable[[str], List[float]] = probe_keyframes,
+                         control: Optional[JobControl] = None) -> Dict[str, List[float]]:
+        """为已分析的文件补充关键帧位置（只分析尚未记录的文件），返回 路径 -> 关键帧列表
+
+        control用于暂停或取消：每个文件开始前检查，分析中的ffprobe进程在取消时结束，
+        已完成的结果照常保存，取消时抛出JobCancelled。分析失败的文件不记录，下次调用时重试。
+        """
+        paths = list(paths)
+        missing = [path for path in paths if (info := self.get(path)) is not None and "keyframes" not in info]
+
+        def probe(path: str):
+            if control is None:
+                keyframes = self._probe_keyframes(prober, path)
+            else:
+                control.checkpoint()
+                with control.attach():
+                    keyframes = self._probe_keyframes(prober, path)
+                if control.cancelled:
+                    return  # 进程被结束，结果不完整，不记录
+            if keyframes is not None:
+                self.update(path, keyframes=keyframes)
+
+        if missing:
+            workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(probe, missing))
+            finally:
+                self.save()
+        return {path: info.get("keyframes", []) for path in paths if (info := self.get(path)) is not None}
+
+    def _probe_keyframes(self, prober: Callable[[str], List[float]], path: str) -> Optional[List[float]]:
+        """分析失败时返回None（可能是暂时的错误，不保存空结果）"""
+        try:
+            return prober(path)
+        except Exception as e:
+            print(f"分析关键帧失败: {path}: {e}")
+            return None
+
+    def _probe_one(self, path: str):
+        identity = file_identity(path)
+        try:
+            info = self.prober(path)
+        except Exception as e:
+            info = {"duration": 0.0, "error": str(e)}
+        with self._lock:
+            if self._is_current(path, identity):
+                # 文件未变化、只是分析版本过旧时保留追加的信息（代理文件、响度等）
+                kept = self.entries[identity["path"]]["info"]
+                info = {**{key: value for key, value in kept.items() if key not in RESCAN_FIELDS}, **info}
+            self.entries[identity["path"]] = {
+                "mtime": identity["mtime"],
+                "size": identity["size"],
+                "version": PROBE_VERSION,
+                "info": info,
+            }
+            self._dirty = True
+        return path, info
+
+    def stale_paths(self, paths: Iterable[str]) -> List[str]:
+        """返回需要重新分析的文件"""
+        stale = []
+        for path in paths:
+            try:
+                identity = file_identity(path)
+            except OSError:
+                continue
+            with self._lock:
+                if (not self._is_current(path, identity)
+                        or self.entries[identity["path"]].get("version", 1) != PROBE_VERSION):
+                    stale.append(path)
+        return stale
+
+    def refresh(self, paths: Iterable[str], max_workers: Optional[int] = None,
+                on_progress: Optional[Callable[[int, int, str], None]] = None) -> Dict[str, dict]:
+        """并行分析新增或变化的文件，返回 路径 -> 媒体信息"""
+        paths = list(paths)
+        stale = self.stale_paths(paths)
+        if stale:
+            workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(self._probe_one, path) for path in stale]
+                for done, future in enumerate(as_completed(futures), 1):
+                    path, _ = future.result()
+                    if on_progress:
+                        on_progress(done, len(stale), path)
+            self.save()
+        return {path: info for path in paths if (info := self.get(path)) is not None}
+
+
+def preceding_keyframe(keyframes: List[float], offset: float) -> Optional[float]:
+    """offset处或之前最近的关键帧，从这里开始解码可以得到offset处的画面；没有时返回None"""
+    i = bisect_right(keyframes, offset + 1e-3)  # 关键帧时间保留3位小数
+    return keyframes[i - 1] if i else None
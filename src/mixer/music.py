@@ -0,0 +1,258 @@
+"""背景音乐库：为音乐池中的每首音乐预先分析响度和节拍，结果保存在音乐信息索引中
+
+每首音乐只分析一次（按文件标识判断是否变化，与媒体信息索引相同），分析在线程池中并行进行：
+
+- 时长、采样率：ffprobe（MediaIndex.refresh）
+- 综合响度（LUFS）和真峰值（dBTP）：ffmpeg的ebur128滤镜，解码一遍
+- 速度（BPM）和节拍位置（可选）：与响度在同一次解码中输出低采样率单声道PCM，
+  按能量起伏估计，不依赖第三方库
+
+混合背景音乐时按预先测得的响度计算增益（bgm_gain_db），在合成命令的volume滤镜中一次完成，
+不需要对每个输出做两遍loudnorm。
+"""
+import math
+import os
+import re
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .control import JobControl
+from .ffmpeg import capture_output_and_log
+from .media_index import MediaIndex
+
+# 背景音乐的目标响度（LUFS）、最大提升（dB）和真峰值上限（dBTP）
+BGM_TARGET_LUFS = -16.0
+BGM_MAX_GAIN_DB = 12.0
+BGM_PEAK_CEILING = -1.0
+
+# 节拍分析使用的采样率和帧移（采样点），每帧约23毫秒
+BEAT_SAMPLE_RATE = 11025
+BEAT_HOP = 256
+
+# 速度估计范围（BPM）和先验中心（偏向常见的120BPM附近，减少倍速/半速误判）
+MIN_BPM = 60.0
+MAX_BPM = 180.0
+PRIOR_BPM = 120.0
+
+# 节拍跟踪中拍间隔偏离估计周期的惩罚系数，越大节拍越均匀
+BEAT_TIGHTNESS = 100.0
+
+_LOUDNESS_RE = re.compile(r"I:\s+(-?[\d.]+|-inf) LUFS")
+_PEAK_RE = re.compile(r"Peak:\s+(-?[\d.]+|-inf) dBFS")
+
+
+def _last_value(pattern: re.Pattern, text: str) -> Optional[float]:
+    matches = pattern.findall(text)
+    if not matches or matches[-1] == "-inf":
+        return None
+    return float(matches[-1])
+
+
+def build_analysis_command(path: str, beats: bool = False) -> List[str]:
+    """分析音乐的ffmpeg命令：ebur128的汇总写到标准错误，需要节拍时PCM写到标准输出"""
+    audio_filter = "ebur128=peak=true:framelog=verbose"
+    if beats:
+        audio_filter += f",aresample={BEAT_SAMPLE_RATE},aformat=sample_fmts=s16:channel_layouts=mono"
+    return [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", path,
+        "-map", "0:a:0",
+        "-af", audio_filter,
+        "-f", "s16le" if beats else "null",
+        "pipe:1" if beats else "-",
+    ]
+
+
+def onset_envelope(samples: array, hop: int = BEAT_HOP) -> List[float]:
+    """每帧对数能量的上升量，音符和鼓点开始处较大"""
+    energies = []
+    for start in range(0, len(samples) - hop + 1, hop):
+        frame = samples[start:start + hop]
+        energies.append(math.log(sum(x * x for x in frame) / hop + 1.0))
+    return [max(0.0, energies[i] - energies[i - 1]) if i else 0.0 for i in range(len(energies))]
+
+
+def estimate_tempo(envelope: List[float], frame_rate: float) -> Optional[float]:
+    """按能量起伏的自相关估计节拍周期（帧），没有明显节奏时返回None"""
+    n = len(envelope)
+    min_lag = max(1, int(frame_rate * 60 / MAX_BPM))
+    max_lag = int(frame_rate * 60 / MIN_BPM) + 1
+    if n < max_lag * 4:
+        return None
+    mean = sum(envelope) / n
+    centered = [value - mean for value in envelope]
+    scores = {}
+    for lag in range(min_lag - 1, max_lag + 2):
+        correlation = sum(centered[i] * centered[i + lag] for i in range(n - lag)) / (n - lag)
+        bpm = 60 * frame_rate / lag
+        scores[lag] = correlation * math.exp(-0.5 * math.log2(bpm / PRIOR_BPM) ** 2)
+    best = max(range(min_lag, max_lag + 1), key=lambda lag: scores[lag])
+    if scores[best] <= 0:
+        return None
+    # 抛物线插值得到非整数周期
+    left, center, right = scores[best - 1], scores[best], scores[best + 1]
+    denominator = left - 2 * center + right
+    offset = 0.5 * (left - right) / denominator if denominator else 0.0
+    return best + max(-0.5, min(0.5, offset))
+
+
+def track_beats(envelope: List[float], period: float, tightness: float = BEAT_TIGHTNESS) -> List[int]:
+    """动态规划节拍跟踪：节拍尽量落在能量起伏大的帧上，拍间隔接近估计周期
+
+    每帧的得分 = 该帧的起伏 + 前一拍（间隔为周期的0.5~2倍）的最高得分减去间隔偏离周期的惩罚，
+    从最后一个周期内得分最高的帧回溯得到全部节拍。速度估计略有偏差时节拍也不会逐渐错位。
+    开头和结尾起伏很弱的节拍被去掉。
+    """
+    n = len(envelope)
+    mean = sum(envelope) / n
+    std = math.sqrt(sum((value - mean) ** 2 for value in envelope) / n) or 1.0
+    onset = [value / std for value in envelope]
+    min_gap, max_gap = max(1, int(round(period / 2))), int(round(period * 2))
+    penalty = {gap: tightness * math.log(gap / period) ** 2 for gap in range(min_gap, max_gap + 1)}
+    score = list(onset)
+    backlink = [-1] * n
+    for i in range(min_gap, n):
+        best, link = 0.0, -1
+        for prev in range(max(0, i - max_gap), i - min_gap + 1):
+            value = score[prev] - penalty[i - prev]
+            if value > best:
+                best, link = value, prev
+        if link >= 0:
+            score[i] = onset[i] + best
+            backlink[i] = link
+    frame = max(range(max(0, n - int(period)), n), key=lambda i: score[i])
+    beats = []
+    while frame >= 0:
+        beats.append(frame)
+        frame = backlink[frame]
+    beats.reverse()
+    # 去掉开头和结尾起伏很弱的节拍（如前奏前的静音）
+    threshold = 0.5 * math.sqrt(sum(onset[i] ** 2 for i in beats) / len(beats))
+    while beats and onset[beats[0]] < threshold:
+        beats.pop(0)
+    while beats and onset[beats[-1]] < threshold:
+        beats.pop()
+    return beats
+
+
+def detect_beats(pcm: bytes, sample_rate: int = BEAT_SAMPLE_RATE,
+                 hop: int = BEAT_HOP) -> Tuple[Optional[float], List[float]]:
+    """从单声道s16le PCM估计速度（BPM）和节拍时间（秒）"""
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    frame_rate = sample_rate / hop
+    envelope = onset_envelope(samples, hop)
+    period = estimate_tempo(envelope, frame_rate)
+    if period is None:
+        return None, []
+    beats = [round(frame * hop / sample_rate, 3) for frame in track_beats(envelope, period)]
+    return round(60 * frame_rate / period, 2), beats
+
+
+def analyze_audio(path: str, beats: bool = False) -> dict:
+    """测量音乐的综合响度和真峰值，beats为True时同时估计速度和节拍位置
+
+    ffmpeg进程登记到当前线程的任务控制，取消任务时随之结束。
+    """
+    pcm, stderr = capture_output_and_log(build_analysis_command(path, beats))
+    log = stderr.decode("utf-8", "replace")
+    info = {
+        "loudness": _last_value(_LOUDNESS_RE, log),
+        "true_peak": _last_value(_PEAK_RE, log),
+    }
+    if beats:
+        info["tempo"], info["beats"] = detect_beats(pcm)
+    return info
+
+
+def bgm_gain_db(info: Optional[dict]) -> Optional[float]:
+    """把背景音乐调整到目标响度所需的增益（dB），提升幅度受最大提升和真峰值上限限制
+
+    响度未知（未分析或无法测量）时返回None，此时使用固定音量。
+    """
+    loudness = info.get("loudness") if info else None
+    if loudness is None:
+        return None
+    gain = min(BGM_TARGET_LUFS - loudness, BGM_MAX_GAIN_DB)
+    if info.get("true_peak") is not None:
+        gain = min(gain, BGM_PEAK_CEILING - info["true_peak"])
+    return round(gain, 2)
+
+
+class MusicLibrary:
+    """背景音乐库索引，分析结果追加保存在音乐信息索引的条目中，音乐文件变化后自动重新分析"""
+
+    def __init__(self, index: MediaIndex, max_workers: Optional[int] = None):
+        self.index = index
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._running: Dict[str, threading.Event] = {}  # 正在分析的文件，避免并发重复分析
+
+    def _needs_analysis(self, info: Optional[dict], beats: bool) -> bool:
+        return info is not None and ("loudness" not in info or (beats and "beats" not in info))
+
+    def _analyze_one(self, path: str, beats: bool, control: Optional[JobControl] = None):
+        # 同一文件正在由其他线程分析时等它完成，再检查是否还需要分析（例如对方没有分析节拍）
+        while True:
+            with self._lock:
+                running = self._running.get(path)
+                if running is None:
+                    event = self._running[path] = threading.Event()
+                    break
+            running.wait()
+        try:
+            if self._needs_analysis(self.index.get(path), beats):
+                try:
+                    fields = analyze_audio(path, beats)
+                except Exception as e:
+                    if control is not None and control.cancelled:
+                        return  # 进程被结束，不记录为分析失败
+                    print(f"分析音乐失败: {path}: {e}")
+                    fields = {"loudness": None, "true_peak": None}
+                    if beats:
+                        fields.update(tempo=None, beats=[])
+                self.index.update(path, **fields)
+        finally:
+            with self._lock:
+                del self._running[path]
+            event.set()
+
+    def analyze(self, paths: Iterable[str], beats: bool = False,
+                on_progress: Optional[Callable[[int, int, str], None]] = None,
+                control: Optional[JobControl] = None) -> Dict[str, dict]:
+        """确保每首音乐都已分析（只分析新增或变化的文件），返回 路径 -> 音乐信息
+
+        control用于暂停或取消：每首音乐开始前检查，分析中的ffmpeg进程在取消时结束，
+        已完成的结果照常保存，取消时抛出JobCancelled。
+        """
+        paths = list(paths)
+        infos = self.index.refresh(paths, max_workers=self.max_workers)
+        pending = [path for path in paths if self._needs_analysis(infos.get(path), beats)]
+        if pending:
+            done = 0
+            done_lock = threading.Lock()
+
+            def analyze(path: str):
+                nonlocal done
+                if control is None:
+                    self._analyze_one(path, beats)
+                else:
+                    control.checkpoint()
+                    with control.attach():
+                        self._analyze_one(path, beats, control)
+                with done_lock:
+                    done += 1
+                    finished = done
+                if on_progress:
+                    on_progress(finished, len(pending), path)
+
+            # 每个分析进程只解码一个音频流（单线程），并行数按CPU核数计算
+            workers = self.max_workers or min(os.cpu_count() or 1, len(pending))
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(analyze, pending))
+            finally:
+                self.index.save()
+        return {path: info for path in paths if (info := self.index.get(path)) is not None}
@@ -0,0 +1,240 @@
+"""片段规划：按随机种子一次规划整个批次每个输出使用的源视频、起始位置和背景音乐
+
+同一种子、同一组素材得到相同的规划，批次可以复现。源视频和背景音乐按使用次数均衡
+选择（使用最少的优先，次数相同时随机）；同一源视频的多个片段起始位置互不重复，并尽量
+分散在整个视频中。规划中的各片段互不依赖，调度器可以任意调整处理顺序；不同输出中
+参数完全相同的片段只处理一次。
+
+跟随音乐模式下有音乐的节拍位置时，片段的切换点对齐到节拍（见beat_cut_lengths），
+各片段时长不同，总时长仍等于音乐时长，不需要对整个输出变速。
+"""
+import random
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .filters import is_conforming, stream_signature
+from .media_index import OFFSET_STEP, preceding_keyframe
+
+# 节拍对齐时每个片段的最短时长（相对均分时长的比例）
+MIN_BEAT_CLIP_RATIO = 0.5
+
+# 节拍对齐时切换点离均分位置的最大距离（相对均分时长的比例），更远的节拍不使用
+MAX_BEAT_SHIFT_RATIO = 0.5
+
+# 重新编码的片段起始位置离前一个关键帧的最大距离（秒）
+MAX_PREROLL = 1.0
+
+
+@dataclass
+class PlannedClip:
+    """输出中的一个片段"""
+    source: str  # 源视频路径
+    offset: float  # 在源视频中的起始位置（秒）
+    length: float  # 在输出中的时长（秒）
+    speed: float = 1.0  # 视频速度系数（setpts倍数），大于1为放慢
+
+    @property
+    def source_span(self) -> float:
+        """从源视频截取的时长"""
+        return self.length / self.speed
+
+
+@dataclass
+class PlannedOutput:
+    """一个输出视频的规划"""
+    index: int  # 在批次中的序号（从0开始）
+    clips: List[PlannedClip] = field(default_factory=list)
+    music: Optional[str] = None  # 背景音乐路径
+    copy_video: bool = False  # 片段直接复制视频流（起始位置均为关键帧）
+
+    @property
+    def total_duration(self) -> float:
+        return sum(clip.length for clip in self.clips)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlannedOutput":
+        return cls(
+            index=data["index"],
+            clips=[PlannedClip(**clip) for clip in data["clips"]],
+            music=data.get("music"),
+            copy_video=data.get("copy_video", False),
+        )
+
+
+def beat_cut_lengths(total: float, clips: int, beats: Sequence[float],
+                     fps: Optional[float] = None) -> List[float]:
+    """把total秒分成clips段，段与段的切换点落在节拍上，返回每段的时长
+
+    第k个切换点取离均分位置k*total/clips最近的节拍，每段不短于均分时长的一半；
+    均分位置前后半个均分时长内没有合适的节拍时使用均分位置。fps已知时切换点取整到帧，片段时长为整数帧，
+    合并后切换点与节拍的偏差不会累积。
+    """
+    even = total / clips
+    minimum = even * MIN_BEAT_CLIP_RATIO
+    shift = even * MAX_BEAT_SHIFT_RATIO
+    cuts = [0.0]
+    for k in range(1, clips):
+        low, high = cuts[-1] + minimum, total - (clips - k) * minimum
+        target = k * even
+        candidates = [beat for beat in beats if low <= beat <= high and abs(beat - target) <= shift]
+        cut = min(candidates, key=lambda beat: abs(beat - target)) if candidates else max(low, min(target, high))
+        if fps:
+            cut = round(cut * fps) / fps
+        cuts.append(cut)
+    cuts.append(total)
+    return [round(end - start, 6) for start, end in zip(cuts, cuts[1:])]
+
+
+def clip_timing(info: Optional[dict], length: float, retime: bool = True) -> Tuple[float, float]:
+    """片段在输出中占length秒时，返回从源视频截取的时长和视频速度系数（setpts倍数）
+
+    源视频足够长（或时长未知）时截取length秒，速度不变；不够长时截取整个源视频，retime为True时
+    放慢到length秒。变速只调整视频，保留原音频的片段retime应为False，此时片段短于length秒。
+    """
+    available = info.get("duration") if info else None
+    if not available or available >= length:
+        return length, 1.0
+    if not retime:
+        return available, 1.0
+    return available, length / available
+
+
+def offset_candidates(info: Optional[dict], span: float, step: float = OFFSET_STEP,
+                      max_preroll: float = MAX_PREROLL) -> List[float]:
+    """可用的片段起始位置：按step取整，片段不超出源视频；时长未知或不够长时只有0
+
+    有关键帧位置时只保留离前一个关键帧不超过max_preroll秒的位置：ffmpeg从起始位置
+    之前最近的关键帧开始解码，丢弃到起始位置为止的画面，这部分解码量因此不超过max_preroll秒，
+    片段的处理时间只取决于片段时长。关键帧间隔很长的源视频不会因起始位置靠后而变慢。
+    """
+    if not info or not info.get("duration"):
+        return [0.0]
+    slots = int(max(0.0, info["duration"] - span) // step)
+    candidates = [n * step for n in range(slots + 1)]
+    keyframes = info.get("keyframes")
+    if keyframes:
+        near = [
+            offset for offset in candidates
+            if (keyframe := preceding_keyframe(keyframes, offset)) is not None and offset - keyframe <= max_preroll
+        ]
+        candidates = near or candidates
+    return candidates
+
+
+def keyframe_candidates(info: Optional[dict], span: float) -> List[float]:
+    """可用作直接复制起点的关键帧位置"""
+    if not info or not info.get("duration"):
+        return []
+    return [k for k in info.get("keyframes", []) if k + span <= info["duration"]]
+
+
+class ClipPlanner:
+    """按种子规划批次，记录各源视频、起始位置和背景音乐的使用情况
+
+    同一个规划器连续调用plan()时，后一批次会继续避开前一批次已用的起始位置。
+    retime表示源视频不够长时可以放慢视频（片段不保留原音频时），否则优先选择足够长的源视频，
+    仍不够长时截取整个源视频，速度不变。
+    """
+
+    def __init__(self, media_info: Dict[str, dict], seed: Optional[int] = None,
+                 stream_copy: bool = True, step: float = OFFSET_STEP, retime: bool = True):
+        self.media_info = media_info
+        self.seed = seed
+        self.stream_copy = stream_copy
+        self.retime = retime
+        self.step = step
+        self.rng = random.Random(seed)
+        self.source_usage: Counter = Counter()
+        self.music_usage: Counter = Counter()
+        self.used_offsets: Dict[str, Set[float]] = defaultdict(set)
+
+    def _least_used(self, items: Sequence[str], count: int, usage: Counter,
+                    avoid: Set[str] = frozenset()) -> List[str]:
+        """选出使用次数最少的count项（次数相同时随机，avoid中的项排在最后），结果顺序随机"""
+        ranked = sorted(items, key=lambda item: (item in avoid, usage[item], self.rng.random()))
+        chosen = ranked[:count]
+        self.rng.shuffle(chosen)
+        return chosen
+
+    def _pick_offset(self, source: str, candidates: List[float]) -> float:
+        """从候选位置中选择起始位置
+
+        优先选没用过的位置；已有使用过的位置时，在离最近已用位置不少于最大可能距离一半的
+        候选中随机选择，使同一源视频的片段分散在整个视频中。
+        """
+        used = self.used_offsets[source]
+        fresh = [offset for offset in candidates if offset not in used] or candidates
+        if not used:
+            return self.rng.choice(fresh)
+        distance = {offset: min(abs(offset - other) for other in used) for offset in fresh}
+        best = max(distance.values())
+        return self.rng.choice([offset for offset in fresh if distance[offset] >= best / 2])
+
+    def plan_output(self, index: int, sources: Sequence[str], clips: int, duration: float,
+                    music: Sequence[str] = (), music_durations: Optional[Dict[str, float]] = None,
+                    music_beats: Optional[Dict[str, List[float]]] = None) -> PlannedOutput:
+        """规划一个输出
+
+        music_durations不为空时为跟随音乐模式：片段总时长等于音乐时长，music_beats中有该音乐的
+        节拍时切换点对齐到节拍，否则每个片段时长 = 音乐时长 / 片段数。源视频不够长的片段放慢
+        （见clip_timing）。
+        """
+        output = PlannedOutput(index)
+        if music:
+            output.music = self._least_used(music, 1, self.music_usage)[0]
+            self.music_usage[output.music] += 1
+
+        too_short = set()
+        if not self.retime and not music_durations:
+            too_short = {source for source in sources
+                         if clip_timing(self.media_info.get(source), duration, retime=False)[0] < duration}
+        selected = self._least_used(sources, clips, self.source_usage, too_short)
+        infos = [self.media_info.get(source) for source in selected]
+        if music_durations:
+            total = music_durations[output.music]
+            beats = (music_beats or {}).get(output.music)
+            if beats:
+                rates = {round(info.get("fps") or 0, 2) for info in infos if info}
+                fps = rates.pop() if len(rates) == 1 else None
+                lengths = beat_cut_lengths(total, clips, beats, fps)
+            else:
+                lengths = [total / clips] * clips
+        else:
+            lengths = [duration] * clips
+        timings = [clip_timing(info, length, self.retime) for info, length in zip(infos, lengths)]
+
+        # 所有片段的源视频都符合目标格式、编码参数和帧率一致、不需要变速且有可用关键帧时，片段直接复制
+        # 视频流；只要有一个片段需要重新编码，整个输出都重新编码，保证合并时编码参数一致
+        signatures = {stream_signature(info) for info in infos}
+        output.copy_video = (
+            self.stream_copy
+            and all(is_conforming(info) for info in infos)
+            and None not in signatures and len(signatures) == 1
+            and all(speed == 1.0 for _, speed in timings)
+            and all(keyframe_candidates(info, span) for info, (span, _) in zip(infos, timings))
+        )
+
+        for source, info, length, (span, speed) in zip(selected, infos, lengths, timings):
+            if output.copy_video:
+                candidates = keyframe_candidates(info, span)
+            else:
+                candidates = offset_candidates(info, span, self.step)
+            offset = self._pick_offset(source, candidates)
+            self.used_offsets[source].add(offset)
+            self.source_usage[source] += 1
+            # 不变速时片段在输出中的时长等于截取的时长（源视频不够长时短于length）
+            output.clips.append(PlannedClip(source, offset, length if speed != 1.0 else span, speed))
+        return output
+
+    def plan(self, sources: Sequence[str], clips: int, duration: float, count: int,
+             music: Sequence[str] = (), music_durations: Optional[Dict[str, float]] = None,
+             music_beats: Optional[Dict[str, List[float]]] = None) -> List[PlannedOutput]:
+        """规划整个批次的count个输出"""
+        sources = sorted(sources)  # 与文件列出顺序无关
+        music = sorted(music)
+        return [self.plan_output(index, sources, clips, duration, music, music_durations, music_beats)
+                for index in range(count)]
@@ -0,0 +1,96 @@
+"""编码配置：按名称选择的视频编码参数组合"""
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, List, Optional
+
+DEFAULT_PROFILE = "standard"
+
+# 未设置码率上限时估算1080x1920 CRF编码输出大小使用的码率（bit/s）
+ESTIMATED_CRF_BITRATE = 12_000_000
+
+
+@dataclass
+class EncoderProfile:
+    """一组视频编码参数
+
+    crf和maxrate可以同时设置（限制码率上限的CRF编码）；codec可替换为硬件编码器，
+    此时preset/tune需填写该编码器支持的取值。
+    """
+    name: str
+    preset: str = "medium"
+    crf: Optional[int] = 18
+    maxrate: Optional[str] = None  # 码率上限，如"6M"，缓冲区取两倍
+    tune: Optional[str] = None
+    threads: int = 4  # 单个编码进程的线程数，决定并行任务数
+    gop: Optional[int] = None  # 关键帧间隔（帧）
+    codec: str = "libx264"
+
+    def video_args(self) -> List[str]:
+        """生成视频编码参数（从-c:v开始）"""
+        args = ["-c:v", self.codec, "-preset", self.preset]
+        if self.crf is not None:
+            args += ["-crf", str(self.crf)]
+        if self.maxrate:
+            args += ["-maxrate", self.maxrate, "-bufsize", _double_rate(self.maxrate)]
+        if self.tune:
+            args += ["-tune", self.tune]
+        if self.gop:
+            args += ["-g", str(self.gop)]
+        args += ["-threads", str(self.threads)]
+        return args
+
+    def estimated_bitrate(self) -> int:
+        """估算视频码率（bit/s），用于预估中间文件大小"""
+        if self.maxrate:
+            return _parse_rate(self.maxrate)
+        return ESTIMATED_CRF_BITRATE
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict, base: Optional["EncoderProfile"] = None) -> "EncoderProfile":
+        """从配置字典创建编码配置，未填写的字段沿用base"""
+        values = base.to_dict() if base else {}
+        known = {f.name for f in fields(cls)}
+        values.update({key: value for key, value in data.items() if key in known})
+        values["name"] = name
+        return cls(**values)
+
+
+def _parse_rate(rate: str) -> int:
+    """把"6M"、"800k"这类码率转换为bit/s"""
+    number = rate.rstrip("kKmM")
+    scale = {"": 1, "k": 1000, "m": 1000 ** 2}[rate[len(number):].lower()]
+    return int(float(number) * scale)
+
+
+def _double_rate(rate: str) -> str:
+    """把"6M"这类码率翻倍，用作-bufsize"""
+    number = rate.rstrip("kKmM")
+    suffix = rate[len(number):]
+    return f"{float(number) * 2:g}{suffix}"
+
+
+# 内置编码配置
+BUILTIN_PROFILES: Dict[str, EncoderProfile] = {
+    # 批量草稿：速度优先，码率封顶，2线程以提高并行度
+    "draft": EncoderProfile("draft", preset="veryfast", crf=23, maxrate="6M", threads=2, gop=60),
+    # 标准：与原有的medium/CRF 18一致
+    "standard": EncoderProfile("standard", preset="medium", crf=18, threads=4),
+    # 存档：质量优先
+    "archive": EncoderProfile("archive", preset="slow", crf=16, tune="film", threads=4, gop=250),
+}
+
+
+def load_profiles(overrides: Optional[Dict[str, dict]] = None) -> Dict[str, EncoderProfile]:
+    """合并内置配置和config.json中的encoder_profiles"""
+    profiles = dict(BUILTIN_PROFILES)
+    for name, data in (overrides or {}).items():
+        profiles[name] = EncoderProfile.from_dict(name, data, profiles.get(name))
+    return profiles
+
+
+def get_profile(name: Optional[str], overrides: Optional[Dict[str, dict]] = None) -> EncoderProfile:
+    """按名称获取编码配置，名称无效时返回标准配置"""
+    profiles = load_profiles(overrides)
+    return profiles.get(name or DEFAULT_PROFILE, profiles[DEFAULT_PROFILE])
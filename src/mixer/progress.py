@@ -0,0 +1,115 @@
+"""批次进度：汇总各ffmpeg进程的-progress输出，按任务权重计算整体进度、剩余时间和处理速度"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+# 进度消息的最小间隔（秒），任务完成的消息不受限制
+PROGRESS_INTERVAL = 0.5
+
+# 直接复制视频流的步骤（合并、复制片段）相对编码的耗时权重
+COPY_COST = 0.05
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    """把剩余秒数格式化为"1小时2分3秒"的形式"""
+    if seconds is None:
+        return "计算中"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分{seconds}秒"
+    if minutes:
+        return f"{minutes}分{seconds}秒"
+    return f"{seconds}秒"
+
+
+@dataclass
+class ProgressSnapshot:
+    """某一时刻的批次进度"""
+    fraction: float  # 整体进度（0~1，按任务权重）
+    elapsed: float  # 已用时间（秒）
+    eta: Optional[float]  # 预计剩余时间（秒），尚无法估计时为None
+    fps: float  # 正在运行的ffmpeg进程的编码帧率之和
+    speed: float  # 正在运行的ffmpeg进程相对实时的速度之和
+    tasks_done: int
+    tasks_total: int
+
+    def format(self) -> str:
+        text = f"进度: {self.fraction * 100:.1f}% - 剩余 {format_eta(self.eta)}"
+        if self.fps or self.speed:
+            text += f" - {self.fps:.0f} fps / {self.speed:.1f}x"
+        return text
+
+
+class BatchProgress:
+    """批次进度模型
+
+    每个任务登记权重（预计耗时的相对值）和输出的媒体时长，ffmpeg的out_time除以媒体时长
+    即为任务自身进度；整体进度为各任务进度按权重的加权平均。线程安全。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._start = clock()
+        self._last_emit = 0.0
+        self._tasks: Dict[str, dict] = {}
+
+    def add(self, name: str, weight: float, media_seconds: float):
+        with self._lock:
+            self._tasks[name] = {
+                "weight": weight,
+                "media_seconds": media_seconds,
+                "fraction": 0.0,
+                "fps": 0.0,
+                "speed": 0.0,
+                "done": False,
+            }
+
+    def update(self, name: str, info: dict) -> bool:
+        """记录ffmpeg进度信息，距上次返回True超过PROGRESS_INTERVAL时返回True（应发送消息）"""
+        with self._lock:
+            task = self._tasks.get(name)
+            if task is None or task["done"]:
+                return False
+            if task["media_seconds"] > 0:
+                task["fraction"] = min(1.0, info.get("out_time", 0.0) / task["media_seconds"])
+            task["fps"] = info.get("fps", 0.0)
+            task["speed"] = info.get("speed", 0.0)
+            if info.get("end"):
+                task["fps"] = task["speed"] = 0.0
+            now = self._clock()
+            if now - self._last_emit < PROGRESS_INTERVAL:
+                return False
+            self._last_emit = now
+            return True
+
+    def finish(self, name: str):
+        with self._lock:
+            task = self._tasks.get(name)
+            if task is not None:
+                task.update(fraction=1.0, fps=0.0, speed=0.0, done=True)
+            self._last_emit = self._clock()
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            tasks = list(self._tasks.values())
+            elapsed = self._clock() - self._start
+        total = sum(task["weight"] for task in tasks)
+        if total > 0:
+            fraction = sum(task["weight"] * task["fraction"] for task in tasks) / total
+        else:
+            fraction = sum(task["done"] for task in tasks) / len(tasks) if tasks else 1.0
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        running = [task for task in tasks if not task["done"]]
+        return ProgressSnapshot(
+            fraction=fraction,
+            elapsed=elapsed,
+            eta=eta,
+            fps=sum(task["fps"] for task in running),
+            speed=sum(task["speed"] for task in running),
+            tasks_done=sum(task["done"] for task in tasks),
+            tasks_total=len(tasks),
+        )
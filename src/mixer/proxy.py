@@ -0,0 +1,161 @@
+"""代理素材库：把经常使用的输入文件夹一次性转换为统一格式的中间文件
+
+代理文件为1080x1920、固定帧率、H.264 High/yuv420p，每秒一个关键帧，已按填充方式
+缩放填充。混剪时用代理文件代替源视频：片段可以从关键帧直接复制视频流，需要重新编码时
+也不再需要缩放大尺寸的原始素材。
+
+代理文件的位置记录在媒体信息索引中对应源视频的条目里（info["proxies"]），源视频变化后
+索引条目失效，代理随之失效，下次生成时重新转换。生成过程可以随时停止：每个代理先写入
+临时文件，完成后改名并记入索引，再次运行时跳过已完成的文件。
+"""
+import hashlib
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .control import JobControl
+from .ffmpeg import run_ffmpeg
+from .filters import DEFAULT_BLUR_QUALITY, FILL_BLUR, FilterGraph, add_blur_fill, scale_pad_filter
+from .media_index import MediaIndex
+from .profiles import EncoderProfile
+from .scheduler import default_worker_count
+
+# 代理文件的帧率和关键帧间隔（帧），与片段起始位置的取值粒度（OFFSET_STEP，1秒）一致
+PROXY_FPS = 30
+PROXY_GOP = PROXY_FPS
+
+# 代理文件的编码参数：画质接近无损，速度优先
+PROXY_PROFILE = EncoderProfile("proxy", preset="veryfast", crf=16, threads=2, gop=PROXY_GOP)
+
+
+def proxy_variant(fill: str, blur_quality: str = DEFAULT_BLUR_QUALITY) -> str:
+    """代理的种类名称：填充方式不同的代理分别保存"""
+    return f"{fill}-{blur_quality}" if fill == FILL_BLUR else fill
+
+
+def build_proxy_command(source: str, output_path: str, fill: str,
+                        blur_quality: str = DEFAULT_BLUR_QUALITY) -> List[str]:
+    """生成把源视频转换为代理文件的ffmpeg命令"""
+    graph = FilterGraph()
+    video = graph.add(["0:v"], f"fps={PROXY_FPS}", "cfr")
+    if fill == FILL_BLUR:
+        video = add_blur_fill(graph, video, blur_quality)
+    else:
+        video = graph.add([video], scale_pad_filter(), "v")
+    return [
+        "ffmpeg", "-y",
+        "-i", source,
+        "-filter_complex", str(graph),
+        "-map", f"[{video}]",
+        "-map", "0:a?",
+    ] + PROXY_PROFILE.video_args() + [
+        "-profile:v", "high",
+        "-pix_fmt", "yuv420p",
+        "-keyint_min", str(PROXY_GOP),
+        "-sc_threshold", "0",
+        "-c:a", "aac",
+        "-b:a", "192k",
+        "-ar", "44100",
+        "-movflags", "+faststart",
+        output_path
+    ]
+
+
+class ProxyLibrary:
+    """代理素材库，代理文件按 种类/源文件路径哈希.mp4 保存在root下"""
+
+    def __init__(self, root: str, media_index: MediaIndex, max_workers: Optional[int] = None):
+        self.root = root
+        self.media_index = media_index
+        self.max_workers = max_workers
+
+    def proxy_path(self, source: str, variant: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, variant, f"{digest}.mp4")
+
+    def lookup(self, sources: Iterable[str], fill: str,
+               blur_quality: str = DEFAULT_BLUR_QUALITY) -> Dict[str, str]:
+        """返回 源视频路径 -> 代理文件路径，只包含代理仍然有效的源视频"""
+        variant = proxy_variant(fill, blur_quality)
+        found = {}
+        for source in sources:
+            info = self.media_index.get(source)
+            path = (info or {}).get("proxies", {}).get(variant)
+            if path and os.path.isfile(path):
+                found[source] = path
+        return found
+
+    def _build_one(self, source: str, fill: str, blur_quality: str) -> str:
+        """生成一个代理文件并记入源视频的索引条目，源视频无法分析或在生成期间变化时抛出OSError"""
+        if self.media_index.get(source) is None:
+            self.media_index.refresh([source])  # 源视频在build()分析之后发生了变化
+            if self.media_index.get(source) is None:
+                raise OSError(f"无法分析源视频: {source}")
+        variant = proxy_variant(fill, blur_quality)
+        output_path = self.proxy_path(source, variant)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tmp_path = output_path[:-len(".mp4")] + f".{threading.get_ident()}.tmp.mp4"
+        try:
+            run_ffmpeg(build_proxy_command(source, tmp_path, fill, blur_quality))
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        info = self.media_index.get(source)
+        if info is None:
+            os.remove(output_path)
+            raise OSError(f"源视频在生成代理期间发生了变化: {source}")
+        self.media_index.update(source, proxies={**info.get("proxies", {}), variant: output_path})
+        self.media_index.save()
+        return output_path
+
+    def build(self, sources: Iterable[str], fill: str, blur_quality: str = DEFAULT_BLUR_QUALITY,
+              on_progress: Optional[Callable[[int, int, str], None]] = None,
+              stop: Optional[threading.Event] = None,
+              control: Optional[JobControl] = None) -> Dict[str, int]:
+        """为尚无有效代理的源视频并行生成代理
+
+        on_progress(完成数, 总数, 源视频路径)在每个文件处理后调用；stop被设置后不再开始新的文件，
+        已开始的文件处理完毕后返回。control被取消时同样不再开始新的文件，正在运行的ffmpeg进程
+        也随之结束（未完成的文件计为skipped）。返回各结果的文件数：built/existing/failed/skipped。
+        """
+        sources = list(sources)
+        self.media_index.refresh(sources)
+        existing = self.lookup(sources, fill, blur_quality)
+        pending = [source for source in sources if source not in existing]
+        counts = {"built": 0, "existing": len(existing), "failed": 0, "skipped": 0}
+        lock = threading.Lock()
+        done = 0
+
+        def convert(source: str):
+            nonlocal done
+            if (stop is not None and stop.is_set()) or (control is not None and control.cancelled):
+                result = "skipped"
+            else:
+                try:
+                    if control is None:
+                        self._build_one(source, fill, blur_quality)
+                    else:
+                        with control.attach():
+                            self._build_one(source, fill, blur_quality)
+                    result = "built"
+                except (subprocess.CalledProcessError, OSError) as e:
+                    if control is not None and control.cancelled:
+                        result = "skipped"
+                    else:
+                        print(f"生成代理失败: {source}: {e}")
+                        result = "failed"
+            with lock:
+                counts[result] += 1
+                done += 1
+                finished = done
+            if on_progress:
+                on_progress(finished, len(pending), source)
+
+        if pending:
+            workers = self.max_workers or default_worker_count(PROXY_PROFILE.threads)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(convert, pending))
+        return counts
@@ -0,0 +1,148 @@
+"""任务调度器：把一批混剪任务拆成依赖图，在有限大小的线程池中并行执行"""
+import heapq
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .control import JobCancelled, JobControl
+
+# 每个libx264编码进程使用的线程数，线程池大小据此从CPU核数换算
+ENCODER_THREADS = 4
+
+
+def default_worker_count(encoder_threads: int = ENCODER_THREADS) -> int:
+    """根据CPU核数和单个编码器线程数计算并行任务数"""
+    cores = os.cpu_count() or 1
+    return max(1, cores // max(1, encoder_threads))
+
+
+class TaskCancelled(Exception):
+    """任务因其他任务失败而被取消"""
+
+
+class Task:
+    """依赖图中的一个节点（一次ffmpeg调用或一次文件操作）"""
+
+    def __init__(self, name: str, func: Callable[[], None], deps: Iterable["Task"] = (),
+                 weight: float = 1.0, label: str = ""):
+        self.name = name
+        self.func = func
+        self.deps: List[Task] = list(deps)
+        self.weight = weight
+        self.label = label or name
+        self.order = 0  # 加入依赖图的顺序，用作调度优先级
+
+
+class JobGraph:
+    """任务依赖图，按加入顺序记录节点"""
+
+    def __init__(self):
+        self.tasks: List[Task] = []
+
+    def add(self, name: str, func: Callable[[], None], deps: Iterable[Task] = (),
+            weight: float = 1.0, label: str = "") -> Task:
+        task = Task(name, func, deps, weight, label)
+        for dep in task.deps:
+            if dep not in self.tasks:
+                raise ValueError(f"依赖任务未加入依赖图: {dep.name}")
+        task.order = len(self.tasks)
+        self.tasks.append(task)
+        return task
+
+    @property
+    def total_weight(self) -> float:
+        return sum(task.weight for task in self.tasks)
+
+
+class Scheduler:
+    """在线程池中执行依赖图
+
+    - 依赖全部完成的节点才会被提交
+    - 就绪节点按加入顺序优先执行，保证先加入的输出先完成
+    - 任一节点失败后不再提交新节点，等待已运行节点结束后抛出第一个异常
+    - 传入limiter（信号量）时，节点执行期间占用一个名额，多个调度器可共享同一个全局并发上限
+    - 传入control时，暂停期间不开始新节点；取消后不再提交新节点，等待已运行节点结束后抛出JobCancelled
+    """
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 on_progress: Optional[Callable[[float, float, Task], None]] = None,
+                 limiter: Optional[threading.Semaphore] = None,
+                 control: Optional[JobControl] = None):
+        self.max_workers = max_workers or default_worker_count()
+        self.on_progress = on_progress
+        self.limiter = limiter
+        self.control = control
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """取消尚未开始的节点"""
+        self.cancel_event.set()
+
+    def _stopped(self) -> bool:
+        return self.cancel_event.is_set() or (self.control is not None and self.control.cancelled)
+
+    def _execute(self, task: Task):
+        if self.control is None:
+            return self._execute_limited(task)
+        self.control.checkpoint()
+        with self.control.attach():
+            return self._execute_limited(task)
+
+    def _execute_limited(self, task: Task):
+        if self.limiter is None:
+            return task.func()
+        with self.limiter:
+            if self.cancel_event.is_set():
+                raise TaskCancelled("任务已取消")
+            if self.control is not None:
+                self.control.checkpoint()
+            return task.func()
+
+    def run(self, graph: JobGraph):
+        total = graph.total_weight
+        done_weight = 0.0
+        waiting: Dict[Task, int] = {task: len(task.deps) for task in graph.tasks}
+        dependents: Dict[Task, List[Task]] = {task: [] for task in graph.tasks}
+        for task in graph.tasks:
+            for dep in task.deps:
+                dependents[dep].append(task)
+
+        ready = [(task.order, task) for task in graph.tasks if not task.deps]
+        heapq.heapify(ready)
+        running = {}
+        error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while ready or running:
+                # 提交就绪节点，直到线程池占满
+                while ready and len(running) < self.max_workers and not self._stopped():
+                    _, task = heapq.heappop(ready)
+                    running[pool.submit(self._execute, task)] = task
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    exc = future.exception()
+                    if exc is not None:
+                        if error is None:
+                            error = exc
+                        self.cancel_event.set()
+                        continue
+                    done_weight += task.weight
+                    if self.on_progress:
+                        self.on_progress(done_weight, total, task)
+                    for child in dependents[task]:
+                        waiting[child] -= 1
+                        if waiting[child] == 0:
+                            heapq.heappush(ready, (child.order, child))
+
+        # 取消后正在运行的ffmpeg被结束，此时各节点的失败都是取消造成的
+        if self.control is not None and self.control.cancelled:
+            raise JobCancelled("任务已取消")
+        if error is not None:
+            raise error
+        if self.cancel_event.is_set():
+            raise TaskCancelled("任务已取消")
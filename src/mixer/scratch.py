@@ -0,0 +1,174 @@
+"""临时文件空间：选择临时目录、检查剩余空间、限制同时存在的中间文件大小
+
+未指定临时目录时，剩余空间足够的情况下优先使用内存盘（/dev/shm），否则使用系统临时
+目录，避免中间文件在（可能是网络盘的）输出文件夹中反复写入读出。最终视频在临时目录
+中生成，完成后移动到输出文件夹。
+"""
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# 优先使用的内存盘
+SHM_DIR = "/dev/shm"
+
+# 默认的中间文件同时占用上限（字节）
+DEFAULT_SCRATCH_BUDGET = 4 * 1024 ** 3
+
+# 每个目录至少保留的剩余空间（字节），避免把磁盘或内存写满
+RESERVED_FREE_BYTES = 512 * 1024 ** 2
+
+# 音频轨估算码率（bit/s），与片段处理的-b:a一致
+AUDIO_BITRATE = 192_000
+
+# 所有临时目录空间都不足时，等待其他任务释放中间文件后重新检查的间隔（秒）
+SPACE_RETRY_INTERVAL = 1.0
+
+
+class ScratchSpaceError(OSError):
+    """目录剩余空间不足"""
+
+    def __init__(self, path: str, needed: int, free: int):
+        super().__init__(
+            errno.ENOSPC,
+            f"剩余空间不足: {path} 需要 {needed / 1024 ** 2:.0f}MB，剩余 {free / 1024 ** 2:.0f}MB"
+        )
+        self.path = path
+        self.needed = needed
+        self.free = free
+
+
+def free_bytes(path: str) -> int:
+    """返回path所在文件系统的剩余空间，path不存在时检查最近的上级目录"""
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def estimate_bytes(duration: float, video_bitrate: int, with_audio: bool = True) -> int:
+    """按码率估算一段视频的文件大小"""
+    bitrate = video_bitrate + (AUDIO_BITRATE if with_audio else 0)
+    return int(duration * bitrate / 8)
+
+
+def candidate_roots() -> List[str]:
+    """未指定临时目录时依次尝试的目录"""
+    roots = []
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        roots.append(SHM_DIR)
+    roots.append(tempfile.gettempdir())
+    return roots
+
+
+def move_into_place(src: str, dest: str):
+    """把完成的文件移动到目标位置，目标路径上不会出现写了一半的文件
+
+    同一文件系统内直接改名；跨文件系统时先复制为目标目录中的隐藏.part文件，
+    再在目标目录内改名。
+    """
+    try:
+        os.replace(src, dest)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    size = os.path.getsize(src)
+    free = free_bytes(dest_dir)
+    if free < size:
+        raise ScratchSpaceError(dest_dir, size, free)
+    part_file = os.path.join(dest_dir, f".{os.path.basename(dest)}.part")
+    try:
+        shutil.copyfile(src, part_file)
+        os.replace(part_file, dest)
+    finally:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+    os.remove(src)
+
+
+class ScratchSpace:
+    """临时目录和中间文件占用预算
+
+    budget()在写入中间文件前登记预计大小，已登记的总量超过上限时等待其他任务释放；
+    单个文件超过上限时在没有其他占用的情况下放行，避免死锁。
+    """
+
+    def __init__(self, root: Optional[str] = None, budget_bytes: int = DEFAULT_SCRATCH_BUDGET,
+                 reserved_bytes: int = RESERVED_FREE_BYTES):
+        self.root = root or None
+        self.budget_bytes = budget_bytes
+        self.reserved_bytes = reserved_bytes
+        self._cond = threading.Condition()
+        self._in_flight = 0
+
+    def select_root(self, needed: int) -> str:
+        """选择临时目录：指定了目录时直接使用，否则选第一个剩余空间足够的候选目录"""
+        if self.root:
+            return self.root
+        needed = min(needed, self.budget_bytes)
+        roots = candidate_roots()
+        for root in roots:
+            if free_bytes(root) >= needed + self.reserved_bytes:
+                return root
+        return roots[-1]
+
+    def make_job_dir(self, needed: int = 0) -> str:
+        """为一个任务创建单独的临时目录"""
+        root = self.select_root(needed)
+        os.makedirs(root, exist_ok=True)
+        return tempfile.mkdtemp(prefix="mixer-", dir=root)
+
+    def check_free(self, path: str, needed: int):
+        """检查目录剩余空间是否足够写入needed字节（另加保留空间）"""
+        free = free_bytes(path)
+        if free < needed + self.reserved_bytes:
+            raise ScratchSpaceError(path, needed + self.reserved_bytes, free)
+
+    def reserve_path(self, path: str, needed: int) -> str:
+        """返回写入needed字节的中间文件实际使用的路径
+
+        path所在目录剩余空间足够时直接返回path。未指定临时目录时改用其他剩余空间足够的候选目录
+        （例如批次中途内存盘写满后改用系统临时目录），返回该目录中的新文件路径；都不够时等待其他
+        任务释放中间文件后重新检查，没有其他任务占用时抛出ScratchSpaceError。
+        """
+        directory = os.path.dirname(path)
+        while True:
+            free = free_bytes(directory)
+            if free >= needed + self.reserved_bytes:
+                return path
+            if not self.root:
+                for root in candidate_roots():
+                    if free_bytes(root) >= needed + self.reserved_bytes:
+                        fd, fallback = tempfile.mkstemp(prefix="mixer-", suffix=f"-{os.path.basename(path)}", dir=root)
+                        os.close(fd)
+                        return fallback
+            with self._cond:
+                if not self._in_flight:
+                    raise ScratchSpaceError(directory, needed + self.reserved_bytes, free)
+                self._cond.wait(SPACE_RETRY_INTERVAL)
+
+    @property
+    def in_flight(self) -> int:
+        with self._cond:
+            return self._in_flight
+
+    @contextmanager
+    def budget(self, nbytes: int) -> Iterator[None]:
+        """在预算内登记nbytes，离开时释放"""
+        with self._cond:
+            while self._in_flight and self._in_flight + nbytes > self.budget_bytes:
+                self._cond.wait()
+            self._in_flight += nbytes
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= nbytes
+                self._cond.notify_all()
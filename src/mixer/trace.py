@@ -0,0 +1,214 @@
+"""运行记录：记录每个处理步骤（ffmpeg调用）的耗时和资源占用，导出为JSON lines或Chrome trace
+
+每个步骤记录：实际耗时、子进程CPU时间（用户/系统）、峰值内存、块设备读写字节数、
+输入文件大小和输出文件大小。子进程资源取自os.wait4返回的该进程的rusage（相当于
+resource.getrusage(RUSAGE_CHILDREN)按进程拆分），Windows等不支持的系统上只记录耗时和文件大小。
+
+汇总（在src目录下执行）：
+    python -m mixer --trace-summary 运行记录.jsonl --top 10
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# 导出格式
+FORMAT_JSONL = "jsonl"
+FORMAT_CHROME = "chrome"
+
+# rusage中的块读写计数单位（字节）
+BLOCK_SIZE = 512
+
+_current_span: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("mixer_trace_span", default=None)
+
+
+def _max_rss_bytes(usage) -> int:
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def note_process(cmd: List[str], usage=None):
+    """记录一个已结束的子进程，累加到当前线程正在记录的步骤中（没有则忽略）"""
+    span = _current_span.get()
+    if span is None:
+        return
+    span["processes"] += 1
+    inputs = [cmd[i + 1] for i, arg in enumerate(cmd[:-1]) if arg == "-i"]
+    span["input_bytes"] += sum(os.path.getsize(path) for path in inputs if os.path.isfile(path))
+    if usage is None:
+        return
+    span["cpu_user"] += usage.ru_utime
+    span["cpu_system"] += usage.ru_stime
+    span["max_rss"] = max(span["max_rss"], _max_rss_bytes(usage))
+    span["read_bytes"] += usage.ru_inblock * BLOCK_SIZE
+    span["write_bytes"] += usage.ru_oublock * BLOCK_SIZE
+
+
+class Tracer:
+    """一次运行的步骤记录"""
+
+    def __init__(self, run_name: str = ""):
+        self.run_name = run_name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._threads: Dict[int, int] = {}
+        self.spans: List[dict] = []
+
+    def _thread_id(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            return self._threads.setdefault(ident, len(self._threads) + 1)
+
+    @contextmanager
+    def span(self, stage: str, name: str = "", output_path: Optional[str] = None, **attrs) -> Iterator[dict]:
+        """记录一个步骤；步骤内启动的ffmpeg进程的资源占用会累加到该步骤
+
+        output_path为步骤的输出文件，结束时记录其大小。
+        """
+        record = {
+            "stage": stage,
+            "name": name or stage,
+            "thread": self._thread_id(),
+            "start": time.perf_counter() - self._start,
+            "wall": 0.0,
+            "cpu_user": 0.0,
+            "cpu_system": 0.0,
+            "max_rss": 0,
+            "read_bytes": 0,
+            "write_bytes": 0,
+            "input_bytes": 0,
+            "output_bytes": 0,
+            "processes": 0,
+            "status": "ok",
+            "attrs": attrs,
+        }
+        token = _current_span.set(record)
+        try:
+            yield record
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            record["wall"] = time.perf_counter() - self._start - record["start"]
+            if output_path and os.path.isfile(output_path):
+                record["output_bytes"] = os.path.getsize(output_path)
+            with self._lock:
+                self.spans.append(record)
+
+    def wrap(self, func: Callable[[], None], stage: str, name: str = "",
+             output_path: Optional[str] = None, **attrs) -> Callable[[], None]:
+        """返回在步骤记录中执行func的函数，用于依赖图中的任务"""
+        def traced():
+            with self.span(stage, name, output_path, **attrs):
+                return func()
+        return traced
+
+    def records(self) -> List[dict]:
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span["start"])
+
+    def write(self, path: str, fmt: str = FORMAT_JSONL):
+        """把记录写入文件：jsonl每行一个步骤，chrome为chrome://tracing可打开的格式"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        records = self.records()
+        with open(path, 'w', encoding='utf-8') as f:
+            if fmt == FORMAT_CHROME:
+                events = [{
+                    "name": span["name"],
+                    "cat": span["stage"],
+                    "ph": "X",
+                    "ts": round(span["start"] * 1_000_000),
+                    "dur": round(span["wall"] * 1_000_000),
+                    "pid": 1,
+                    "tid": span["thread"],
+                    "args": {key: value for key, value in span.items()
+                             if key not in ("name", "start", "thread")},
+                } for span in records]
+                json.dump({
+                    "traceEvents": events,
+                    "otherData": {"run": self.run_name, "started_at": self.started_at},
+                }, f, ensure_ascii=False)
+            else:
+                f.write(json.dumps({"type": "run", "run": self.run_name, "started_at": self.started_at},
+                                   ensure_ascii=False) + "\n")
+                for span in records:
+                    f.write(json.dumps({"type": "span", **span}, ensure_ascii=False) + "\n")
+
+    def write_to_dir(self, trace_dir: str, fmt: str = FORMAT_JSONL) -> str:
+        """在trace_dir中按运行开始时间命名写入记录，返回文件路径"""
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        suffix = ".trace.json" if fmt == FORMAT_CHROME else ".jsonl"
+        name = f"run-{stamp}-{self.run_name}" if self.run_name else f"run-{stamp}"
+        path = os.path.join(trace_dir, name + suffix)
+        self.write(path, fmt)
+        return path
+
+
+def load_records(path: str) -> List[dict]:
+    """读取jsonl或chrome格式的运行记录，返回步骤列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith("{\"traceEvents\""):
+        return [{"name": event["name"], "start": event["ts"] / 1_000_000, **event["args"]}
+                for event in json.loads(text)["traceEvents"]]
+    records = []
+    for line in text.splitlines():
+        if line.strip():
+            record = json.loads(line)
+            if record.get("type") == "span":
+                records.append(record)
+    return records
+
+
+def summarize(records: List[dict], top: int = 10) -> str:
+    """汇总运行记录：各类步骤的总耗时、最慢的步骤、最慢的源视频和输出"""
+    lines = []
+    total_wall = sum(record["wall"] for record in records)
+
+    by_stage: Dict[str, List[dict]] = defaultdict(list)
+    for record in records:
+        by_stage[record["stage"]].append(record)
+    lines.append(f"{'步骤':<14}{'次数':>6}{'总耗时(秒)':>12}{'平均(秒)':>10}{'CPU(秒)':>10}"
+                 f"{'峰值内存(MB)':>14}{'占比':>8}")
+    for stage, items in sorted(by_stage.items(), key=lambda item: -sum(r["wall"] for r in item[1])):
+        wall = sum(r["wall"] for r in items)
+        cpu = sum(r["cpu_user"] + r["cpu_system"] for r in items)
+        rss = max(r["max_rss"] for r in items)
+        share = wall / total_wall * 100 if total_wall else 0.0
+        lines.append(f"{stage:<14}{len(items):>6}{wall:>12.2f}{wall / len(items):>10.2f}{cpu:>10.2f}"
+                     f"{rss / 1024 / 1024:>14.1f}{share:>7.1f}%")
+
+    lines.append("")
+    lines.append(f"最慢的 {top} 个步骤:")
+    for record in sorted(records, key=lambda r: -r["wall"])[:top]:
+        source = record["attrs"].get("source", "")
+        lines.append(f"  {record['wall']:>8.2f}秒  {record['name']:<24}{os.path.basename(source)}")
+
+    by_source: Dict[str, float] = defaultdict(float)
+    for record in records:
+        if record["attrs"].get("source"):
+            by_source[record["attrs"]["source"]] += record["wall"]
+    if by_source:
+        lines.append("")
+        lines.append(f"耗时最多的 {top} 个源视频:")
+        for source, wall in sorted(by_source.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {wall:>8.2f}秒  {source}")
+
+    by_output: Dict[str, float] = defaultdict(float)
+    for record in records:
+        if record["attrs"].get("output"):
+            by_output[record["attrs"]["output"]] += record["wall"]
+    if by_output:
+        lines.append("")
+        lines.append(f"耗时最多的 {top} 个输出（含其片段处理）:")
+        for output, wall in sorted(by_output.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {wall:>8.2f}秒  {output}")
+    return "\n".join(lines)
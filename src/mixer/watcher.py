@@ -0,0 +1,217 @@
+"""文件夹监视：检测输入文件夹和音乐池中文件的增删
+
+Linux下使用inotify接收内核通知；其他系统回退为比较文件夹修改时间的轮询方式，
+只有修改时间变化时才重新列出目录。两种方式都通过poll()以非阻塞方式取出事件。
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+ADDED = "added"
+REMOVED = "removed"
+RESCAN = "rescan"  # 事件丢失或文件夹本身变化，需要重新读取整个文件夹
+
+
+class FolderEvent(NamedTuple):
+    kind: str
+    folder: str
+    name: str = ""
+
+
+def list_folder(folder: str, extensions: Iterable[str]) -> Set[str]:
+    """列出文件夹中指定扩展名的文件"""
+    extensions = tuple(extensions)
+    try:
+        return {f for f in os.listdir(folder) if f.lower().endswith(extensions)}
+    except OSError:
+        return set()
+
+
+class PollingWatcher:
+    """通过比较文件夹修改时间检测变化的监视器"""
+
+    def __init__(self):
+        self._folders: Dict[str, dict] = {}
+
+    def watch(self, folder: str, extensions: Iterable[str]):
+        self._folders[folder] = {
+            "extensions": tuple(extensions),
+            "mtime": self._mtime(folder),
+            "files": list_folder(folder, extensions),
+        }
+
+    def unwatch(self, folder: str):
+        self._folders.pop(folder, None)
+
+    @staticmethod
+    def _mtime(folder: str) -> Optional[int]:
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self) -> List[FolderEvent]:
+        events = []
+        for folder, state in self._folders.items():
+            mtime = self._mtime(folder)
+            if mtime == state["mtime"]:
+                continue
+            state["mtime"] = mtime
+            files = list_folder(folder, state["extensions"])
+            events += [FolderEvent(ADDED, folder, name) for name in sorted(files - state["files"])]
+            events += [FolderEvent(REMOVED, folder, name) for name in sorted(state["files"] - files)]
+            state["files"] = files
+        return events
+
+    def close(self):
+        self._folders.clear()
+
+
+class InotifyWatcher:
+    """基于Linux inotify的监视器"""
+
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        self._watches: Dict[int, str] = {}
+        self._extensions: Dict[str, tuple] = {}
+
+    def watch(self, folder: str, extensions: Iterable[str]):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视文件夹: {folder}")
+        self._watches[wd] = folder
+        self._extensions[folder] = tuple(extensions)
+
+    def unwatch(self, folder: str):
+        for wd, watched in list(self._watches.items()):
+            if watched == folder:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+        self._extensions.pop(folder, None)
+
+    def poll(self) -> List[FolderEvent]:
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+            if not data:
+                break
+            events += self._parse(data)
+        return events
+
+    def _parse(self, data: bytes) -> List[FolderEvent]:
+        events = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                events += [FolderEvent(RESCAN, folder) for folder in self._extensions]
+                continue
+            folder = self._watches.get(wd)
+            if folder is None or mask & self.IN_IGNORED:
+                continue
+            if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                events.append(FolderEvent(RESCAN, folder))
+                continue
+            if mask & self.IN_ISDIR or not name.lower().endswith(self._extensions[folder]):
+                continue
+            if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                events.append(FolderEvent(ADDED, folder, name))
+            elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                events.append(FolderEvent(REMOVED, folder, name))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._watches.clear()
+        self._extensions.clear()
+
+
+class FolderWatcher:
+    """文件夹监视器：优先使用inotify，不可用时回退为轮询"""
+
+    def __init__(self, use_inotify: Optional[bool] = None):
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        self._backend = None
+        if use_inotify:
+            try:
+                self._backend = InotifyWatcher()
+            except (OSError, AttributeError, TypeError) as e:
+                print(f"inotify不可用，改用轮询方式: {e}")
+        if self._backend is None:
+            self._backend = PollingWatcher()
+        self.folders: Dict[str, tuple] = {}
+
+    @property
+    def backend_name(self) -> str:
+        return "inotify" if isinstance(self._backend, InotifyWatcher) else "polling"
+
+    def watch(self, folder: str, extensions: Iterable[str]):
+        """开始监视文件夹，重复调用时更新扩展名"""
+        extensions = tuple(extensions)
+        if self.folders.get(folder) == extensions:
+            return
+        self.unwatch(folder)
+        try:
+            self._backend.watch(folder, extensions)
+        except OSError as e:
+            print(f"监视文件夹失败: {e}")
+            return
+        self.folders[folder] = extensions
+
+    def unwatch(self, folder: str):
+        if folder in self.folders:
+            self._backend.unwatch(folder)
+            del self.folders[folder]
+
+    def set_folders(self, folders: Dict[str, Iterable[str]]):
+        """只监视给定的文件夹（文件夹 -> 扩展名）"""
+        for folder in list(self.folders):
+            if folder not in folders:
+                self.unwatch(folder)
+        for folder, extensions in folders.items():
+            if folder and os.path.isdir(folder):
+                self.watch(folder, extensions)
+
+    def poll(self) -> List[FolderEvent]:
+        """取出自上次调用以来的事件（不阻塞）"""
+        return self._backend.poll()
+
+    def close(self):
+        self._backend.close()
+        self.folders.clear()
@@ -0,0 +1,5 @@
+"""测试从仓库根目录运行（python -m pytest），mixer包位于src目录下"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
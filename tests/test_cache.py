@@ -0,0 +1,82 @@
+"""片段缓存：按最近使用时间淘汰，正在使用的片段不淘汰"""
+import os
+import time
+
+from mixer.cache import ClipCache
+
+
+def add_clip(cache, key, size, last_used):
+    def producer(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+    path = cache.produce(key, producer)
+    cache.entries[key]["last_used"] = last_used
+    return path
+
+
+def test_produce_once_per_key(tmp_path):
+    cache = ClipCache(str(tmp_path))
+    calls = []
+
+    def producer(path):
+        calls.append(path)
+        with open(path, "wb") as f:
+            f.write(b"clip")
+    first = cache.produce("ab12", producer)
+    second = cache.produce("ab12", producer)
+    assert first == second and len(calls) == 1
+    assert cache.has("ab12")
+
+
+def test_prune_removes_least_recently_used(tmp_path):
+    cache = ClipCache(str(tmp_path), max_bytes=250)
+    now = time.time()
+    old = add_clip(cache, "aa01", 100, now - 30)
+    add_clip(cache, "bb02", 100, now - 20)
+    add_clip(cache, "cc03", 100, now - 10)
+    cache.prune()
+    assert set(cache.entries) == {"bb02", "cc03"}
+    assert not os.path.exists(old)
+    assert cache.total_bytes() == 200
+
+
+def test_pinned_clips_kept(tmp_path):
+    cache = ClipCache(str(tmp_path), max_bytes=150)
+    now = time.time()
+    add_clip(cache, "aa01", 100, now - 30)
+    add_clip(cache, "bb02", 100, now - 20)
+    cache.pin("aa01")
+    cache.pin("aa01")  # 两个批次同时使用
+    cache.prune()
+    assert set(cache.entries) == {"aa01"}
+
+    add_clip(cache, "cc03", 100, now - 10)
+    cache.unpin(["aa01"])
+    cache.prune()
+    assert set(cache.entries) == {"aa01"}  # 另一个批次仍在使用
+
+    add_clip(cache, "dd04", 100, now)
+    cache.unpin(["aa01"])
+    cache.prune()
+    assert set(cache.entries) == {"dd04"}
+
+
+def test_index_reloaded(tmp_path):
+    cache = ClipCache(str(tmp_path))
+    add_clip(cache, "aa01", 10, time.time())
+    add_clip(cache, "bb02", 10, time.time())
+    cache.save_index()
+    os.remove(cache.path_for("bb02"))
+    assert set(ClipCache(str(tmp_path)).entries) == {"aa01"}
+
+
+def test_adopt_checks_size(tmp_path):
+    cache = ClipCache(str(tmp_path))
+    path = cache.path_for("aa01")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(b"x" * 10)
+    assert not cache.adopt("aa01", 11)
+    assert not cache.adopt("bb02", 10)
+    assert cache.adopt("aa01", 10)
+    assert cache.has("aa01")
@@ -0,0 +1,108 @@
+"""批次日志：中断后按日志继续"""
+import json
+
+from mixer.journal import BatchJournal, journal_path
+from mixer.planner import PlannedClip, PlannedOutput
+
+FINGERPRINT = {"sources": ["a.mp4", "b.mp4"], "count": 2, "clips": 2}
+
+
+def sample_plans():
+    return [
+        PlannedOutput(0, [PlannedClip("a.mp4", 3.0, 2.0), PlannedClip("b.mp4", 0.0, 2.0, 1.5)], "m.mp3"),
+        PlannedOutput(1, [PlannedClip("b.mp4", 5.0, 2.0)], None, copy_video=True),
+    ]
+
+
+def started(tmp_path):
+    path = journal_path(str(tmp_path), "混剪视频")
+    journal = BatchJournal(path)
+    journal.start(FINGERPRINT, 123, sample_plans(), ["混剪视频-1.mp4", "混剪视频-2.mp4"])
+    return path, journal
+
+
+def write_output(tmp_path, name, data=b"video"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_reload_restores_batch(tmp_path):
+    path, _ = started(tmp_path)
+    journal = BatchJournal(path)
+    assert journal.matches(FINGERPRINT)
+    assert journal.seed == 123
+    assert journal.names == ["混剪视频-1.mp4", "混剪视频-2.mp4"]
+    assert journal.plans() == sample_plans()
+
+
+def test_different_fingerprint_does_not_match(tmp_path):
+    path, _ = started(tmp_path)
+    assert not BatchJournal(path).matches(dict(FINGERPRINT, count=3))
+
+
+def test_missing_journal_does_not_match(tmp_path):
+    assert not BatchJournal(journal_path(str(tmp_path), "x")).matches(FINGERPRINT)
+
+
+def test_finished_batch_does_not_match(tmp_path):
+    path, journal = started(tmp_path)
+    journal.finish()
+    assert not BatchJournal(path).matches(FINGERPRINT)
+
+
+def test_clips_and_outputs_reloaded(tmp_path):
+    path, journal = started(tmp_path)
+    clip = write_output(tmp_path, "clip.mp4", b"0123456789")
+    journal.record_clip("k1", clip)
+    journal.record_clip("k1", clip)  # 大小相同时不重复记录
+    output = write_output(tmp_path, "混剪视频-1.mp4")
+    journal.record_output(0, output)
+
+    reloaded = BatchJournal(path)
+    assert reloaded.clips == {"k1": 10}
+    assert reloaded.verified_output(0, output)
+    assert not reloaded.verified_output(1, output)
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["type"] for line in f] == ["batch", "clip", "output"]
+
+
+def test_truncated_last_line_ignored(tmp_path):
+    path, journal = started(tmp_path)
+    journal.record_clip("k1", write_output(tmp_path, "clip.mp4"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "clip", "key": "k2", "si')
+    reloaded = BatchJournal(path)
+    assert reloaded.matches(FINGERPRINT)
+    assert list(reloaded.clips) == ["k1"]
+
+
+def test_new_batch_replaces_old_records(tmp_path):
+    path, journal = started(tmp_path)
+    journal.record_clip("k1", write_output(tmp_path, "clip.mp4"))
+    journal.finish()
+    journal.start(FINGERPRINT, 456, sample_plans(), ["新-1.mp4", "新-2.mp4"])
+    reloaded = BatchJournal(path)
+    assert reloaded.matches(FINGERPRINT)
+    assert (reloaded.seed, reloaded.clips, reloaded.outputs) == (456, {}, {})
+
+
+def test_changed_output_not_verified(tmp_path):
+    path, journal = started(tmp_path)
+    output = write_output(tmp_path, "混剪视频-1.mp4", b"video")
+    journal.record_output(0, output)
+
+    write_output(tmp_path, "混剪视频-1.mp4", b"VIDEO")  # 大小相同，内容不同
+    assert not BatchJournal(path).verified_output(0, output)
+    write_output(tmp_path, "混剪视频-1.mp4", b"video!")
+    assert not BatchJournal(path).verified_output(0, output)
+
+
+def test_missing_or_renamed_output_not_verified(tmp_path):
+    path, journal = started(tmp_path)
+    output = write_output(tmp_path, "混剪视频-1.mp4")
+    journal.record_output(0, output)
+    renamed = write_output(tmp_path, "其他.mp4")
+    assert not BatchJournal(path).verified_output(0, renamed)
+    (tmp_path / "混剪视频-1.mp4").unlink()
+    assert not BatchJournal(path).verified_output(0, output)
@@ -0,0 +1,184 @@
+"""片段规划：节拍对齐、源视频不够长时的截取方式、起始位置候选和种子复现"""
+import pytest
+
+from mixer.planner import (
+    MAX_PREROLL, ClipPlanner, PlannedOutput, beat_cut_lengths, clip_timing, offset_candidates,
+)
+
+
+def conforming_info(duration, keyframes=None, extradata="SHA256:ab", level=40, fps=30.0):
+    return {
+        "duration": duration,
+        "fps": fps,
+        "video_codec": "h264",
+        "width": 1080,
+        "height": 1920,
+        "pix_fmt": "yuv420p",
+        "video_profile": "High",
+        "video_level": level,
+        "video_extradata": extradata,
+        "keyframes": keyframes if keyframes is not None else [float(k) for k in range(0, int(duration), 2)],
+    }
+
+
+def cuts(lengths):
+    """片段时长 -> 切换点"""
+    points, position = [], 0.0
+    for length in lengths[:-1]:
+        position += length
+        points.append(round(position, 6))
+    return points
+
+
+class TestBeatCutLengths:
+    def test_cuts_snap_to_nearest_beat(self):
+        lengths = beat_cut_lengths(12.0, 3, [3.5, 4.2, 7.9, 9.0])
+        assert cuts(lengths) == [4.2, 7.9]
+        assert sum(lengths) == pytest.approx(12.0)
+
+    def test_no_beats_falls_back_to_even_split(self):
+        assert beat_cut_lengths(12.0, 4, []) == [3.0, 3.0, 3.0, 3.0]
+
+    def test_beats_too_close_are_skipped(self):
+        # 均分时长4秒，最短2秒：1.0处的节拍会让第一段太短
+        lengths = beat_cut_lengths(12.0, 3, [1.0, 8.0])
+        assert min(lengths) >= 2.0
+        assert cuts(lengths) == [4.0, 8.0]
+
+    def test_cuts_rounded_to_frames(self):
+        fps = 30.0
+        lengths = beat_cut_lengths(10.0, 2, [5.01], fps)
+        assert cuts(lengths) == [pytest.approx(150 / fps)]
+        for length in lengths:
+            assert length * fps == pytest.approx(round(length * fps), abs=1e-4)
+
+    def test_total_preserved_for_many_clips(self):
+        beats = [i * 0.47 for i in range(1, 200)]
+        lengths = beat_cut_lengths(60.0, 9, beats, 25.0)
+        assert len(lengths) == 9
+        assert sum(lengths) == pytest.approx(60.0, abs=1e-5)
+        assert min(lengths) >= 60.0 / 9 / 2 - 1 / 25.0
+
+
+class TestClipTiming:
+    def test_long_enough_source_keeps_speed(self):
+        assert clip_timing({"duration": 10.0}, 4.0) == (4.0, 1.0)
+
+    def test_unknown_duration_keeps_speed(self):
+        assert clip_timing(None, 4.0) == (4.0, 1.0)
+        assert clip_timing({}, 4.0) == (4.0, 1.0)
+
+    def test_short_source_slowed_down(self):
+        span, speed = clip_timing({"duration": 2.0}, 5.0)
+        assert span == 2.0
+        assert speed == pytest.approx(2.5)
+
+    def test_short_source_without_retime_is_trimmed(self):
+        assert clip_timing({"duration": 2.0}, 5.0, retime=False) == (2.0, 1.0)
+
+
+class TestOffsetCandidates:
+    def test_unknown_duration_only_zero(self):
+        assert offset_candidates(None, 3.0) == [0.0]
+        assert offset_candidates({"duration": 0}, 3.0) == [0.0]
+
+    def test_clip_stays_inside_source(self):
+        assert offset_candidates({"duration": 6.5}, 3.0, step=1.0) == [0.0, 1.0, 2.0, 3.0]
+
+    def test_source_shorter_than_clip(self):
+        assert offset_candidates({"duration": 2.0}, 3.0) == [0.0]
+
+    def test_offsets_far_from_keyframe_dropped(self):
+        info = {"duration": 30.0, "keyframes": [0.0, 10.0, 20.0]}
+        candidates = offset_candidates(info, 5.0, step=1.0)
+        assert candidates == [0.0, 1.0, 10.0, 11.0, 20.0, 21.0]
+        for offset in candidates:
+            assert min(offset - k for k in info["keyframes"] if k <= offset) <= MAX_PREROLL
+
+    def test_no_offset_near_keyframe_keeps_all(self):
+        info = {"duration": 10.0, "keyframes": [0.5]}
+        assert offset_candidates(info, 4.0, step=1.0, max_preroll=0.1) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+
+class TestClipPlanner:
+    sources = ["a.mp4", "b.mp4", "c.mp4", "d.mp4"]
+
+    def media_info(self):
+        return {source: {"duration": 60.0} for source in self.sources}
+
+    def plan(self, seed, **kwargs):
+        return ClipPlanner(self.media_info(), seed=seed).plan(self.sources, 2, 3.0, 6, **kwargs)
+
+    def test_same_seed_same_plan(self):
+        first = [plan.to_dict() for plan in self.plan(42, music=["m1.mp3", "m2.mp3"])]
+        second = [plan.to_dict() for plan in self.plan(42, music=["m2.mp3", "m1.mp3"])]
+        assert first == second
+
+    def test_different_seed_different_plan(self):
+        assert [p.to_dict() for p in self.plan(1)] != [p.to_dict() for p in self.plan(2)]
+
+    def test_source_order_does_not_matter(self):
+        planner = ClipPlanner(self.media_info(), seed=7)
+        shuffled = planner.plan(list(reversed(self.sources)), 2, 3.0, 6)
+        assert [p.to_dict() for p in shuffled] == [p.to_dict() for p in self.plan(7)]
+
+    def test_sources_and_music_used_evenly(self):
+        planner = ClipPlanner(self.media_info(), seed=3)
+        planner.plan(self.sources, 2, 3.0, 6, music=["m1.mp3", "m2.mp3", "m3.mp3"])
+        assert set(planner.source_usage.values()) == {3}
+        assert set(planner.music_usage.values()) == {2}
+
+    def test_offsets_not_reused(self):
+        planner = ClipPlanner(self.media_info(), seed=5)
+        plans = planner.plan(self.sources, 2, 3.0, 6)
+        offsets = [(clip.source, clip.offset) for plan in plans for clip in plan.clips]
+        assert len(offsets) == len(set(offsets))
+
+    def test_follow_music_uses_beats(self):
+        planner = ClipPlanner(self.media_info(), seed=1)
+        plans = planner.plan(self.sources, 3, 0, 1, music=["m.mp3"], music_durations={"m.mp3": 12.0},
+                             music_beats={"m.mp3": [4.2, 7.9]})
+        assert [clip.length for clip in plans[0].clips] == pytest.approx([4.2, 3.7, 4.1])
+
+    def test_short_source_slowed_when_retime(self):
+        info = {"short.mp4": {"duration": 2.0}}
+        clip = ClipPlanner(info, seed=1).plan(["short.mp4"], 1, 4.0, 1)[0].clips[0]
+        assert (clip.length, clip.speed, clip.source_span) == (4.0, 2.0, 2.0)
+
+    def test_without_retime_prefers_long_sources(self):
+        info = {"long.mp4": {"duration": 30.0}, "short.mp4": {"duration": 2.0}}
+        for seed in range(10):
+            plan = ClipPlanner(info, seed=seed, retime=False).plan(["long.mp4", "short.mp4"], 1, 4.0, 1)[0]
+            assert plan.clips[0].source == "long.mp4"
+            assert plan.clips[0].speed == 1.0
+
+    def test_without_retime_short_source_is_trimmed(self):
+        clip = ClipPlanner({"short.mp4": {"duration": 2.0}}, seed=1, retime=False).plan(
+            ["short.mp4"], 1, 4.0, 1)[0].clips[0]
+        assert (clip.length, clip.speed) == (2.0, 1.0)
+
+    def test_matching_conforming_sources_are_copied_from_keyframes(self):
+        info = {source: conforming_info(20.0) for source in ("a.mp4", "b.mp4")}
+        plan = ClipPlanner(info, seed=1).plan(["a.mp4", "b.mp4"], 2, 3.0, 1)[0]
+        assert plan.copy_video
+        for clip in plan.clips:
+            assert clip.offset in info[clip.source]["keyframes"]
+
+    @pytest.mark.parametrize("change", [{"video_level": 41}, {"video_extradata": "SHA256:cd"}, {"fps": 25.0}])
+    def test_different_stream_parameters_are_reencoded(self, change):
+        info = {"a.mp4": conforming_info(20.0), "b.mp4": dict(conforming_info(20.0), **change)}
+        plan = ClipPlanner(info, seed=1).plan(["a.mp4", "b.mp4"], 2, 3.0, 1)[0]
+        assert not plan.copy_video
+
+    def test_unknown_extradata_is_reencoded(self):
+        info = {source: dict(conforming_info(20.0), video_extradata=None) for source in ("a.mp4", "b.mp4")}
+        assert not ClipPlanner(info, seed=1).plan(["a.mp4", "b.mp4"], 2, 3.0, 1)[0].copy_video
+
+    def test_stream_copy_disabled(self):
+        info = {source: conforming_info(20.0) for source in ("a.mp4", "b.mp4")}
+        plan = ClipPlanner(info, seed=1, stream_copy=False).plan(["a.mp4", "b.mp4"], 2, 3.0, 1)[0]
+        assert not plan.copy_video
+
+    def test_plan_round_trip(self):
+        plan = self.plan(9, music=["m.mp3"])[0]
+        assert PlannedOutput.from_dict(plan.to_dict()) == plan
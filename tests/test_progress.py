@@ -0,0 +1,62 @@
+"""批次进度：按权重汇总进度，估计剩余时间"""
+import pytest
+
+from mixer.progress import PROGRESS_INTERVAL, BatchProgress, format_eta
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_weighted_fraction_and_eta():
+    clock = FakeClock()
+    progress = BatchProgress(clock)
+    progress.add("clip", weight=1.0, media_seconds=10.0)
+    progress.add("final", weight=3.0, media_seconds=20.0)
+    clock.now += 10
+    progress.finish("clip")
+    progress.update("final", {"out_time": 5.0, "fps": 60.0, "speed": 2.0})
+
+    snapshot = progress.snapshot()
+    assert snapshot.fraction == pytest.approx((1.0 + 3.0 * 0.25) / 4.0)
+    assert snapshot.eta == pytest.approx(10 * (1 - snapshot.fraction) / snapshot.fraction)
+    assert (snapshot.fps, snapshot.speed) == (60.0, 2.0)
+    assert (snapshot.tasks_done, snapshot.tasks_total) == (1, 2)
+
+
+def test_eta_unknown_before_progress():
+    progress = BatchProgress(FakeClock())
+    progress.add("clip", 1.0, 10.0)
+    assert progress.snapshot().eta is None
+    assert "计算中" in progress.snapshot().format()
+
+
+def test_update_throttled():
+    clock = FakeClock()
+    progress = BatchProgress(clock)
+    progress.add("clip", 1.0, 10.0)
+    clock.now += 1
+    assert progress.update("clip", {"out_time": 1.0})
+    assert not progress.update("clip", {"out_time": 2.0})
+    clock.now += PROGRESS_INTERVAL
+    assert progress.update("clip", {"out_time": 3.0})
+
+
+def test_fraction_capped_and_finished_ignored():
+    progress = BatchProgress(FakeClock())
+    progress.add("clip", 1.0, 10.0)
+    progress.update("clip", {"out_time": 15.0})
+    assert progress.snapshot().fraction == 1.0
+    progress.finish("clip")
+    assert not progress.update("clip", {"out_time": 1.0})
+
+
+def test_format_eta():
+    assert format_eta(None) == "计算中"
+    assert format_eta(42.4) == "42秒"
+    assert format_eta(125) == "2分5秒"
+    assert format_eta(3723) == "1小时2分3秒"
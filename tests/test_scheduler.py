@@ -0,0 +1,78 @@
+"""依赖图调度：依赖顺序、失败和取消"""
+import threading
+
+import pytest
+
+from mixer.control import JobCancelled, JobControl
+from mixer.scheduler import JobGraph, Scheduler
+
+
+def recorder():
+    log, lock = [], threading.Lock()
+
+    def task(name):
+        def run():
+            with lock:
+                log.append(name)
+        return run
+    return log, task
+
+
+def test_dependencies_run_first():
+    log, task = recorder()
+    graph = JobGraph()
+    clips = [graph.add(f"clip{i}", task(f"clip{i}")) for i in range(4)]
+    concat = graph.add("concat", task("concat"), clips)
+    graph.add("final", task("final"), [concat])
+    Scheduler(max_workers=3).run(graph)
+    assert set(log[:4]) == {f"clip{i}" for i in range(4)}
+    assert log[4:] == ["concat", "final"]
+
+
+def test_ready_tasks_run_in_insertion_order():
+    log, task = recorder()
+    graph = JobGraph()
+    for i in range(5):
+        graph.add(f"t{i}", task(f"t{i}"))
+    Scheduler(max_workers=1).run(graph)
+    assert log == [f"t{i}" for i in range(5)]
+
+
+def test_progress_reports_weights():
+    graph = JobGraph()
+    first = graph.add("a", lambda: None, weight=1.0)
+    graph.add("b", lambda: None, [first], weight=3.0)
+    reports = []
+    Scheduler(max_workers=2, on_progress=lambda done, total, task: reports.append((done, total, task.name))).run(graph)
+    assert reports == [(1.0, 4.0, "a"), (4.0, 4.0, "b")]
+
+
+def test_unknown_dependency_rejected():
+    other = JobGraph().add("x", lambda: None)
+    with pytest.raises(ValueError):
+        JobGraph().add("y", lambda: None, [other])
+
+
+def test_failure_stops_dependents():
+    log, task = recorder()
+    graph = JobGraph()
+
+    def fail():
+        raise RuntimeError("ffmpeg失败")
+    bad = graph.add("bad", fail)
+    graph.add("after", task("after"), [bad])
+    with pytest.raises(RuntimeError, match="ffmpeg失败"):
+        Scheduler(max_workers=2).run(graph)
+    assert log == []
+
+
+def test_cancel_stops_new_tasks():
+    control = JobControl()
+    log, task = recorder()
+    graph = JobGraph()
+    first = graph.add("first", control.cancel)
+    for i in range(3):
+        graph.add(f"later{i}", task(f"later{i}"), [first])
+    with pytest.raises(JobCancelled):
+        Scheduler(max_workers=1, control=control).run(graph)
+    assert log == []